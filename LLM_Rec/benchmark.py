@@ -0,0 +1,147 @@
+# benchmark.py
+"""
+端到端吞吐压测：用本地模拟服务（mock_llm）跑 main.py 的完整流程（生成 -> 三个评估 -> 匹配评分 -> 奖励），
+报告每秒处理的画像数、各阶段耗时分位数和峰值内存。
+
+    python benchmark.py --profiles 200 --workers 4 16 --batch-size 1 5 --latency-ms 200 --error-rate 0.02
+
+给出多个 --workers / --batch-size 时按所有组合逐个运行，每个组合在独立的子进程中执行，互不影响。
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def single_run(args):
+    """在当前进程中跑一次压测，返回报告"""
+    # 配置在导入时读取，必须先设置环境变量
+    os.environ.update({
+        "LLM_MOCK": "1",
+        "LLM_CACHE_MODE": "on" if args.cache else "off",
+        "LLM_VERBOSE": "0",
+        "LLM_STREAMING": "1" if args.streaming else "0",
+        "CALL_METRICS_PATH": args.metrics_path,
+        "PIPELINE_MAX_WORKERS": str(args.workers[0]),
+        "EVAL_BATCH_SIZE": str(args.batch_size[0]),
+        "MOCK_LATENCY_MS": str(args.latency_ms),
+        "MOCK_LATENCY_SIGMA": str(args.latency_sigma),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        "MOCK_MALFORMED_RATE": str(args.malformed_rate),
+        "MOCK_SEED": str(args.seed),
+        "LLM_RETRY_BASE_DELAY": "0.05",
+        "RESULTS_DB_PATH": ":memory:",
+    })
+    from call_metrics import METRICS
+    from main import run
+    from online_metrics import OnlineMetrics
+    from rating_store import get_rating_store
+    from results_db import ResultsDB
+    from title_index import get_title_index
+
+    # 索引在计时前加载，只测请求路径
+    get_rating_store()
+    get_title_index()
+    with open(args.profiles_file, "r", encoding="utf-8") as f:
+        profiles = json.load(f)[:args.profiles]
+
+    # 与 main.py 走同一个 run：每个画像完成时匹配评分、计算奖励并更新在线指标
+    results_db = ResultsDB(":memory:")
+    online_metrics = OnlineMetrics(path="")
+
+    start = time.perf_counter()
+    results = run(profiles, results_db, online_metrics, verbose=False)
+    llm_seconds = time.perf_counter() - start
+    matched_ratings = results_db.conn.execute("SELECT COUNT(*) FROM matched_ratings").fetchone()[0]
+    results_db.close()
+    overall = (online_metrics.rows() or [{}])[0]
+    total_seconds = time.perf_counter() - start
+    METRICS.close()
+
+    stages = METRICS.summary("stage")
+    return {
+        "workers": args.workers[0],
+        "batch_size": args.batch_size[0],
+        "profiles": len(profiles),
+        "completed": len(results),
+        "matched_ratings": matched_ratings,
+        "rewards": overall.get("count", 0),
+        "mae": overall.get("mae"),
+        "spearman": overall.get("spearman"),
+        "seconds": total_seconds,
+        "llm_seconds": llm_seconds,
+        "profiles_per_sec": len(results) / total_seconds if total_seconds else 0.0,
+        "calls": sum(s["calls"] for s in stages.values()),
+        "errors": sum(s["errors"] for s in stages.values()),
+        "retries": sum(s["retries"] for s in stages.values()),
+        "empty": sum(s["empty"] for s in stages.values()),
+        "truncated": sum(s["truncated"] for s in stages.values()),
+        "prompt_tokens": sum(s["prompt_tokens"] for s in stages.values()),
+        "cached_tokens": sum(s["cached_tokens"] for s in stages.values()),
+        "tokens_saved": sum(s["tokens_saved"] for s in stages.values()),
+        "stages": {name: {k: s[k] for k in ("calls", "prompt_tokens", "p50", "p95", "p99")}
+                   for name, s in stages.items()},
+        # Linux 上 ru_maxrss 的单位是 KB
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(report):
+    print(f"\nworkers={report['workers']} batch_size={report['batch_size']}: "
+          f"{report['completed']}/{report['profiles']} 个画像，{report['seconds']:.2f}s "
+          f"({report['profiles_per_sec']:.2f} 画像/秒，LLM 阶段 {report['llm_seconds']:.2f}s)，"
+          f"调用 {report['calls']} 次（失败 {report['errors']}，重试 {report['retries']}，"
+          f"空正文 {report['empty']}，截断 {report['truncated']}），"
+          f"输入 token {report['prompt_tokens']}（前缀缓存命中 {report['cached_tokens']}，"
+          f"压缩节省 {report['tokens_saved']}），"
+          f"匹配评分 {report['matched_ratings']} 条，奖励 {report['rewards']} 条，峰值内存 {report['peak_rss_mb']:.0f} MB")
+    for name, s in sorted(report["stages"].items()):
+        print(f"  {name}: {s['calls']} 次，输入 token {s['prompt_tokens']}，p50/p95/p99 {s['p50']:.3f}/{s['p95']:.3f}/{s['p99']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用本地模拟服务压测完整流程的吞吐")
+    parser.add_argument("--profiles", type=int, default=200, help="参与压测的画像数")
+    parser.add_argument("--profiles-file", default="data/user_profiles.json", help="用户画像文件")
+    parser.add_argument("--workers", type=int, nargs="+", default=[16], help="并发处理的画像数，可给多个值")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1], help="每个评估请求的画像数，可给多个值")
+    parser.add_argument("--latency-ms", type=float, default=200, help="模拟耗时的中位数(毫秒)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="模拟耗时对数正态分布的形状参数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟 429/503 的概率")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="评估结果 JSON 被截断的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="启用 LLM 响应缓存（默认关闭，测的是请求路径本身）")
+    parser.add_argument("--streaming", action="store_true", help="使用流式调用")
+    parser.add_argument("--metrics-path", default="", help="逐次调用指标的输出文件，默认不写文件")
+    parser.add_argument("--output", help="把所有组合的报告写入该 JSON 文件")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(single_run(args)))
+        return
+
+    reports = []
+    for workers, batch_size in itertools.product(args.workers, args.batch_size):
+        argv = [a for a in sys.argv[1:]]
+        cmd = [sys.executable, os.path.abspath(__file__), *argv, "--single",
+               "--workers", str(workers), "--batch-size", str(batch_size)]
+        completed = subprocess.run(cmd, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"[!] workers={workers} batch_size={batch_size} 运行失败:\n{completed.stderr}")
+            continue
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# call_metrics.py
+import contextvars
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from config import CALL_METRICS_LATENCY_WINDOW, CALL_METRICS_PATH, LLM_VERBOSE, MODEL_PRICES
+
+FIELDS = ("ts", "uid", "stage", "provider", "model", "latency", "ttft", "prompt_tokens", "cached_tokens",
+          "completion_tokens", "tokens_saved", "retries", "cache_hit", "streamed", "finish_reason", "empty", "error")
+
+# 记录实际采用结果的服务商的阶段（online_metrics 按生成推荐的服务商分组），及最多保留的未取出条目数
+SERVED_STAGES = ("generator",)
+SERVED_MAX_ENTRIES = 10000
+
+# 当前正在处理的画像 uid，由 pipeline_runner 设置，llm_router 记录调用时读取
+CURRENT_UID = contextvars.ContextVar("current_uid", default=None)
+
+
+@contextmanager
+def metrics_context(uid):
+    """在 with 块内发起的 LLM 调用都记到该 uid 名下（批量评估时为逗号分隔的多个 uid）"""
+    token = CURRENT_UID.set(str(uid))
+    try:
+        yield
+    finally:
+        CURRENT_UID.reset(token)
+
+
+def log_response(label, text):
+    """LLM_VERBOSE 开启时打印模型的完整返回结果"""
+    if LLM_VERBOSE:
+        print(label, text)
+
+
+class CallMetrics:
+    """
+    逐次 LLM 调用的指标：服务商、模型、阶段、画像 uid、token 用量（含命中服务端前缀缓存的部分）、耗时、重试次数、
+    是否命中本地缓存、结束原因与正文是否为空（为空或被截断的输出会让评估退回默认分，单独计数）
+
+    每条记录追加写入 path（扩展名为 .csv 时写 CSV，否则写 JSONL，为空时不写文件）；内存中只按阶段和模型
+    累加计数，耗时分位数取每组最近 latency_window 次成功请求，内存占用与调用次数无关。
+    summary() 按阶段和模型汇总 p50/p95/p99 耗时、token 用量和费用。
+    """
+
+    def __init__(self, path=CALL_METRICS_PATH, latency_window=CALL_METRICS_LATENCY_WINDOW):
+        self.path = path
+        self.latency_window = latency_window
+        self._groups = {"stage": {}, "model": {}}
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._served = OrderedDict()  # (uid, 阶段) -> 第一个成功返回的服务商，只记录 SERVED_STAGES
+
+    def _new_group(self):
+        return {"calls": 0, "cache_hits": 0, "errors": 0, "retries": 0, "empty": 0, "truncated": 0,
+                "prompt_tokens": 0, "cached_tokens": 0,
+                "completion_tokens": 0, "tokens_saved": 0, "cost": 0.0,
+                "latencies": deque(maxlen=self.latency_window)}
+
+    @staticmethod
+    def _accumulate(group, entry):
+        group["calls"] += 1
+        group["retries"] += entry["retries"]
+        group["tokens_saved"] += entry["tokens_saved"] or 0
+        if entry["error"] is not None:
+            group["errors"] += 1
+        if entry["cache_hit"]:
+            group["cache_hits"] += 1
+            return
+        if entry["error"] is None:
+            group["latencies"].append(entry["latency"])
+        if entry["empty"]:
+            group["empty"] += 1
+        if entry["finish_reason"] == "length":
+            group["truncated"] += 1
+        prompt = entry["prompt_tokens"] or 0
+        cached = entry["cached_tokens"] or 0
+        completion = entry["completion_tokens"] or 0
+        group["prompt_tokens"] += prompt
+        group["cached_tokens"] += cached
+        group["completion_tokens"] += completion
+        input_price, output_price, cached_price = MODEL_PRICES.get(entry["model"], (0.0, 0.0, 0.0))
+        group["cost"] += ((prompt - cached) * input_price + cached * cached_price + completion * output_price) / 1e6
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8", newline="")
+        if self.path.endswith(".csv"):
+            self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+            self._writer.writeheader()
+
+    def record(self, provider, model, stage, latency, prompt_tokens=None, completion_tokens=None, retries=0,
+               cache_hit=False, streamed=False, ttft=None, error=None, cached_tokens=None, tokens_saved=0,
+               finish_reason=None, empty=False):
+        entry = {
+            "ts": time.time(),
+            "uid": CURRENT_UID.get(),
+            "stage": stage,
+            "provider": provider,
+            "model": model,
+            "latency": latency,
+            "ttft": ttft,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,  # 命中服务端前缀缓存的输入 token
+            "completion_tokens": completion_tokens,
+            "tokens_saved": tokens_saved,  # 压缩提示词节省的输入 token（本地估计）
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "streamed": streamed,
+            "finish_reason": finish_reason,
+            "empty": empty,  # 正文为空
+            "error": error,
+        }
+        with self._lock:
+            for by, groups in self._groups.items():
+                name = entry[by] or "-"
+                if name not in groups:
+                    groups[name] = self._new_group()
+                self._accumulate(groups[name], entry)
+            if error is None and entry["uid"] and stage in SERVED_STAGES:
+                # 对冲时先返回的请求先记录，即实际采用的结果
+                self._served.setdefault((entry["uid"], stage), provider)
+                # 画像在后续阶段失败时不会被取出，超过上限后丢弃最早的条目
+                while len(self._served) > SERVED_MAX_ENTRIES:
+                    self._served.popitem(last=False)
+            if not self.path:
+                return
+            if self._file is None:
+                self._open()
+            if self._writer is not None:
+                self._writer.writerow(entry)
+            else:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def pop_served(self, uid, stage):
+        """取出并清除某个画像在某阶段实际采用结果的服务商，没有记录（例如从结果日志续跑）时返回 None"""
+        with self._lock:
+            return self._served.pop((uid, stage), None)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = self._writer = None
+
+    def summary(self, by="stage"):
+        """
+        按阶段或模型汇总
+
+        参数:
+        by (str): "stage" 或 "model"
+
+        返回:
+        dict: 分组 -> {calls, cache_hits, errors, retries, empty, truncated, prompt_tokens, cached_tokens,
+              completion_tokens, tokens_saved, cost, p50, p95, p99}，empty / truncated 为正文为空 / 因输出上限被截断的次数，
+              耗时分位数只统计实际发出且成功的请求（秒），每组取最近 latency_window 次
+        """
+        with self._lock:
+            groups = {name: dict(group, latencies=list(group["latencies"]))
+                      for name, group in self._groups[by].items()}
+        summary = {}
+        for name, group in groups.items():
+            latencies = group.pop("latencies")
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+            summary[name] = {**group, "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+        return summary
+
+    def print_summary(self):
+        for by, label in (("stage", "阶段"), ("model", "模型")):
+            summary = self.summary(by)
+            if not summary:
+                continue
+            print(f"\n=== LLM 调用统计（按{label}）===")
+            for name, s in sorted(summary.items()):
+                print(f"{name}: 调用 {s['calls']} 次（缓存命中 {s['cache_hits']}，失败 {s['errors']}，重试 {s['retries']}，"
+                      f"空正文 {s['empty']}，截断 {s['truncated']}），"
+                      f"耗时 p50/p95/p99 {s['p50']:.2f}/{s['p95']:.2f}/{s['p99']:.2f}s，"
+                      f"token 输入 {s['prompt_tokens']}（前缀缓存命中 {s['cached_tokens']}，压缩节省 {s['tokens_saved']}）"
+                      f"/ 输出 {s['completion_tokens']}，"
+                      f"费用 ¥{s['cost']:.4f}")
+
+
+METRICS = CallMetrics()
@@ -0,0 +1,197 @@
+# candidate_retriever.py
+import json
+import os
+import threading
+
+import numpy as np
+
+from config import CANDIDATE_TOP_N
+from dataset_loader import load_movies
+from rating_store import load_store
+
+RATINGS_FILE = "ml-1m/ratings.dat"
+MOVIES_FILE = "ml-1m/movies.dat"
+INDEX_FILE = "data/candidate_index.npz"
+
+NEIGHBORS_PER_MOVIE = 100  # 每部电影保留的共现邻居数
+LIKE_THRESHOLD = 4  # 评分 >= 4 视为喜欢，用于计算共现
+BLOCK_SIZE = 512  # 计算共现矩阵时每块的电影数
+PAIR_CHUNK = 2_000_000  # 每次展开的 (电影, 电影) 共现对数上限，限制峰值内存
+
+# 打分权重
+CO_WEIGHT = 0.6  # 与最近观看电影的共现相似度
+GENRE_WEIGHT = 0.3  # 与偏好题材的匹配度
+POP_WEIGHT = 0.1  # 热门程度先验
+
+
+def _source_signature():
+    return np.array([os.path.getmtime(RATINGS_FILE), os.path.getmtime(MOVIES_FILE)])
+
+
+def _co_counts(entries, block_start, block_stop, rows, users, user_ptr, n_movies):
+    """
+    统计 [block_start, block_stop) 中每部电影与全部电影被同一用户喜欢的次数
+
+    rows / users 是按用户分段的“喜欢”记录（电影下标、用户下标），user_ptr 为分段起点，
+    entries 是其中电影落在该块内的记录下标。只展开这些记录涉及的共现对，并按 PAIR_CHUNK 分批 bincount，
+    内存与用户数无关。
+
+    返回:
+    np.ndarray: (block_stop - block_start, n_movies) 的共现次数
+    """
+    counts = np.zeros((block_stop - block_start) * n_movies, dtype=np.float64)
+    lengths = np.diff(user_ptr)[users[entries]]
+    bounds = np.searchsorted(np.cumsum(lengths), np.arange(PAIR_CHUNK, lengths.sum(), PAIR_CHUNK), side="right")
+    for chunk, chunk_lengths in zip(np.split(entries, bounds), np.split(lengths, bounds)):
+        if not len(chunk):
+            continue
+        # 每条记录与同一用户的全部“喜欢”记录配对
+        offsets = np.repeat(user_ptr[users[chunk]] - np.cumsum(chunk_lengths) + chunk_lengths, chunk_lengths)
+        partners = rows[offsets + np.arange(chunk_lengths.sum())]
+        sources = np.repeat(rows[chunk] - block_start, chunk_lengths)
+        counts += np.bincount(sources * n_movies + partners, minlength=len(counts))
+    return counts.reshape(block_stop - block_start, n_movies)
+
+
+def build_index(path=INDEX_FILE):
+    """
+    从 MovieLens 评分与电影数据预计算候选检索所需的矩阵并保存为 .npz
+
+    保存内容:
+    movie_ids / titles: 电影 ID 与标题
+    genres / genre_matrix: 题材表与按行归一化的题材多热矩阵
+    neighbor_idx / neighbor_sim: 每部电影共现余弦相似度最高的 NEIGHBORS_PER_MOVIE 个邻居
+    popularity: 归一化到 [0, 1] 的对数评分人数
+    """
+    store = load_store()
+    movies = load_movies(MOVIES_FILE)
+
+    movie_ids = movies["MovieID"].to_numpy(dtype=np.int32)
+    titles = movies["Title"].to_numpy(dtype=str)
+
+    # 题材多热矩阵
+    genre_lists = movies["Genres"].astype(str).str.split("|")
+    genres = np.array(sorted({g for gs in genre_lists for g in gs}))
+    genre_pos = {g: i for i, g in enumerate(genres)}
+    genre_matrix = np.zeros((len(movies), len(genres)), dtype=np.float32)
+    for row, gs in enumerate(genre_lists):
+        genre_matrix[row, [genre_pos[g] for g in gs]] = 1.0
+    genre_matrix /= np.sqrt(genre_matrix.sum(axis=1, keepdims=True)).clip(min=1.0)
+
+    # 评分存储已按用户分段（CSR），从中取出“喜欢”的记录，仍按用户分段
+    movie_rows = np.searchsorted(movie_ids, np.asarray(store.movie_ids))
+    liked = np.asarray(store.ratings) >= LIKE_THRESHOLD
+    user_of = np.repeat(np.arange(len(store.user_ptr) - 1), np.diff(store.user_ptr))
+    liked_rows = movie_rows[liked]
+    liked_users = user_of[liked]
+    liked_ptr = np.zeros(len(store.user_ptr), dtype=np.int64)
+    np.cumsum(np.bincount(liked_users, minlength=len(liked_ptr) - 1), out=liked_ptr[1:])
+
+    counts = np.bincount(movie_rows, minlength=len(movie_ids))
+    popularity = np.log1p(counts).astype(np.float32)
+    popularity /= max(popularity.max(), 1.0)
+
+    # 分块计算共现余弦相似度，只保留每部电影的前 K 个邻居
+    like_counts = np.bincount(liked_rows, minlength=len(movie_ids))
+    by_movie = np.argsort(liked_rows, kind="stable")
+    block_starts = np.searchsorted(liked_rows[by_movie], np.arange(0, len(movie_ids) + BLOCK_SIZE, BLOCK_SIZE))
+    norms = np.sqrt(like_counts).clip(min=1.0)
+    k = min(NEIGHBORS_PER_MOVIE, len(movie_ids) - 1)
+    neighbor_idx = np.zeros((len(movie_ids), k), dtype=np.int32)
+    neighbor_sim = np.zeros((len(movie_ids), k), dtype=np.float32)
+    for start in range(0, len(movie_ids), BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, len(movie_ids))
+        entries = by_movie[block_starts[start // BLOCK_SIZE]:block_starts[start // BLOCK_SIZE + 1]]
+        sim = _co_counts(entries, start, stop, liked_rows, liked_users, liked_ptr, len(movie_ids)).astype(np.float32)
+        sim /= norms[start:stop, None] * norms[None, :]
+        sim[np.arange(stop - start), np.arange(start, stop)] = 0.0  # 排除自身
+        top = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        neighbor_idx[start:stop] = top
+        neighbor_sim[start:stop] = np.take_along_axis(sim, top, axis=1)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, source=_source_signature(), movie_ids=movie_ids, titles=titles, genres=genres,
+             genre_matrix=genre_matrix, neighbor_idx=neighbor_idx, neighbor_sim=neighbor_sim,
+             popularity=popularity)
+
+
+class CandidateRetriever:
+    """根据用户画像（偏好题材、最近观看、评分统计）从全量电影中选出候选集合"""
+
+    def __init__(self, path=INDEX_FILE):
+        with np.load(path) as index:
+            self.movie_ids = index["movie_ids"]
+            self.titles = index["titles"]
+            self.genre_matrix = index["genre_matrix"]
+            self.neighbor_idx = index["neighbor_idx"]
+            self.neighbor_sim = index["neighbor_sim"]
+            self.popularity = index["popularity"]
+            genres = index["genres"].tolist()
+        self.genre_pos = {g: i for i, g in enumerate(genres)}
+        self.title_pos = {t: i for i, t in enumerate(self.titles.tolist())}
+
+    def score(self, profile):
+        """返回每部电影的候选得分，已看过的电影得分为 -inf"""
+        # 题材匹配：偏好题材按排名线性加权
+        interests = [g for g in profile.get("interests", []) if g in self.genre_pos]
+        user_genres = np.zeros(self.genre_matrix.shape[1], dtype=np.float32)
+        for rank, genre in enumerate(interests):
+            user_genres[self.genre_pos[genre]] = len(interests) - rank
+        if interests:
+            user_genres /= np.linalg.norm(user_genres)
+        genre_score = self.genre_matrix @ user_genres
+
+        # 共现：把最近观看电影的邻居相似度累加到候选上
+        seeds = [self.title_pos[t] for t in profile.get("recent_movies", []) if t in self.title_pos]
+        co_score = np.zeros(len(self.movie_ids), dtype=np.float32)
+        if seeds:
+            np.add.at(co_score, self.neighbor_idx[seeds].ravel(), self.neighbor_sim[seeds].ravel())
+            co_score /= max(co_score.max(), 1e-6)
+
+        # 评分记录越多的用户越不依赖热门先验
+        total = profile.get("stats", {}).get("total_ratings", 0)
+        pop_weight = POP_WEIGHT / (1.0 + np.log1p(total) / 5.0)
+
+        scores = CO_WEIGHT * co_score + GENRE_WEIGHT * genre_score + pop_weight * self.popularity
+        scores[seeds] = -np.inf
+        return scores
+
+    def retrieve(self, profile, top_n=CANDIDATE_TOP_N):
+        """返回得分最高的 top_n 个电影标题，按得分从高到低排列"""
+        scores = self.score(profile)
+        top_n = min(top_n, len(scores))
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.titles[top].tolist()
+
+
+_RETRIEVER = None
+_RETRIEVER_LOCK = threading.Lock()
+
+
+def get_retriever():
+    """加载（必要时先构建）候选索引，源数据更新后自动重建"""
+    global _RETRIEVER
+    with _RETRIEVER_LOCK:
+        if _RETRIEVER is not None:
+            return _RETRIEVER
+        stale = not os.path.exists(INDEX_FILE)
+        if not stale:
+            with np.load(INDEX_FILE) as index:
+                stale = not np.array_equal(index["source"], _source_signature())
+        if stale:
+            build_index()
+        _RETRIEVER = CandidateRetriever()
+        return _RETRIEVER
+
+
+def retrieve_candidates(profile, top_n=CANDIDATE_TOP_N):
+    return get_retriever().retrieve(profile, top_n)
+
+
+if __name__ == "__main__":
+    build_index()
+    with open("data/user_profiles.json", "r", encoding="utf-8") as f:
+        sample = json.load(f)[0]
+    print(f"✅ 候选索引已保存至 {INDEX_FILE}")
+    print(f"用户 {sample['uid']} 的前 10 个候选:", retrieve_candidates(sample, 10))
@@ -18,3 +18,120 @@ SPARKAI_API_KEY = "*****"
 SPARKAI_URL = 'wss://spark-api.xf-yun.com/v3.5/chat'
 SPARKAI_DOMAIN = 'generalv3.5'
 
+
+# 并发设置
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "16"))  # 同时处理的用户画像数
+# 每个服务商同时在途的请求上限（自适应并发从一半开始，成功时逐步增加到该值，遇到 429/超时减半）
+PROVIDER_CONCURRENCY = {
+    "deepseek": int(os.getenv("DEEPSEEK_CONCURRENCY", "8")),
+    "qwen": int(os.getenv("QWEN_CONCURRENCY", "8")),
+    "spark": int(os.getenv("SPARK_CONCURRENCY", "2")),
+}
+
+# LLM 响应缓存
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH") or "data/llm_cache.sqlite3"
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE") or "on"  # on: 读写缓存; refresh: 只写不读(强制刷新); off: 完全绕过
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))  # 超出后按最近最少使用淘汰
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))  # 过期时间(秒)，<=0 表示永不过期
+
+# HTTP 连接
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))  # 建立连接超时(秒)
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))  # 读取响应超时(秒)，deepseek-reasoner 较慢
+HTTP_POOL_SIZE = max(PROVIDER_CONCURRENCY.values())  # 每个 base URL 保持的长连接数
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+# 候选电影预排序
+CANDIDATE_TOP_N = int(os.getenv("CANDIDATE_TOP_N", "100"))  # 每个用户送入生成提示词的候选数，0 表示使用全部电影
+
+# 标题匹配
+TITLE_MATCH_THRESHOLD = float(os.getenv("TITLE_MATCH_THRESHOLD", "0.6"))  # 模糊匹配的最低置信度
+
+# 结果日志
+RESULT_LOG_PATH = os.getenv("RESULT_LOG_PATH") or "data/result_log.jsonl"
+RESULT_LOG_FSYNC_EVERY = int(os.getenv("RESULT_LOG_FSYNC_EVERY", "20"))  # 每写入多少条记录 fsync 一次
+RESULT_LOG_FSYNC_INTERVAL = float(os.getenv("RESULT_LOG_FSYNC_INTERVAL", "5"))  # 距上次 fsync 超过多少秒也会 fsync
+
+# 结果库
+RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH") or "data/results.sqlite3"
+
+# 批量评估
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "1"))  # 每个评估请求打包的画像数 K，1 表示逐个画像评估
+
+# 流式输出
+LLM_STREAMING = os.getenv("LLM_STREAMING", "0") == "1"  # 1: 所有调用走流式接口，边生成边解析并记录首字延迟/生成速度，对冲与故障转移同样生效（见 LLM_HEDGING）
+
+# 限流与重试
+# 每个服务商每分钟的请求数(rpm)与 token 数(tpm)上限，0 表示不限
+PROVIDER_RATE_LIMITS = {
+    "deepseek": {"rpm": int(os.getenv("DEEPSEEK_RPM", "0")), "tpm": int(os.getenv("DEEPSEEK_TPM", "0"))},
+    "qwen": {"rpm": int(os.getenv("QWEN_RPM", "600")), "tpm": int(os.getenv("QWEN_TPM", "1000000"))},
+    "spark": {"rpm": int(os.getenv("SPARK_RPM", "120")), "tpm": int(os.getenv("SPARK_TPM", "0"))},
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))  # 429/5xx/超时的最大重试次数
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))  # 指数退避的初始等待(秒)
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60"))  # 单次重试等待的上限(秒)
+
+# 对冲请求与故障转移
+LLM_HEDGING = os.getenv("LLM_HEDGING", "1") == "1"  # 0: 每个阶段只调用指定的模型
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))  # 首选模型超过其最近耗时的该分位数仍未返回时发出对冲请求
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # 样本数不足时不对冲，只在出错时故障转移
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))  # 计算分位数用的最近请求数
+HEDGE_MAX_WORKERS = int(os.getenv("HEDGE_MAX_WORKERS", "8"))  # 同时在途的对冲请求上限，超出的对冲排队等待
+# 每个阶段的备选模型，按顺序用于对冲和故障转移
+STAGE_ROUTES = {
+    "generator": ["deepseek-chat", "qwen-plus"],
+    "subjective": ["qwen-plus", "deepseek-chat"],
+    "logic": ["spark", "qwen-plus"],
+    "hallucination": ["deepseek-reasoner", "deepseek-chat"],
+}
+
+# 调用指标
+CALL_METRICS_PATH = os.getenv("CALL_METRICS_PATH", "data/call_metrics.jsonl")  # .csv 写 CSV，其余写 JSONL，为空则不写文件
+LLM_VERBOSE = os.getenv("LLM_VERBOSE", "1") == "1"  # 0: 不打印模型的完整返回结果
+CALL_METRICS_LATENCY_WINDOW = int(os.getenv("CALL_METRICS_LATENCY_WINDOW", "10000"))  # 每个阶段/模型按最近多少次请求计算耗时分位数
+# 每百万 token 的价格(元)：(输入, 输出, 命中前缀缓存的输入)，用于估算费用
+MODEL_PRICES = {
+    "deepseek-chat": (2.0, 8.0, 0.5),
+    "deepseek-reasoner": (4.0, 16.0, 1.0),
+    "qwen-plus": (0.8, 2.0, 0.32),
+    "spark": (0.0, 0.0, 0.0),
+}
+
+# 本地模拟服务（压测与回归测试用，不需要 API 密钥）
+LLM_MOCK = os.getenv("LLM_MOCK", "0") == "1"  # 1: 所有模型都由 mock_llm 本地应答
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))  # 模拟耗时的中位数(毫秒)
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))  # 对数正态分布的形状参数，越大长尾越重
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))  # 返回 429/503 的概率
+MOCK_MALFORMED_RATE = float(os.getenv("MOCK_MALFORMED_RATE", "0"))  # 评估结果 JSON 被截断的概率
+MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
+
+# 奖励权重（model_update 维护的 alpha/beta/gamma，分别对应主观/逻辑/幻觉三个阶段）
+REWARD_WEIGHTS_PATH = os.getenv("REWARD_WEIGHTS_PATH", "weights.json")
+CALIBRATION_STATE_PATH = os.getenv("CALIBRATION_STATE_PATH", "data/calibration_state.npz")  # 增量校准累积的统计量
+
+# 提示词 token 预算（按 rate_limiter.estimate_tokens 本地估计）
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "1") == "1"  # 0: 画像与上游评估原样写入提示词
+# 每个画像在提示词变化部分（画像、推荐内容、上游评估）的 token 上限，压缩后仍超出时截断最长的字段；0 表示不限
+STAGE_INPUT_BUDGETS = {
+    "generator": 1500,
+    "subjective": 800,
+    "logic": 800,
+    "hallucination": 800,
+}
+# 每个画像的输出 token 上限（max_tokens），批量评估按画像数放大
+STAGE_MAX_TOKENS = {
+    "generator": 600,
+    "subjective": 800,
+    "logic": 800,
+    "hallucination": 800,
+}
+# 不设输出上限的模型（使用服务端默认值）：deepseek-reasoner 的思考过程也计入 max_tokens，
+# 思考过长时会用完上限、正文为空，评估只能退回默认分
+UNCAPPED_MODELS = {"deepseek-reasoner"}
+
+# 在线评估指标（每条奖励产生时更新，内存占用与运行规模无关）
+ONLINE_METRICS_PATH = os.getenv("ONLINE_METRICS_PATH", "data/llm_vs_user_score_metrics.csv")  # 按分组写快照，为空则不写文件
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "30"))  # 距上次快照超过多少秒再写一次
+# 奖励与阶段得分在 1-5 分区间的分箱数（默认每箱 0.01 分），用于 Spearman 的秩与阶段得分分位数
+METRICS_HISTOGRAM_BINS = int(os.getenv("METRICS_HISTOGRAM_BINS", "400"))
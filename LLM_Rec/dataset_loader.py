@@ -0,0 +1,184 @@
+# dataset_loader.py
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+# pandas 只在解析源文件或构造 DataFrame 时才导入，只读 .npy 缓存的调用方（评分索引等）不必承担其导入开销
+
+RATINGS_FILE = "ml-1m/ratings.dat"
+MOVIES_FILE = "ml-1m/movies.dat"
+USERS_FILE = "ml-1m/users.dat"
+
+# 各文件的列名与存储类型
+SCHEMAS = {
+    "ratings": {"UserID": np.int32, "MovieID": np.int32, "Rating": np.int8, "Timestamp": np.int64},
+    "movies": {"MovieID": np.int32, "Title": str, "Genres": "category"},
+    "users": {"UserID": np.int32, "Gender": str, "Age": np.int8, "Occupation": np.int8, "Zip-code": str},
+}
+
+
+def _cache_dir(path):
+    return os.path.join(os.path.dirname(path), ".cache", os.path.basename(path))
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_text(text, schema):
+    """用 C 解析器读取 '::' 分隔的文本（先把 '::' 替换为单字符分隔符）"""
+    import pandas as pd
+
+    dtypes = {col: ("object" if dtype is str else dtype) for col, dtype in schema.items()}
+    return pd.read_csv(io.StringIO(text.replace("::", "\x1f")), sep="\x1f", names=list(schema), dtype=dtypes,
+                       quoting=csv.QUOTE_NONE, keep_default_na=False, engine="c")
+
+
+def _parse(path, schema):
+    with open(path, "r", encoding="latin-1") as f:
+        return _parse_text(f.read(), schema)
+
+
+def read_appended(name, path, offset):
+    """
+    只解析文件中 offset 字节之后追加的完整行，用于增量处理新评分
+
+    返回:
+    tuple: (新增行的 DataFrame, 已处理到的字节位置)
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1  # 忽略尚未写完的最后一行
+    frame = _parse_text(data[:end].decode("latin-1"), SCHEMAS[name])
+    return frame, offset + end
+
+
+def replace_file(path, write, mode="wb", **kwargs):
+    """先写入同目录下的临时文件再 os.replace，并发读取方只会看到完整的旧文件或新文件"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_meta(cache_dir, meta):
+    replace_file(os.path.join(cache_dir, "meta.json"), lambda f: json.dump(meta, f), "w", encoding="utf-8")
+
+
+def _save_cache(frame, cache_dir, meta):
+    """
+    保存各列缓存：先删除 meta.json 使旧缓存失效，各列文件逐个原子替换，最后写入 meta.json，
+    其他分片进程只有在所有列都写完后才会认为缓存有效
+    """
+    import pandas as pd
+
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        os.remove(os.path.join(cache_dir, "meta.json"))
+    except FileNotFoundError:
+        pass
+    for col in frame.columns:
+        values = frame[col]
+        name = col.replace("-", "_")
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays = {f"{name}.codes.npy": values.cat.codes.to_numpy(),
+                      f"{name}.categories.npy": values.cat.categories.to_numpy(dtype=str)}
+        else:
+            arrays = {f"{name}.npy": values.to_numpy(dtype=None if values.dtype != object else str)}
+        for filename, array in arrays.items():
+            replace_file(os.path.join(cache_dir, filename), lambda f: np.save(f, array))
+    _write_meta(cache_dir, meta)
+
+
+def _load_cache(cache_dir, schema, mmap, as_frame=True):
+    columns = {}
+    for col, dtype in schema.items():
+        name = col.replace("-", "_")
+        if dtype == "category":
+            codes = np.load(os.path.join(cache_dir, f"{name}.codes.npy"))
+            categories = np.load(os.path.join(cache_dir, f"{name}.categories.npy"))
+            if as_frame:
+                import pandas as pd
+                columns[col] = pd.Categorical.from_codes(codes, categories.astype(object))
+            else:
+                columns[col] = categories[codes]
+        elif dtype is str:
+            columns[col] = np.load(os.path.join(cache_dir, f"{name}.npy")).astype(object)
+        else:
+            columns[col] = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+    if not as_frame:
+        return columns
+    import pandas as pd
+    return pd.DataFrame(columns)
+
+
+def _cache_is_valid(path, cache_dir):
+    """
+    按源文件的修改时间与大小判断缓存是否有效；修改时间变化但内容未变（如重新拷贝）时，
+    用文件摘要确认后继续使用缓存
+    """
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    stat = os.stat(path)
+    if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return True
+    if meta["size"] != stat.st_size or meta["sha1"] != _file_hash(path):
+        return False
+    meta["mtime_ns"] = stat.st_mtime_ns
+    _write_meta(cache_dir, meta)
+    return True
+
+
+def load_dataset(name, path, mmap=False, as_frame=True):
+    """
+    读取 MovieLens 的 .dat 文件，首次解析后把各列保存为 .npy 缓存，之后直接从缓存加载
+
+    参数:
+    name (str): "ratings" / "movies" / "users"
+    path (str): 源文件路径，缓存保存在同目录的 .cache 下
+    mmap (bool): 数值列是否以内存映射方式加载
+    as_frame (bool): 为 False 时返回 {列名: 数组} 字典（category 列还原为字符串数组），配合 mmap 可避免把整列读入内存，
+                     且从缓存加载时不导入 pandas
+
+    返回:
+    pd.DataFrame: 列名与 pd.read_csv(sep="::") 的结果一致，Genres 为 category 类型
+    """
+    schema = SCHEMAS[name]
+    cache_dir = _cache_dir(path)
+    if not _cache_is_valid(path, cache_dir):
+        frame = _parse(path, schema)
+        stat = os.stat(path)
+        _save_cache(frame, cache_dir, {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": _file_hash(path)})
+        if as_frame:
+            return frame
+    return _load_cache(cache_dir, schema, mmap, as_frame)
+
+
+def load_ratings(path=RATINGS_FILE, mmap=False, as_frame=True):
+    return load_dataset("ratings", path, mmap, as_frame)
+
+
+def load_movies(path=MOVIES_FILE):
+    return load_dataset("movies", path)
+
+
+def load_users(path=USERS_FILE):
+    return load_dataset("users", path)
@@ -0,0 +1,86 @@
+# evaluator_batch.py
+import json
+
+from call_metrics import log_response
+from output_parser import canonical_key, extract_json
+
+
+def format_batch_items(items, fields):
+    """
+    把多条待评估内容拼成提示词中的条目列表
+
+    参数:
+    items (list): [(uid, 字段值1, 字段值2, ...)]
+    fields (list): 与字段值一一对应的标签
+
+    返回:
+    str: 每条以 [id=uid] 开头的文本
+    """
+    blocks = []
+    for uid, *values in items:
+        lines = [f"[id={uid}]"] + [f"{label}: {value}" for label, value in zip(fields, values)]
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def split_batch_result(text, ids, required_keys):
+    """
+    把批量评估返回的带 id 的 JSON 数组拆回各个画像
+
+    返回:
+    dict: uid -> 与单条评估格式相同的 JSON 数组字符串（字段名已统一为标准写法）；缺失或缺少评分字段的 uid 不在其中
+    """
+    try:
+        data = extract_json(text)
+    except ValueError:
+        return {}
+    if not isinstance(data, list):
+        return {}
+
+    grouped = {}
+    for entry in data:
+        if isinstance(entry, dict):
+            entry = {canonical_key(k): v for k, v in entry.items()}
+            if "id" in entry:
+                grouped.setdefault(str(entry["id"]), []).append(entry)
+
+    results = {}
+    for uid in ids:
+        entries = grouped.get(str(uid))
+        if entries and all(required_keys <= entry.keys() for entry in entries):
+            results[uid] = json.dumps([{k: v for k, v in entry.items() if k != "id"} for entry in entries],
+                                      ensure_ascii=False, indent=2)
+    return results
+
+
+def run_batch(name, items, build_prompt, call, required_keys, single):
+    """
+    一次请求评估多条内容，缺失或格式错误的条目逐条补评
+
+    参数:
+    name (str): 评估器名称，用于日志
+    items (list): [(uid, 参数1, 参数2, ...)]，参数与单条评估函数一致
+    build_prompt (callable): items -> (批量提示词, 压缩节省的 token 数)
+    call (callable): (prompt, tokens_saved, 画像数) -> 模型返回文本
+    required_keys (set): 每个评分条目必须包含的字段
+    single (callable): 单条评估函数，single(参数1, 参数2, ...)
+
+    返回:
+    dict: uid -> 评估结果
+    """
+    results = {}
+    if len(items) > 1:
+        try:
+            prompt, tokens_saved = build_prompt(items)
+            response = call(prompt, tokens_saved, len(items))
+            log_response(f"{name} 批量返回结果:", response)
+            results = split_batch_result(response, [item[0] for item in items], required_keys)
+        except Exception as e:
+            print(f"[!] {name} 批量评估失败: {e}")
+
+    missing = [item for item in items if item[0] not in results]
+    if missing and len(items) > 1:
+        print(f"[!] {name} 批量结果缺少 {len(missing)}/{len(items)} 条，改为逐条评估")
+    for uid, *args in missing:
+        results[uid] = single(*args)
+    return results
@@ -1,31 +1,46 @@
 # evaluator_hallucination.py
-import requests
-from config import DEEPSEEK_REASONER_API_KEY, DEEPSEEK_REASONER_MODEL
+from evaluator_batch import format_batch_items, run_batch
+from call_metrics import log_response
 from llm_router import call_llm
+from prompt_templates import get_template
+from token_budget import compact_scores, prepare_fields, prepare_items
+
+HALLUCINATION_KEYS = {"Hallucination-Risk", "Explanatory Validity"}
 
 
 def evaluate_hallucination(recommendation_text, model_name="deepseek-reasoner", logic=None, subjective=None):
-    prompt = f"""
-    You are checking for hallucinations in a movie recommendation explanation.
-    The recommended text is as follows: {recommendation_text}
-    The subjective evaluation of an evaluator is as follows: {subjective}.
-    The logic evaluation of an other evaluator is as follows: {logic}.
-
-    Generate the ratings for each film in sequence, and the rating criteria are as follows:
-
-    1. **Hallucination-Risk**: Does the explanation contain factual inaccuracies, fabricated details, or unsupported claims about the movie?
-    2. **Explanatory Validity**: Does the explanation provide a clear and reasonable justification for the recommendation, grounded in reality?
-
-    The word count should be controlled within 50 words.Only output the content in the following format. No additional content needs to be output.
-    Please return the output result in JSON array format.   Each item has the following structure:
-    {{
-    "Movie": "Name of the film",
-    "Explanation": "Reason",
-    "Hallucination-Risk": Scores (integers 0 to 5, scale where 0 = no hallucination, 5 = severe hallucination),
-    "Explanatory Validity": Scores (integers 0 to 5, scale where 0 = Ineffective, 5 = very effective)
-    }}
+    # 上游的主观与逻辑评估只保留逐电影的评分字段
+    fields, tokens_saved = prepare_fields("hallucination", {"recommendation_text": recommendation_text,
+                                                            "subjective": subjective, "logic": logic},
+                                          {"subjective": compact_scores, "logic": compact_scores})
+    prompt = get_template("hallucination_prompt").render(**fields)
+
+    result = call_llm(prompt=prompt, model_name=model_name, stage="hallucination", tokens_saved=tokens_saved)
+    log_response("evaluate_hallucination 返回结果:", result)  # 添加调试信息
+    return result
+
+
+def build_hallucination_batch_prompt(items):
+    items, tokens_saved = prepare_items("hallucination", items, ["recommendation_text", "subjective", "logic"],
+                                        {"subjective": compact_scores, "logic": compact_scores})
+    prompt = get_template("hallucination_batch_prompt").render(
+        items=format_batch_items(items, ["The recommended text", "The subjective evaluation", "The logic evaluation"]))
+    return prompt, tokens_saved
+
+
+def evaluate_hallucination_batch(items, model_name="deepseek-reasoner"):
     """
+    批量幻觉评估
 
-    result = call_llm(prompt=prompt, model_name=model_name)
-    print("evaluate_hallucination 返回结果:", result)  # 添加调试信息
-    return result
\ No newline at end of file
+    参数:
+    items (list): [(uid, recommendation_text, subjective, logic)]
+    model_name (str): 评估模型
+
+    返回:
+    dict: uid -> 与 evaluate_hallucination 格式相同的结果
+    """
+    return run_batch("evaluate_hallucination", items, build_hallucination_batch_prompt,
+                     lambda prompt, saved, n: call_llm(prompt=prompt, model_name=model_name, stage="hallucination",
+                                                       tokens_saved=saved, items=n),
+                     HALLUCINATION_KEYS,
+                     lambda text, subjective, logic: evaluate_hallucination(text, model_name, logic, subjective))
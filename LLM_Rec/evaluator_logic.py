@@ -1,34 +1,45 @@
 # evaluator_logic.py
-import requests
-import json
-
+from evaluator_batch import format_batch_items, run_batch
+from call_metrics import log_response
 from llm_router import call_llm
+from prompt_templates import get_template
+from token_budget import compact_scores, prepare_fields, prepare_items
+
+LOGIC_KEYS = {"Content-Matching", "Logic-Clarity"}
 
 
 def evaluate_logic(recommendation_text, model_name="spark", subjective=None):
-    prompt = f"""
-    You are evaluating the logical consistency of a recommendation explanation.
-    The recommended text is as follows: {recommendation_text}
-    The subjective evaluation of an evaluator is as follows: {subjective}.
-
-    Generate the ratings for each film in sequence, and the rating criteria are as follows:
-
-    1. Does the explanation accurately reflect the movie's actual genre, themes, or story?
-    2. Is the explanation logically structured, coherent, and easy to follow?
-    3. Does the explanation align with the subjective scores provided?    For example, if the subjective rating is high, is the justification strong?
-
-    Rate each aspect from 1 to 5, where 1 = strongly disagree and 5 = strongly agree.
-
-    The word count should be controlled within 100 words.
-    Please return the output result in JSON array format.      Each item has the following structure:
-    {{
-    "Movie": "Name of the film",
-    "Explanation": "Reason",
-    "Content-Matching": Scores (integers 1 to 5),
-    "Logic-Clarity": Scores (integers 1 to 5)
-    }}
+    # 上游的主观评估只保留逐电影的评分字段
+    fields, tokens_saved = prepare_fields("logic", {"recommendation_text": recommendation_text,
+                                                    "subjective": subjective},
+                                          {"subjective": compact_scores})
+    prompt = get_template("logic_prompt").render(**fields)
+
+    result = call_llm(prompt=prompt, model_name=model_name, stage="logic", tokens_saved=tokens_saved)
+    log_response("evaluate_logic 返回结果:", result)  # 添加调试信息
+    return result
+
+
+def build_logic_batch_prompt(items):
+    items, tokens_saved = prepare_items("logic", items, ["recommendation_text", "subjective"],
+                                        {"subjective": compact_scores})
+    prompt = get_template("logic_batch_prompt").render(
+        items=format_batch_items(items, ["The recommended text", "The subjective evaluation"]))
+    return prompt, tokens_saved
+
+
+def evaluate_logic_batch(items, model_name="spark"):
     """
+    批量逻辑评估
 
-    result = call_llm(prompt=prompt, model_name=model_name)
-    print("evaluate_logic 返回结果:", result)  # 添加调试信息
-    return result
\ No newline at end of file
+    参数:
+    items (list): [(uid, recommendation_text, subjective)]
+    model_name (str): 评估模型
+
+    返回:
+    dict: uid -> 与 evaluate_logic 格式相同的结果
+    """
+    return run_batch("evaluate_logic", items, build_logic_batch_prompt,
+                     lambda prompt, saved, n: call_llm(prompt=prompt, model_name=model_name, stage="logic",
+                                                       tokens_saved=saved, items=n), LOGIC_KEYS,
+                     lambda text, subjective: evaluate_logic(text, model_name, subjective))
@@ -1,37 +1,43 @@
-import requests
-import json
-from config import QWEN_PLUS_API_KEY, QWEN_PLUS_MODEL
-from llm_router import call_llm, call_qwen
+from evaluator_batch import format_batch_items, run_batch
+from call_metrics import log_response
+from llm_router import call_qwen
+from prompt_templates import get_template
+from token_budget import compact_profile, prepare_fields, prepare_items
+
+SUBJECTIVE_KEYS = {"Relevance", "Clarity", "Persuasiveness"}
 
 
 def evaluate_subjective(user_profile, recommendation_text):
-    prompt = f"""
-    用户画像：{user_profile}
-    推荐内容：{recommendation_text}
-    You are simulating a user on a movie recommendation platform.
-    You are shown recommended movie and a brief explanation of why it was recommended to you.
-
-    Generate the ratings for each film in sequence, and the rating criteria are as follows:
-
-    1.    Relevance: Does the explanation match the user's interests?
-    2.    Clarity: Is the explanation easy to understand?
-    3.    Persuasiveness: Does the explanation make you more likely to watch the movie?
-
-    Rate each aspect from 1 to 5, where 1 = strongly disagree and 5 = strongly agree.
-
-    Try to immerse yourself in this user's experience and provide feedback (no extra text):
-
-    The word count should be controlled within 50 words.
-    Please return the output result in JSON array format. Each item has the following structure:
-    {{
-      "Movie": "Name of the film (the year)",
-      "Explanation": "Reason",
-      "Relevance": Scores (integers 1 to 5),
-      "Clarity": Scores (integers 1 to 5),
-      "Persuasiveness": Scores (integers 1 to 5)
-    }}
+    # user_profile 可以是画像 dict（压缩为结构化字段）或描述文本
+    fields, tokens_saved = prepare_fields("subjective", {"user_profile": user_profile,
+                                                         "recommendation_text": recommendation_text},
+                                          {"user_profile": compact_profile})
+    prompt = get_template("subjective_prompt").render(**fields)
+
+    result = call_qwen(prompt=prompt, stage="subjective", tokens_saved=tokens_saved)
+    log_response("evaluator_subjective 返回结果:", result)
+    return result
+
+
+def build_subjective_batch_prompt(items):
+    items, tokens_saved = prepare_items("subjective", items, ["user_profile", "recommendation_text"],
+                                        {"user_profile": compact_profile})
+    prompt = get_template("subjective_batch_prompt").render(
+        items=format_batch_items(items, ["The user profile", "The recommended text"]))
+    return prompt, tokens_saved
+
+
+def evaluate_subjective_batch(items):
     """
+    批量主观评估
 
-    result = call_qwen(prompt=prompt)
-    print("evaluator_subjective 返回结果:", result)
-    return result
\ No newline at end of file
+    参数:
+    items (list): [(uid, user_profile, recommendation_text)]，user_profile 可以是画像 dict
+
+    返回:
+    dict: uid -> 与 evaluate_subjective 格式相同的结果
+    """
+    return run_batch("evaluator_subjective", items, build_subjective_batch_prompt,
+                     lambda prompt, saved, n: call_qwen(prompt=prompt, stage="subjective", tokens_saved=saved, items=n),
+                     SUBJECTIVE_KEYS,
+                     evaluate_subjective)
@@ -1,17 +1,19 @@
+import argparse
+import heapq
 import pandas as pd
+import numpy as np
 import json
-from collections import Counter
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from dataset_loader import load_movies, load_ratings, load_users
 
 # 文件路径
 RATINGS_FILE = "ml-1m/ratings.dat"  # 使用 ml-1m 数据集
 MOVIES_FILE = "ml-1m/movies.dat"
 USERS_FILE = "ml-1m/users.dat"
 OUTPUT_JSON = "data/user_profiles.json"
-
-# 确保输出目录存在
-os.makedirs(os.path.dirname(OUTPUT_JSON), exist_ok=True)
+SHARD_DIR = "data/profile_shards"
 
 # 用户画像参数
 TOP_K_GENRES = 5  # 每个用户最多取K个偏好类型
@@ -20,34 +22,23 @@ MAX_USERS = 200  # 最多生成多少个用户画像
 RECENT_MONTHS = 12  # 近几个月的评分权重加倍
 HIGH_RATING_THRESHOLD = 4  # 高评分阈值(>=4分)
 
-# 检查文件是否存在
-for file in [RATINGS_FILE, MOVIES_FILE, USERS_FILE]:
-    if not os.path.exists(file):
-        print(f"错误：文件 {file} 不存在！")
-        exit(1)
-
-# 加载数据
-ratings = pd.read_csv(RATINGS_FILE, sep="::", engine="python",
-                      names=["UserID", "MovieID", "Rating", "Timestamp"],
-                      encoding="latin-1")
-movies = pd.read_csv(MOVIES_FILE, sep="::", engine="python",
-                     names=["MovieID", "Title", "Genres"],
-                     encoding="latin-1")
-users = pd.read_csv(USERS_FILE, sep="::", engine="python",
-                    names=["UserID", "Gender", "Age", "Occupation", "Zip-code"],
-                    encoding="latin-1")
-
-# 数据预处理
-# 1. 将时间戳转换为日期
-ratings['Date'] = pd.to_datetime(ratings['Timestamp'], unit='s')
-# 2. 计算距今的月数
-now = datetime.now()
-ratings['MonthsAgo'] = ((now.year - ratings['Date'].dt.year) * 12 +
-                        (now.month - ratings['Date'].dt.month))
-
-# 合并评分与电影数据
-merged = pd.merge(ratings, movies, on="MovieID")
-merged = pd.merge(merged, users, on="UserID")
+# 分片模式参数
+CHUNK_USERS = 500  # 每个进程每次处理的用户数，决定峰值内存
+
+
+def prepare_ratings(ratings, movies, users, now):
+    """计算距今月数，并合并评分、电影与用户数据"""
+    # 1. 将时间戳转换为日期
+    ratings = ratings.copy()
+    ratings['Date'] = pd.to_datetime(ratings['Timestamp'], unit='s')
+    # 2. 计算距今的月数
+    ratings['MonthsAgo'] = ((now.year - ratings['Date'].dt.year) * 12 +
+                            (now.month - ratings['Date'].dt.month))
+
+    # 合并评分与电影数据
+    merged = pd.merge(ratings, movies, on="MovieID")
+    merged = pd.merge(merged, users, on="UserID")
+    return merged
 
 # 年龄映射
 AGE_MAP = {
@@ -76,57 +67,56 @@ OCCUPATION_MAP = {
     18: "tradesman/craftsman", 19: "unemployed", 20: "writer"
 }
 
-# 准备生成画像
-user_profiles = []
-for uid, group in merged.groupby("UserID"):
-    if len(group) < MIN_RATINGS:
-        continue
+def explode_genres(genres):
+    """
+    把 'A|B|C' 形式的类型列展开为每个 (行, 类型) 一行，保持类型在原字符串中的顺序
 
-    # 计算加权类型偏好
-    genre_scores = Counter()
+    返回:
+    tuple: (展开后对应的原行号, 类型编码, 类型名称表)
+    """
+    # 先在不同的类型字符串粒度上拆分，再按行复制
+    genre_strings, string_rows = np.unique(np.asarray(genres, dtype=object), return_inverse=True)
+    genre_lists = [g.split("|") for g in genre_strings]
+    genre_names, flat_codes = np.unique(np.concatenate(genre_lists), return_inverse=True)
+    list_sizes = np.array([len(g) for g in genre_lists])
+    list_start = np.concatenate(([0], np.cumsum(list_sizes)))
 
-    for _, row in group.iterrows():
-        genres = row["Genres"].split("|")
-        rating = row["Rating"]
-        months_ago = row["MonthsAgo"]
+    genre_counts = list_sizes[string_rows]
+    exploded_rows = np.repeat(np.arange(len(string_rows)), genre_counts)
+    # 每个展开行在其类型列表中的位置
+    offsets = np.arange(len(exploded_rows)) - np.repeat(np.cumsum(genre_counts) - genre_counts, genre_counts)
+    genre_codes = flat_codes[list_start[string_rows[exploded_rows]] + offsets]
+    return exploded_rows, genre_codes, genre_names
 
-        # 计算基础分数 (高评分电影权重更高)
-        base_score = rating / 5.0
 
-        # 时间衰减：近12个月的评分权重加倍
-        time_factor = 2.0 if months_ago <= RECENT_MONTHS else 1.0
+def newest_rows(dates, k=3):
+    """
+    按时间降序取一个用户最近的 k 条评分，返回其在 dates 中的下标
 
-        # 最终分数 = 基础分数 × 时间因子
-        final_score = base_score * time_factor
+    时间相同的评分的先后取决于 sort_values 使用的 quicksort，这里按 pandas 降序排序的方式
+    （先反转、升序 argsort、再反转）排序，保证与原实现一致。quicksort 不稳定，并列项的先后取决于整段序列，
+    所以 dates 必须是该用户的全部评分时间，按原行顺序排列。
+    """
+    return np.arange(len(dates))[::-1][dates[::-1].argsort(kind="quicksort")][::-1][:k]
 
-        # 累加每个类型的分数
-        for genre in genres:
-            genre_scores[genre] += final_score
 
-    # 选择分数最高的前K个类型
-    top_genres = [g for g, _ in genre_scores.most_common(TOP_K_GENRES)]
+def make_profile(uid, user_info, top_genres, total_ratings, avg_rating, high_rating_ratio, recent_movies):
+    """根据统计结果构建画像字典，user_info 为 (性别, 年龄, 职业编号)"""
+    raw_gender, age, occupation_id = user_info
+    gender = GENDER_MAP.get(raw_gender, raw_gender)
+    age_group = AGE_MAP.get(age, "Unknown")
+    occupation = OCCUPATION_MAP.get(occupation_id, "Unknown")
     tag_str = "、".join(top_genres)
 
-    # 提取用户信息
-    user_info = group.iloc[0]
-    gender = GENDER_MAP.get(user_info["Gender"], user_info["Gender"])
-    age_group = AGE_MAP.get(user_info["Age"], "Unknown")
-    occupation = OCCUPATION_MAP.get(user_info["Occupation"], "Unknown")
-
-    # 计算用户偏好统计信息
-    avg_rating = group["Rating"].mean()
-    high_rating_ratio = len(group[group["Rating"] >= HIGH_RATING_THRESHOLD]) / len(group)
-    recent_movies = group.sort_values("Date", ascending=False).head(3)["Title"].tolist()
-
     # 构建更丰富的用户画像
-    user_profiles.append({
+    return {
         "uid": str(uid),
         "gender": gender,
         "age_group": age_group,
         "occupation": occupation,
         "interests": top_genres,
         "stats": {
-            "total_ratings": len(group),
+            "total_ratings": total_ratings,
             "avg_rating": round(avg_rating, 2),
             "high_rating_ratio": f"{high_rating_ratio:.0%}"
         },
@@ -135,13 +125,201 @@ for uid, group in merged.groupby("UserID"):
                         f"是个电影爱好者（平均评分{avg_rating:.1f}分，{high_rating_ratio:.0%}的电影评分为4星及以上）"
                         f"，最近观看的电影包括《{', '.join(recent_movies)}》。"
                         f"偏好题材包括：{tag_str}")
-    })
+    }
+
+
+def build_profiles(merged, users, max_users=MAX_USERS):
+    """
+    以整表向量化运算生成用户画像，结果与逐行累加 Counter 的实现一致
+
+    类型得分 = 评分/5 × 时间因子，按 merged 的行顺序用 np.add.at 逐项累加（与原逐行累加的浮点结果相同），
+    得分相同的类型按首次出现的先后排序（与 Counter.most_common 一致）。
+    """
+    # 按 UserID 顺序取前 max_users 个评分数足够的用户，只对这些用户的评分做后续计算
+    counts = merged.groupby("UserID").size()
+    selected = counts.index[counts.to_numpy() >= MIN_RATINGS][:max_users].to_numpy()
+    merged = merged[merged["UserID"].isin(selected)]
+    if merged.empty:
+        return []
+
+    user_rows = np.searchsorted(selected, merged["UserID"].to_numpy())
+    rating = merged["Rating"].to_numpy()
+    time_factor = np.where(merged["MonthsAgo"].to_numpy() <= RECENT_MONTHS, 2.0, 1.0)
+    final_score = rating / 5.0 * time_factor
+
+    exploded_rows, genre_codes, genre_names = explode_genres(merged["Genres"].to_numpy())
+    cells = user_rows[exploded_rows] * len(genre_names) + genre_codes
+
+    n_cells = len(selected) * len(genre_names)
+    genre_scores = np.zeros(n_cells)
+    np.add.at(genre_scores, cells, final_score[exploded_rows])
+    first_seen = np.full(n_cells, len(cells))
+    np.minimum.at(first_seen, cells, np.arange(len(cells)))
+    genre_scores = genre_scores.reshape(len(selected), -1)
+    first_seen = first_seen.reshape(len(selected), -1)
+
+    # 每个用户按 (得分降序, 首次出现升序) 排列类型，取前 TOP_K_GENRES 个出现过的类型
+    genre_order = np.lexsort((first_seen, -genre_scores), axis=1)[:, :TOP_K_GENRES]
+    genre_present = np.take_along_axis(first_seen, genre_order, axis=1) < len(cells)
+
+    # 评分统计
+    total = np.bincount(user_rows, minlength=len(selected))
+    avg_ratings = np.bincount(user_rows, weights=rating, minlength=len(selected)) / total
+    high_counts = np.bincount(user_rows, weights=rating >= HIGH_RATING_THRESHOLD, minlength=len(selected))
+
+    # 最近观看：按用户分段（段内保持原行顺序），再按时间降序取前 3 部（见 newest_rows）
+    by_user = np.argsort(user_rows, kind="stable")
+    group_start = np.concatenate(([0], np.cumsum(total)))
+    dates = merged["Date"].to_numpy()
+    titles = merged["Title"].to_numpy()
+
+    user_info = users.set_index("UserID").loc[selected, ["Gender", "Age", "Occupation"]].to_numpy().tolist()
+
+    profiles = []
+    for row, uid in enumerate(selected):
+        top_genres = genre_names[genre_order[row][genre_present[row]]].tolist()
+        avg_rating = avg_ratings[row]
+        high_rating_ratio = int(high_counts[row]) / int(total[row])
+        rows = by_user[group_start[row]:group_start[row + 1]]
+        newest = newest_rows(dates[rows])
+        recent_movies = titles[rows[newest]].tolist()
+
+        profiles.append(make_profile(uid, user_info[row], top_genres, int(total[row]), avg_rating,
+                                     high_rating_ratio, recent_movies))
+    return profiles
+
+
+def _dump_profile(profile, as_array_item):
+    """JSONL 每行一个画像；作为 JSON 数组元素时与 json.dump(indent=2) 的格式一致"""
+    if not as_array_item:
+        return json.dumps(profile, ensure_ascii=False)
+    return "\n".join("  " + line for line in json.dumps(profile, ensure_ascii=False, indent=2).split("\n"))
+
+
+def _write_shard(shard, n_shards, now, path):
+    """
+    子进程：生成 UserID % n_shards == shard 的用户画像，按 UserID 升序逐行写入 JSONL
+
+    评分列以内存映射方式加载，每次只合并 CHUNK_USERS 个用户的评分，内存占用与用户总数无关。
+    """
+    columns = load_ratings(RATINGS_FILE, mmap=True, as_frame=False)
+    movies = load_movies(MOVIES_FILE)
+    users = load_users(USERS_FILE)
+
+    user_ids = columns["UserID"]
+    shard_rows = np.flatnonzero(user_ids % n_shards == shard)
+    # 按 UserID 分组，组内保持原始行顺序（影响同分类型与同一时间评分的先后）
+    shard_rows = shard_rows[np.argsort(user_ids[shard_rows], kind="stable")]
+    shard_users = user_ids[shard_rows]
+    unique_users = np.unique(shard_users)
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, len(unique_users), CHUNK_USERS):
+            chunk = unique_users[start:start + CHUNK_USERS]
+            lo, hi = np.searchsorted(shard_users, [chunk[0], chunk[-1] + 1])
+            rows = shard_rows[lo:hi]
+            chunk_ratings = pd.DataFrame({col: values[rows] for col, values in columns.items()})
+            merged = prepare_ratings(chunk_ratings, movies, users, now)
+            for profile in build_profiles(merged, users, max_users=len(chunk)):
+                f.write(_dump_profile(profile, as_array_item=False) + "\n")
+                count += 1
+    return count
+
+
+def generate_sharded(output, workers, max_users=None, now=None):
+    """
+    多进程分片生成用户画像
+
+    用户按 UserID 取模分到 workers 个分片，各进程把画像流式写入各自的 JSONL 文件，
+    最后按 UserID 做 k 路归并写入 output（.jsonl 每行一个画像，.json 为与单进程模式相同的数组格式）。
+    """
+    now = now or datetime.now()
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    shard_paths = [os.path.join(SHARD_DIR, f"part-{i:04d}.jsonl") for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_write_shard, range(workers), [workers] * workers, [now] * workers, shard_paths))
+
+    as_array = output.endswith(".json")
+    files = [open(path, "r", encoding="utf-8") for path in shard_paths]
+    written = 0
+    try:
+        merged_lines = heapq.merge(*files, key=lambda line: int(json.loads(line)["uid"]))
+        with open(output, "w", encoding="utf-8") as out:
+            out.write("[" if as_array else "")
+            for line in merged_lines:
+                if max_users is not None and written >= max_users:
+                    break
+                if as_array:
+                    out.write(("," if written else "") + "\n" + _dump_profile(json.loads(line), as_array_item=True))
+                else:
+                    out.write(line)
+                written += 1
+            out.write(("\n]" if written else "]") if as_array else "")
+    finally:
+        for f in files:
+            f.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="根据 MovieLens 数据生成用户画像")
+    parser.add_argument("--output", default=OUTPUT_JSON, help="输出文件，.json 为数组格式，.jsonl 为每行一个画像")
+    parser.add_argument("--workers", type=int, default=0, help="分片进程数，0 表示单进程生成")
+    parser.add_argument("--max-users", type=int, default=MAX_USERS, help="最多生成多少个用户画像，<=0 表示全部")
+    parser.add_argument("--reference-time", type=datetime.fromisoformat, default=None,
+                        help="计算“距今月数”的参考时间(ISO 格式)，默认为当前时间；增量模式下首次构建后固定")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：只把上次运行后新增的评分累加到受影响的用户上")
+    parser.add_argument("--rebuild", action="store_true", help="增量模式下丢弃已有状态，从全部评分重新构建")
+    args = parser.parse_args()
+    max_users = args.max_users if args.max_users > 0 else None
+    now = args.reference_time or datetime.now()
+
+    # 检查文件是否存在
+    for file in [RATINGS_FILE, MOVIES_FILE, USERS_FILE]:
+        if not os.path.exists(file):
+            print(f"错误：文件 {file} 不存在！")
+            exit(1)
+
+    # 确保输出目录存在
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    if args.workers > 0:
+        count = generate_sharded(args.output, args.workers, max_users, now)
+        print(f"✅ 成功生成 {count} 条用户画像，保存至 {args.output}")
+        return
+
+    # 加载数据（首次解析后使用 .npy 列缓存）
+    movies = load_movies(MOVIES_FILE)
+    users = load_users(USERS_FILE)
+
+    if args.incremental:
+        from profile_state import STATE_FILE, ProfileState, build_state, refresh_state
+        if os.path.exists(STATE_FILE) and not args.rebuild:
+            state = ProfileState.load(STATE_FILE)
+            changed = refresh_state(state, RATINGS_FILE)
+            print(f"增量更新：{len(changed)} 个用户有新评分，水位线 {state.watermark}，"
+                  f"参考时间 {state.reference_time.isoformat()}")
+        else:
+            state = build_state(now, RATINGS_FILE)
+            print(f"已从全部评分构建画像状态，参考时间 {state.reference_time.isoformat()}")
+        state.save(STATE_FILE)
+        user_profiles = state.profiles(users, movies, max_users=max_users)
+    else:
+        merged = prepare_ratings(load_ratings(RATINGS_FILE), movies, users, now)
+        # 准备生成画像
+        user_profiles = build_profiles(merged, users, max_users=max_users)
+
+    # 保存为 JSON 文件
+    with open(args.output, "w", encoding="utf-8") as f:
+        if args.output.endswith(".jsonl"):
+            f.writelines(_dump_profile(profile, as_array_item=False) + "\n" for profile in user_profiles)
+        else:
+            json.dump(user_profiles, f, ensure_ascii=False, indent=2)
 
-    if len(user_profiles) >= MAX_USERS:
-        break
+    print(f"✅ 成功生成 {len(user_profiles)} 条用户画像，保存至 {args.output}")
 
-# 保存为 JSON 文件
-with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(user_profiles, f, ensure_ascii=False, indent=2)
 
-print(f"✅ 成功生成 {len(user_profiles)} 条用户画像，保存至 {OUTPUT_JSON}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
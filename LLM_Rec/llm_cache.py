@@ -0,0 +1,121 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import LLM_CACHE_PATH, LLM_CACHE_MODE, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+
+CACHE_MODES = {"on", "refresh", "off"}
+
+
+class LLMCache:
+    """
+    基于 SQLite 的 LLM 响应缓存
+
+    键为 (服务商, 模型, 完整请求参数) 的 SHA-256 摘要，条目数超过上限时按最近访问时间淘汰，
+    超过 TTL 的条目视为未命中并删除。可在多线程间共享。
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL,
+                 mode=LLM_CACHE_MODE):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知缓存模式: {mode}")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(provider, model, params):
+        """根据服务商、模型和完整请求参数生成缓存键"""
+        payload = json.dumps({"provider": provider, "model": model, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取缓存，未命中、已过期或处于 refresh/off 模式时返回 None"""
+        if self.mode != "on":
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl > 0 and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, provider, model, response):
+        """写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        if self.mode == "off" or response is None:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+            conn.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self):
+        """返回命中/未命中次数与当前条目数"""
+        with self._lock:
+            size = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size, "mode": self.mode}
+
+
+# 全局共享的缓存实例
+LLM_CACHE = LLMCache()
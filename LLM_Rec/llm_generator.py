@@ -1,41 +1,45 @@
-import requests
-from config import DEEPSEEK_CHAT_API_KEY, DEEPSEEK_CHAT_MODEL
+from call_metrics import log_response
+from llm_router import call_llm, stream_routed
+from prompt_templates import get_template
+from token_budget import compact_profile, prepare_fields
+from functools import lru_cache
 import json
 
-# 加载推荐候选电影
-with open("D:/测试/pythonProject1/data/movie_titles.json", "r", encoding="utf-8") as f:
-    candidate_movies = json.load(f)
-# 构造可读的候选电影字符串
-MOVIE_LIST_TEXT = "\n".join([f"- {title}" for title in candidate_movies])
+MOVIE_TITLES_FILE = "D:/测试/pythonProject1/data/movie_titles.json"
 
-def generate_recommendation(user_profile: str) -> str:
-    # 强化提示，明确要求LLM返回推荐数量
-    prompt = f"""
-    Based on the user profile: {user_profile}, recommend 3 movies and provide explanations for each recommendation. 
-    CThere is no limit on the year of the film, but it must be recommended from the following list of candidate movies:
-    {MOVIE_LIST_TEXT}
-    
-    Each explanation count should be controlled within 50 words.
-    Please format your response as follows:
-    
-    1. **Movie Title 1 (the year)**  
-       - **Why?** Explanation...
+@lru_cache(maxsize=1)
+def full_movie_list_text() -> str:
+    # 全部候选电影只在未做候选预排序时才用到，首次使用时加载并构造可读的字符串
+    with open(MOVIE_TITLES_FILE, "r", encoding="utf-8") as f:
+        candidate_movies = json.load(f)
+    return "\n".join([f"- {title}" for title in candidate_movies])
 
-    2. **Movie Title 2 (the year)**  
-       - **Why?** Explanation...
+def build_generation_prompt(user_profile, candidates=None):
     """
-    # 假设 DeepSeek API 的请求 URL
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_CHAT_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": DEEPSEEK_CHAT_MODEL,
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    result = response.json()["choices"][0]["message"]["content"]
-    print("evaluate_generator 返回结果:", result)  # 打印实际响应内
-    return result
\ No newline at end of file
+    生成推荐的提示词，返回 (提示词, 压缩节省的 token 数)
+
+    候选电影列表放在模板的变化部分：开启候选预排序（CANDIDATE_TOP_N > 0）时每个用户的候选不同，
+    跨用户相同的前缀只到 "Candidate movies:" 为止；关闭时使用全部电影，列表对所有用户相同且位于用户画像之前，
+    服务商的前缀缓存仍能覆盖整个电影列表。
+    """
+    # user_profile 可以是画像 dict（压缩为结构化字段）或描述文本
+    fields, tokens_saved = prepare_fields("generator", {"user_profile": user_profile},
+                                          {"user_profile": compact_profile})
+    # 传入预排序的候选电影时只把候选写进提示词，否则使用全部电影
+    if candidates:
+        movie_list_text = "\n".join(f"- {title}" for title in candidates)
+    else:
+        movie_list_text = full_movie_list_text()
+    return get_template("generator_prompt").render(movie_list=movie_list_text, **fields), tokens_saved
+
+def generate_recommendation(user_profile, candidates=None) -> str:
+    prompt, tokens_saved = build_generation_prompt(user_profile, candidates)
+    # 与评估器共用 llm_router 的连接池、并发控制与缓存
+    result = call_llm("deepseek-chat", prompt, stage="generator", tokens_saved=tokens_saved)
+    log_response("evaluate_generator 返回结果:", result)  # 打印实际响应内
+    return result
+
+def stream_recommendation(user_profile, candidates=None):
+    """流式生成推荐，逐段返回模型输出；与非流式调用一样按 STAGE_ROUTES 对冲和故障转移"""
+    prompt, tokens_saved = build_generation_prompt(user_profile, candidates)
+    yield from stream_routed("deepseek-chat", prompt, "generator", tokens_saved)
@@ -0,0 +1,150 @@
+# llm_hedging.py
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from config import HEDGE_MAX_WORKERS, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, HEDGE_WINDOW
+
+
+class LatencyTracker:
+    """记录每个模型最近 window 次实际请求的耗时，用于计算对冲阈值"""
+
+    def __init__(self, window=HEDGE_WINDOW, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, model):
+        """返回该模型耗时的 percentile 分位数，样本不足时返回 None（不对冲）"""
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, self.percentile))
+
+
+LATENCY = LatencyTracker()
+TTFT = LatencyTracker()  # 流式请求的首段延迟，流式调用按它决定何时对冲
+
+# 按路由策略调用的累计统计：(阶段, 返回结果的模型) 的次数，以及对冲与故障转移的次数
+_ROUTE_STATS = {"served": Counter(), "hedged": 0, "failed_over": 0, "calls": 0}
+_ROUTE_STATS_LOCK = threading.Lock()
+
+# 只有对冲请求进入线程池，池大小与画像并发数无关；落后的请求不会被取消，完成后结果仍会写入缓存
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+
+
+def _record_route(stage, model, hedged, failed_over):
+    with _ROUTE_STATS_LOCK:
+        _ROUTE_STATS["served"][(stage, model)] += 1
+        _ROUTE_STATS["hedged"] += hedged
+        _ROUTE_STATS["failed_over"] += failed_over
+        _ROUTE_STATS["calls"] += 1
+
+
+def _start(call, model):
+    """在新线程中立即开始请求（不在线程池中排队，排队时间不会被算作首选模型的耗时），返回 Future"""
+    future = Future()
+    # 在调用方的上下文中执行，调用指标才能记到当前画像名下
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(call, model))
+        except BaseException as e:
+            future.set_exception(e)
+
+    future.set_running_or_notify_cancel()
+    threading.Thread(target=run, name=f"route-{model}", daemon=True).start()
+    return future
+
+
+def _call_in_order(stage, models, call):
+    """不对冲时在调用方线程中依次请求，出错时转向下一个备选模型"""
+    error = None
+    for i, model in enumerate(models):
+        try:
+            result = call(model)
+        except Exception as e:
+            error = e
+            print(f"[!] {stage} 阶段模型 {model} 调用失败: {e}")
+            continue
+        _record_route(stage, model, hedged=False, failed_over=i > 0)
+        return result
+    raise error
+
+
+def hedged_call(stage, models, call, tracker=LATENCY):
+    """
+    按路由策略调用模型：先请求首选模型，超过其历史耗时分位数仍未返回时向下一个备选模型发出对冲请求，
+    取先返回的结果；请求出错时立即转向下一个备选模型。
+
+    首选模型的耗时样本不足（还不能对冲）时，所有请求都在调用方线程中执行；否则首选模型在专用线程中立即开始，
+    调用方线程等待结果并在超过阈值时把对冲请求交给 _HEDGE_POOL。
+
+    参数:
+    stage (str): 阶段名称，用于记录
+    models (list): [首选模型, 备选模型1, ...]
+    call (callable): call(model) -> 模型输出
+    tracker (LatencyTracker): 计算对冲阈值用的耗时记录，call 的耗时应与其记录的一致
+
+    返回:
+    str: 最先成功返回的结果；全部失败时抛出最后一个异常
+    """
+    threshold = tracker.threshold(models[0]) if len(models) > 1 else None
+    if threshold is None:
+        return _call_in_order(stage, models, call)
+
+    start = time.perf_counter()
+    pending = list(models[1:])
+    futures = {_start(call, models[0]): models[0]}
+    hedged = failed_over = False
+    error = None
+
+    while futures:
+        timeout = None
+        if pending and not hedged:
+            timeout = max(0.0, threshold - (time.perf_counter() - start))
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # 首选模型超过阈值仍未返回，发出一个对冲请求
+            hedged = True
+            model = pending.pop(0)
+            futures[_HEDGE_POOL.submit(contextvars.copy_context().run, call, model)] = model
+            continue
+        for future in done:
+            model = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                print(f"[!] {stage} 阶段模型 {model} 调用失败: {e}")
+                if pending and not futures:
+                    failed_over = True
+                    next_model = pending.pop(0)
+                    futures[_start(call, next_model)] = next_model
+                continue
+            _record_route(stage, model, hedged, failed_over)
+            return result
+    raise error
+
+
+def route_summary():
+    """按 (阶段, 返回结果的模型) 统计调用次数，以及对冲与故障转移的次数"""
+    with _ROUTE_STATS_LOCK:
+        return {
+            "served": Counter(_ROUTE_STATS["served"]),
+            "hedged": _ROUTE_STATS["hedged"],
+            "failed_over": _ROUTE_STATS["failed_over"],
+            "calls": _ROUTE_STATS["calls"],
+        }
@@ -1,71 +1,486 @@
 # llm_router.py
 
 from config import *
-from sparkai.llm.llm import ChatSparkLLM
-from sparkai.core.messages import ChatMessage
+import json
+import queue
 import requests
+import threading
+import time
+from functools import lru_cache, partial
+from requests.adapters import HTTPAdapter
+from call_metrics import METRICS
+from llm_cache import LLM_CACHE
+from llm_hedging import LATENCY, TTFT, hedged_call
+from mock_llm import get_mock_llm
+from rate_limiter import ProviderLimiter, call_with_retry, estimate_tokens, retry_delay
+
+# ===== 并发控制 =====
+# 模型 -> 服务商，同一服务商下的模型共享并发上限；由文件末尾的 register_model 填写
+MODEL_PROVIDERS = {}
+# 模型 -> (非流式调用 fn(prompt, meta), 流式调用 fn(prompt, meta))
+_MODEL_CALLS = {}
+
+# 每个服务商一个限流器：rpm/tpm 令牌桶 + AIMD 自适应并发
+_LIMITERS = {
+    provider: ProviderLimiter(provider, max_concurrency=limit, **PROVIDER_RATE_LIMITS.get(provider, {}))
+    for provider, limit in PROVIDER_CONCURRENCY.items()
+}
+
+
+def register_model(model_name: str, provider: str, call, stream):
+    """
+    注册模型：call(prompt, meta) 返回完整输出，stream(prompt, meta) 逐段返回输出，token 用量写入 meta
+
+    服务商的 SDK 与客户端应在 call/stream 首次执行时才导入和创建，注册本身不产生开销。
+    未在 PROVIDER_CONCURRENCY 中配置的服务商默认并发上限为 4。
+    """
+    if provider not in _LIMITERS:
+        _LIMITERS[provider] = ProviderLimiter(provider, max_concurrency=4, **PROVIDER_RATE_LIMITS.get(provider, {}))
+    MODEL_PROVIDERS[model_name] = provider
+    _MODEL_CALLS[model_name] = (call, stream)
+
+
+def _call_with_retry(model_name: str, prompt: str, fn, stats: dict = None):
+    """在服务商的限流名额内调用 fn()，429/5xx/超时按指数退避重试；成功时记录耗时供对冲阈值使用"""
+    start = time.perf_counter()
+    result = call_with_retry(_LIMITERS[MODEL_PROVIDERS[model_name]], fn, estimate_tokens(prompt),
+                             LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, stats)
+    LATENCY.record(model_name, time.perf_counter() - start)
+    return result
+
+# ===== HTTP 长连接池 =====
+# 每个 base URL 复用一个 Session，避免每次请求重新进行 TCP+TLS 握手
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(base_url: str) -> requests.Session:
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[base_url] = session
+        return session
+
+
+def _usage(meta: dict, prompt_tokens, completion_tokens, cached_tokens=None):
+    meta["prompt_tokens"] = prompt_tokens
+    meta["completion_tokens"] = completion_tokens
+    meta["cached_tokens"] = cached_tokens
+
+
+def _cached_tokens(usage: dict):
+    """提示词中命中服务端前缀缓存的 token 数：DeepSeek 为 prompt_cache_hit_tokens，OpenAI 兼容接口在 prompt_tokens_details 中"""
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        return usage["prompt_cache_hit_tokens"]
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+
+def _post_chat(base_url: str, api_key: str, model: str, prompt: str, meta: dict) -> str:
+    """调用 OpenAI 兼容的 /chat/completions 接口，token 用量写入 meta"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    if meta.get("max_tokens"):
+        data["max_tokens"] = meta["max_tokens"]
+    response = get_session(base_url).post(f"{base_url}/chat/completions", headers=headers, json=data,
+                                          timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    response.raise_for_status()
+    body = response.json()
+    usage = body.get("usage") or {}
+    _usage(meta, usage.get("prompt_tokens"), usage.get("completion_tokens"), _cached_tokens(usage))
+    meta["finish_reason"] = body["choices"][0].get("finish_reason")
+    return body["choices"][0]["message"]["content"]
+
+
+def _stream_chat(base_url: str, api_key: str, model: str, prompt: str, meta: dict):
+    """以 SSE 流式调用 /chat/completions，逐段返回正文；服务端给出的 token 用量写入 meta"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    if meta.get("max_tokens"):
+        data["max_tokens"] = meta["max_tokens"]
+    with get_session(base_url).post(f"{base_url}/chat/completions", headers=headers, json=data, stream=True,
+                                    timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as response:
+        response.raise_for_status()
+        response.encoding = "utf-8"  # text/event-stream 不带 charset 时 requests 默认按 ISO-8859-1 解码
+        # chunk_size=None: 每收到一个分块就处理，默认的 512 字节缓冲会推迟首个 token
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            event = json.loads(payload)
+            if event.get("usage"):
+                _usage(meta, event["usage"].get("prompt_tokens"), event["usage"].get("completion_tokens"),
+                       _cached_tokens(event["usage"]))
+            for choice in event.get("choices") or []:
+                if choice.get("finish_reason"):
+                    meta["finish_reason"] = choice["finish_reason"]
+                # deepseek-reasoner 的思考过程在 reasoning_content 中，只返回正文
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    yield content
+
+
+# ===== 讯飞星火 =====
+# 客户端创建开销较大，用完放回池中复用；池大小受 spark 并发上限约束。sparkai 在首次调用时才导入
+_SPARK_POOLS = {}  # 按 (是否流式, max_tokens) 分开
+
+
+def _spark_pool(streaming: bool, max_tokens) -> queue.LifoQueue:
+    return _SPARK_POOLS.setdefault((streaming, max_tokens), queue.LifoQueue())
+
+
+def _acquire_spark(streaming: bool = False, max_tokens=None):
+    try:
+        return _spark_pool(streaming, max_tokens).get_nowait()
+    except queue.Empty:
+        from sparkai.llm.llm import ChatSparkLLM
+        options = {"max_tokens": max_tokens} if max_tokens else {}
+        return ChatSparkLLM(
+            spark_api_url=SPARKAI_URL,
+            spark_app_id=SPARKAI_APP_ID,
+            spark_api_key=SPARKAI_API_KEY,
+            spark_api_secret=SPARKAI_API_SECRET,
+            spark_llm_domain=SPARKAI_DOMAIN,
+            streaming=streaming,
+            request_timeout=HTTP_READ_TIMEOUT,
+            **options,
+        )
+
+
+def _call_spark(prompt: str, meta: dict) -> str:
+    from sparkai.core.messages import ChatMessage
+    spark = _acquire_spark(max_tokens=meta.get("max_tokens"))
+    messages = [ChatMessage(role="user", content=prompt)]
+    result = spark.generate([messages])  # 出错时直接丢弃该客户端，不放回池中
+    _spark_pool(False, meta.get("max_tokens")).put(spark)
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    _usage(meta, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    meta["finish_reason"] = (result.generations[0][0].generation_info or {}).get("finish_reason")
+    return result.generations[0][0].text.strip()
+
+
+def _stream_spark(prompt: str, meta: dict):
+    from sparkai.core.messages import ChatMessage
+    spark = _acquire_spark(streaming=True, max_tokens=meta.get("max_tokens"))
+    messages = [ChatMessage(role="user", content=prompt)]
+    for chunk in spark.stream(messages):
+        if chunk.content:
+            yield chunk.content
+    _spark_pool(True, meta.get("max_tokens")).put(spark)
+
 
 # ===== 通义千问 =====
-from openai import OpenAI as QwenClient
+@lru_cache(maxsize=1)
+def qwen_client():
+    """OpenAI 兼容客户端，首次调用千问时才导入 openai 并创建"""
+    import httpx
+    from openai import OpenAI as QwenClient
+
+    return QwenClient(
+        api_key=os.getenv("QWEN_API_KEY") or "sk-f8c157427a204f498f146f2ad401a804",
+        base_url=QWEN_BASE_URL,
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        max_retries=0,  # 重试由 rate_limiter 统一处理，429 才能反馈到自适应并发
+    )
 
-QWEN_CLIENT = QwenClient(
-    api_key=os.getenv("QWEN_API_KEY") or "sk-f8c157427a204f498f146f2ad401a804",
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
+QWEN_SYSTEM_PROMPT = "You are a helpful assistant."
 
-def call_qwen(prompt: str) -> str:
-    response = QWEN_CLIENT.chat.completions.create(
+
+def call_qwen(prompt: str, stage: str = None, tokens_saved: int = 0, items: int = 1) -> str:
+    return call_llm(QWEN_PLUS_MODEL, prompt, stage, tokens_saved, items)
+
+def _max_tokens_option(meta: dict) -> dict:
+    return {"max_tokens": meta["max_tokens"]} if meta.get("max_tokens") else {}
+
+def _call_qwen(prompt: str, meta: dict) -> str:
+    response = qwen_client().chat.completions.create(
         model="qwen-plus",
         messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "system", "content": QWEN_SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
+        **_max_tokens_option(meta),
         # 若调用 Qwen3 模型且非流式，请开启此选项：
         # extra_body={"enable_thinking": False},
     )
+    if response.usage:
+        _usage(meta, response.usage.prompt_tokens, response.usage.completion_tokens,
+               _cached_tokens(response.usage.model_dump()))
+    meta["finish_reason"] = response.choices[0].finish_reason
     return response.choices[0].message.content
 
-def call_llm(model_name: str, prompt: str) -> str:
-    if model_name == "deepseek-chat":
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_CHAT_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": DEEPSEEK_CHAT_MODEL,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-
-    elif model_name == "deepseek-reasoner":
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_REASONER_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": DEEPSEEK_REASONER_MODEL,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
+def _stream_qwen(prompt: str, meta: dict):
+    response = qwen_client().chat.completions.create(
+        model=QWEN_PLUS_MODEL,
+        messages=[
+            {"role": "system", "content": QWEN_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        stream=True,
+        stream_options={"include_usage": True},
+        **_max_tokens_option(meta),
+    )
+    for chunk in response:
+        if chunk.usage:
+            _usage(meta, chunk.usage.prompt_tokens, chunk.usage.completion_tokens,
+                   _cached_tokens(chunk.usage.model_dump()))
+        if chunk.choices and chunk.choices[0].finish_reason:
+            meta["finish_reason"] = chunk.choices[0].finish_reason
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def stage_route(stage: str, model_name: str) -> list:
+    """返回阶段的路由：[指定的模型, 该阶段的备选模型...]；未开启对冲或未指定阶段时只有指定的模型"""
+    if not LLM_HEDGING or stage is None:
+        return [model_name]
+    return [model_name] + [m for m in STAGE_ROUTES.get(stage, []) if m != model_name]
+
+def stage_max_tokens(stage: str, items: int = 1, model_name: str = None):
+    """阶段的输出 token 上限，批量请求按画像数放大；未配置或模型在 UNCAPPED_MODELS 中时为 None（使用服务端默认值）"""
+    limit = STAGE_MAX_TOKENS.get(stage)
+    if not limit or model_name in UNCAPPED_MODELS:
+        return None
+    return limit * items
+
+
+def _incomplete(model_name: str, stage: str, result: str, meta: dict) -> bool:
+    """
+    正文为空或因达到 max_tokens 被截断时打印警告（调用指标中分别计数），返回正文是否为空；
+    这类输出解析不出评分，评估阶段会退回默认分
+    """
+    empty = not (result and result.strip())
+    truncated = meta.get("finish_reason") == "length"
+    if empty or truncated:
+        print(f"[!] {model_name} 在 {stage or '-'} 阶段返回{'空正文' if empty else '被截断的正文'}"
+              f"（finish_reason={meta.get('finish_reason')}，max_tokens={meta.get('max_tokens')}），"
+              f"评分缺失的部分将使用默认分")
+    return empty
+
+def call_llm(model_name: str, prompt: str, stage: str = None, tokens_saved: int = 0, items: int = 1) -> str:
+    """
+    调用模型
+
+    指定 stage 且开启对冲时按 STAGE_ROUTES 路由：首选模型超过历史耗时分位数仍未返回则向备选模型发出对冲请求，
+    出错时转向备选模型。输出上限取 STAGE_MAX_TOKENS，tokens_saved（压缩提示词节省的 token 数）记入调用指标。
+
+    参数:
+    items (int): 一次请求评估的画像数
+    """
+    if MODEL_PROVIDERS.get(model_name) is None:
+        raise ValueError(f"未知模型: {model_name}")
+    route = stage_route(stage, model_name)
+    if len(route) > 1:
+        return hedged_call(stage, route, lambda model: _call_model(model, prompt, stage, tokens_saved, items))
+    return _call_model(model_name, prompt, stage, tokens_saved, items)
+
+def _call_model(model_name: str, prompt: str, stage: str = None, tokens_saved: int = 0, items: int = 1) -> str:
+    provider = MODEL_PROVIDERS[model_name]
+    if LLM_STREAMING:
+        result = "".join(stream_llm(model_name, prompt, stage, tokens_saved, items))
+        return result.strip() if provider == "spark" else result
+    # 相同模型与提示词的请求直接命中本地缓存
+    start = time.perf_counter()
+    max_tokens = stage_max_tokens(stage, items, model_name)
+    key = _cache_key(model_name, prompt, max_tokens)
+    cached = LLM_CACHE.get(key)
+    if cached is not None:
+        METRICS.record(provider, model_name, stage, time.perf_counter() - start, cache_hit=True,
+                       tokens_saved=tokens_saved)
+        return cached
+    meta = {"max_tokens": max_tokens}
+    try:
+        result = _call_with_retry(model_name, prompt, lambda: _call_llm(model_name, prompt, meta), meta)
+    except Exception as e:
+        METRICS.record(provider, model_name, stage, time.perf_counter() - start, retries=meta.get("retries", 0),
+                       error=type(e).__name__)
+        raise
+    METRICS.record(provider, model_name, stage, time.perf_counter() - start, meta.get("prompt_tokens"),
+                   meta.get("completion_tokens"), meta.get("retries", 0), cached_tokens=meta.get("cached_tokens"),
+                   tokens_saved=tokens_saved, finish_reason=meta.get("finish_reason"),
+                   empty=_incomplete(model_name, stage, result, meta))
+    if _cacheable(result, meta):
+        LLM_CACHE.put(key, provider, model_name, result)
+    return result
+
+def _call_llm(model_name: str, prompt: str, meta: dict) -> str:
+    if LLM_MOCK:
+        return get_mock_llm().complete(model_name, prompt, meta)
+    if model_name not in _MODEL_CALLS:
+        raise ValueError(f"未知模型: {model_name}")
+    return _MODEL_CALLS[model_name][0](prompt, meta)
+
+
+# ===== 流式调用 =====
+# 按模型累加流式调用的次数、首字延迟(TTFT)与生成速度，用于比较各服务商的实际速度
+STREAM_STATS = {}
+_STREAM_STATS_LOCK = threading.Lock()
+
+
+def _cache_key(model_name: str, prompt: str, max_tokens=None) -> str:
+    """
+    与非流式调用共用同一缓存键，流式与非流式结果可以互相命中
+
+    max_tokens 等影响输出的请求参数都计入键，输出上限变化后不会取到按旧上限截断的结果。
+    """
+    params = {"prompt": prompt, "max_tokens": max_tokens}
+    if model_name == QWEN_PLUS_MODEL:
+        return LLM_CACHE.make_key("qwen", QWEN_PLUS_MODEL, {"system": QWEN_SYSTEM_PROMPT, **params})
+    return LLM_CACHE.make_key(MODEL_PROVIDERS[model_name], model_name, params)
+
+
+def _cacheable(result: str, meta: dict) -> bool:
+    """
+    因达到 max_tokens 被截断（finish_reason 为 length）或正文为空的输出不写入缓存，
+    例如 deepseek-reasoner 的思考过程用完输出上限时正文为空，缓存后每次都会解析失败
+    """
+    return bool(result and result.strip()) and meta.get("finish_reason") != "length"
+
+
+def _stream_raw(model_name: str, prompt: str, meta: dict):
+    if LLM_MOCK:
+        return get_mock_llm().stream(model_name, prompt, meta)
+    if model_name not in _MODEL_CALLS:
+        raise ValueError(f"未知模型: {model_name}")
+    return _MODEL_CALLS[model_name][1](prompt, meta)
+
+
+def stream_llm(model_name: str, prompt: str, stage: str = None, tokens_saved: int = 0, items: int = 1):
+    """
+    流式调用模型，输出到达一段就返回一段
+
+    命中缓存时一次性返回完整结果；否则结束后写入缓存，并在 STREAM_STATS 中累加
+    首字延迟和每秒 token 数（服务端未返回用量时按分段数估计 token 数）。
+
+    参数:
+    model_name (str): deepseek-chat / deepseek-reasoner / qwen-plus / spark
+    prompt (str): 提示词
+    stage (str): 阶段名称，用于调用指标和输出上限
+    tokens_saved (int): 压缩提示词节省的 token 数，记入调用指标
+    items (int): 一次请求评估的画像数
+
+    返回:
+    generator: 逐段的文本
+    """
+    provider = MODEL_PROVIDERS.get(model_name)
+    if provider is None:
+        raise ValueError(f"未知模型: {model_name}")
+    call_start = time.perf_counter()
+    max_tokens = stage_max_tokens(stage, items, model_name)
+    key = _cache_key(model_name, prompt, max_tokens)
+    cached = LLM_CACHE.get(key)
+    if cached is not None:
+        METRICS.record(provider, model_name, stage, time.perf_counter() - call_start, cache_hit=True, streamed=True,
+                       tokens_saved=tokens_saved)
+        yield cached
+        return
+
+    limiter = _LIMITERS[provider]
+    tokens = estimate_tokens(prompt)
+    attempt = 0
+    while True:
+        meta = {"max_tokens": max_tokens}
+        parts = []
+        try:
+            with limiter.slot(tokens):
+                start = time.perf_counter()
+                first = None
+                for piece in _stream_raw(model_name, prompt, meta):
+                    if first is None:
+                        first = time.perf_counter()
+                    parts.append(piece)
+                    yield piece
+                end = time.perf_counter()
+        except Exception as e:
+            try:
+                if parts:  # 已经输出了部分内容，无法透明地重试
+                    raise
+                delay = retry_delay(limiter, e, attempt, LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+            except Exception:
+                METRICS.record(provider, model_name, stage, time.perf_counter() - call_start, retries=attempt,
+                               streamed=True, error=type(e).__name__)
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        limiter.on_success()
+        LATENCY.record(model_name, end - start)
+        TTFT.record(model_name, (first if first is not None else end) - start)
+        break
+
+    tokens = meta.get("completion_tokens") or len(parts)
+    result = "".join(parts)
+    METRICS.record(provider, model_name, stage, end - call_start, meta.get("prompt_tokens"),
+                   meta.get("completion_tokens"), attempt, streamed=True, cached_tokens=meta.get("cached_tokens"),
+                   tokens_saved=tokens_saved, ttft=(first if first is not None else end) - start,
+                   finish_reason=meta.get("finish_reason"), empty=_incomplete(model_name, stage, result, meta))
+    generating = end - first if first is not None else 0.0
+    with _STREAM_STATS_LOCK:
+        stat = STREAM_STATS.setdefault(model_name, {"calls": 0, "ttft": 0.0, "tokens_per_sec": 0.0})
+        stat["calls"] += 1
+        stat["ttft"] += (first if first is not None else end) - start
+        stat["tokens_per_sec"] += tokens / generating if generating > 0 else 0.0
+    if _cacheable(result, meta):
+        LLM_CACHE.put(key, provider, model_name, result.strip() if provider == "spark" else result)
+
+
+def _open_stream(model_name: str, prompt: str, stage: str, tokens_saved: int, items: int):
+    """开始流式请求并等到第一段输出，返回 (第一段, 其余各段的迭代器)；没有输出时第一段为空字符串"""
+    pieces = stream_llm(model_name, prompt, stage, tokens_saved, items)
+    return next(pieces, ""), pieces
+
+
+def stream_routed(model_name: str, prompt: str, stage: str = None, tokens_saved: int = 0, items: int = 1):
+    """
+    按阶段路由的流式调用，与 call_llm 使用相同的 STAGE_ROUTES
+
+    首选模型超过其首段延迟(TTFT)分位数仍没有输出时向备选模型发出对冲请求，采用先输出第一段的流；
+    第一段之前出错时转向备选模型。已经输出内容后出错无法透明切换，直接抛出异常。
+    落后的流拿到第一段后即被关闭，不写入缓存。参数与 stream_llm 相同。
+    """
+    route = stage_route(stage, model_name)
+    if len(route) == 1:
+        yield from stream_llm(model_name, prompt, stage, tokens_saved, items)
+        return
+    first, pieces = hedged_call(stage, route, lambda model: _open_stream(model, prompt, stage, tokens_saved, items),
+                                tracker=TTFT)
+    if first:
+        yield first
+    yield from pieces
+
+
+def stream_stats_summary() -> dict:
+    """按模型汇总流式调用的次数、平均首字延迟(秒)与平均每秒 token 数"""
+    with _STREAM_STATS_LOCK:
+        return {model: {"calls": stat["calls"], "ttft": stat["ttft"] / stat["calls"],
+                        "tokens_per_sec": stat["tokens_per_sec"] / stat["calls"]}
+                for model, stat in STREAM_STATS.items()}
 
-    elif model_name == "spark":
-        spark = ChatSparkLLM(
-            spark_api_url=SPARKAI_URL,
-            spark_app_id=SPARKAI_APP_ID,
-            spark_api_key=SPARKAI_API_KEY,
-            spark_api_secret=SPARKAI_API_SECRET,
-            spark_llm_domain=SPARKAI_DOMAIN,
-            streaming=False,
-        )
-        messages = [ChatMessage(role="user", content=prompt)]
-        result = spark.generate([messages])
-        return result.generations[0][0].text.strip()
 
-    else:
-        raise ValueError(f"未知模型: {model_name}")
\ No newline at end of file
+# ===== 模型注册 =====
+register_model("deepseek-chat", "deepseek",
+               partial(_post_chat, DEEPSEEK_BASE_URL, DEEPSEEK_CHAT_API_KEY, DEEPSEEK_CHAT_MODEL),
+               partial(_stream_chat, DEEPSEEK_BASE_URL, DEEPSEEK_CHAT_API_KEY, DEEPSEEK_CHAT_MODEL))
+register_model("deepseek-reasoner", "deepseek",
+               partial(_post_chat, DEEPSEEK_BASE_URL, DEEPSEEK_REASONER_API_KEY, DEEPSEEK_REASONER_MODEL),
+               partial(_stream_chat, DEEPSEEK_BASE_URL, DEEPSEEK_REASONER_API_KEY, DEEPSEEK_REASONER_MODEL))
+register_model(QWEN_PLUS_MODEL, "qwen", _call_qwen, _stream_qwen)
+register_model("spark", "spark", _call_spark, _stream_spark)
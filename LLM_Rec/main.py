@@ -1,20 +1,23 @@
+import argparse
 import json
-import re
 import os
-import pandas as pd
+from functools import partial
 import numpy as np
-import matplotlib.pyplot as plt
-from evaluator_hallucination import evaluate_hallucination
-from evaluator_logic import evaluate_logic
-from evaluator_subjective import evaluate_subjective
-from llm_generator import generate_recommendation
-from reward_utils import compute_reward
+from call_metrics import METRICS
+from llm_cache import LLM_CACHE
+from llm_hedging import route_summary
+from llm_router import stream_stats_summary
+from config import EVAL_BATCH_SIZE, LLM_VERBOSE
+from online_metrics import OnlineMetrics
+from pipeline_runner import process_profile, run_profiles, run_profiles_batched, score_result
+from rating_store import get_rating_store
+from result_store import ResultLog
+from results_db import ResultsDB
+from title_index import get_title_index
 
 # 路径设置
-MERGED_FILE = "D:/测试/pythonProject1/ml-1m/merged_ratings_movies.csv"
 RESULT_PATH = "D:/测试/pythonProject1/data/result.json"
 REWARD_PATH = "D:/测试/pythonProject1/data/rewards.json"
-os.makedirs("D:/测试/pythonProject1/data", exist_ok=True)
 
 # JSON 序列化处理器
 class NpEncoder(json.JSONEncoder):
@@ -27,137 +30,100 @@ class NpEncoder(json.JSONEncoder):
             return obj.tolist()
         return super().default(obj)
 
-# 标准化电影标题
-def normalize_title(title):
-    return re.sub(r"[^\w\s]", "", title.lower().strip()) if isinstance(title, str) else ""
-
-# 加载数据
-merged_data = pd.read_csv(MERGED_FILE)
-merged_data['Title_Normalized'] = merged_data['Title'].apply(normalize_title)
-
-with open("data/user_profiles.json", "r", encoding="utf-8") as f:
-    user_profiles = json.load(f)
-
-user_profiles = user_profiles[11:12]
-
-final_results = []
-matched_ratings = []
-rewards = []
-
-# 步骤 1: 生成推荐与评估
-for profile in user_profiles:
-    uid = profile["uid"]
-    desc = profile["description"]
-    recommendation = generate_recommendation(desc)
-
-    movies = re.findall(r"\*\*(.+?)\*\*", recommendation)
-    subjective = evaluate_subjective(desc, recommendation)
-    logic = evaluate_logic(recommendation, "spark", subjective)
-    hallucination = evaluate_hallucination(recommendation, "deepseek-reasoner", logic, subjective)
-
-    final_results.append({
-        "user": profile,
-        "rec": recommendation,
-        "recommendations": movies,
-        "subjective_result": subjective,
-        "logic_result": logic,
-        "hallucination_result": hallucination
-    })
+
+def run(user_profiles, results_db, online_metrics, result_log=None, verbose=LLM_VERBOSE):
+    """
+    步骤 1-3: 生成推荐与评估（多个画像并发执行，单个画像内各阶段保持顺序），每个画像完成时
+    标题经索引解析为 MovieID（允许年份缺失、冠词位置不同等格式差异），批量查询真实评分，
+    按 (用户, 标题) 连接评估结果计算奖励写入结果库，并计入在线指标
+
+    参数:
+    user_profiles (list): 用户画像
+    results_db (ResultsDB): 结果库
+    online_metrics (OnlineMetrics): 在线指标
+    result_log (ResultLog): 结果日志，每个阶段的结果追加写入，中断后可只补跑未完成的部分
+    verbose (bool): 是否打印逐条匹配信息
+
+    返回:
+    list: 各画像的结果
+    """
+    def report(i, result):
+        uid = result["user"]["uid"]
+        print(f"✅ 用户 {uid} 处理完成")
+        provider = METRICS.pop_served(str(uid), "generator")
+        # 评分索引与标题索引到第一个画像完成时才加载，不推迟第一个请求
+        for reward in score_result(result, results_db, get_title_index(), get_rating_store(), verbose=verbose):
+            online_metrics.update(reward, result["user"], provider)
+
+    if EVAL_BATCH_SIZE > 1:
+        # 评估阶段每 EVAL_BATCH_SIZE 个画像合并为一个请求
+        return run_profiles_batched(user_profiles, result_log=result_log, on_result=report)
+    return run_profiles(user_profiles, worker=partial(process_profile, result_log=result_log), on_result=report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成推荐、评估并与用户真实评分对比")
+    parser.add_argument("--resume", action="store_true", help="从结果日志续跑，跳过已完成的 (用户, 阶段)")
+    parser.add_argument("--plot", action="store_true", help="结束时画出评分对比图（需要 matplotlib，没有图形界面时跳过）")
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(RESULT_PATH), exist_ok=True)
+
+    # 加载数据
+    with open("data/user_profiles.json", "r", encoding="utf-8") as f:
+        user_profiles = json.load(f)
+
+    user_profiles = user_profiles[11:12]
+
+    results_db = ResultsDB()
+    online_metrics = OnlineMetrics()  # 每条奖励产生时更新，定期把分组指标写入 ONLINE_METRICS_PATH
+
+    # 步骤 1-3（见 run）
+    with ResultLog(resume=args.resume) as result_log:
+        done = sum(result_log.is_complete(p["uid"]) for p in user_profiles)
+        if args.resume:
+            print(f"续跑：{done}/{len(user_profiles)} 个用户已全部完成，其余用户只补跑未完成的阶段")
+        final_results = run(user_profiles, results_db, online_metrics, result_log=result_log)
+
     with open(RESULT_PATH, "w", encoding="utf-8") as f:
         json.dump(final_results, f, indent=2, ensure_ascii=False, cls=NpEncoder)
     print("✅ 已生成 result.json")
 
-# 步骤 2: 匹配用户评分
-for result in final_results:
-    uid = result["user"]["uid"]
-    for movie in result["recommendations"]:
-        norm_title = normalize_title(movie)
-        match = merged_data[merged_data["Title_Normalized"] == norm_title]
-        if not match.empty:
-            row = match.iloc[0]
-            movie_id = int(row["MovieID"])
-            rating_row = match[match["UserID"] == int(uid)]
-            if not rating_row.empty:
-                rating = int(rating_row["Rating"].values[0])
-                matched_ratings.append({
-                    "user_id": uid,
-                    "movie": movie,
-                    "movie_id": movie_id,
-                    "rating": rating
-                })
-
-# 步骤 3: 计算奖励
-for r in matched_ratings:
-    uid = r["user_id"]
-    movie_name = r["movie"]
-    norm_movie = normalize_title(movie_name)
-
-    result = next((res for res in final_results if res["user"]["uid"] == uid), None)
-    if not result:
-        continue
-
-    try:
-        subj_raw = result["subjective_result"].replace("```json", "").replace("```", "").strip()
-        logic_raw = result["logic_result"].replace("```json", "").replace("```", "").strip()
-        halluc_raw = result["hallucination_result"].replace("```json", "").replace("```", "").strip()
-
-        subj = json.loads(subj_raw)
-        logic = json.loads(logic_raw)
-        halluc = json.loads(halluc_raw)
-    except Exception as e:
-        print(f"[!] 解析JSON失败: {e}")
-        continue
-
-    subj_match = next((item for item in subj if normalize_title(item.get("Movie", "")) == norm_movie), None)
-    logic_match = next((item for item in logic if normalize_title(item.get("Movie", "")) == norm_movie), None)
-
-    if subj_match and logic_match:
-        reward = compute_reward(
-            subjective_scores=subj_match,
-            logic_result=logic_match,
-            hallucination_result=halluc,
-            verbose=True
-        )
-        rewards.append({
-            "user_id": uid,
-            "movie_id": r["movie_id"],
-            "movie_name": movie_name,
-            "reward": reward,
-            "user_rating": r["rating"]
-        })
-        with open(REWARD_PATH, "w", encoding="utf-8") as f:
-            json.dump(rewards, f, indent=2, ensure_ascii=False, cls=NpEncoder)
-        print("✅ 已生成 rewards.json")
-        # 步骤 4: 打印对比
-        print("\n开始对比LLM推荐分数与用户真实评分...")
-        for r in matched_ratings:
-            for rw in rewards:
-                if r["user_id"] == rw["user_id"] and r["movie_id"] == rw["movie_id"]:
-                    print(f"用户 {r['user_id']}，电影ID {r['movie_id']}：用户评分 {r['rating']}，LLM推荐分数 {rw['reward']:.2f}")
-
-
-# 步骤 5: 计算 MAE / STD 并可视化对比
-movie_names = [r["movie_id"] for r in rewards]
-user_scores = [r["user_rating"] for r in rewards]
-llm_scores = [r["reward"] for r in rewards]
-
-mae = np.mean([abs(u - l) for u, l in zip(user_scores, llm_scores)])
-std = np.std([u - l for u, l in zip(user_scores, llm_scores)])
-
-print(f"\n📈 MAE (平均绝对误差): {mae:.3f}")
-print(f"📊 STD (标准差): {std:.3f}")
-
-# 可视化
-x = np.arange(len(movie_names))
-width = 0.35
-fig, ax = plt.subplots(figsize=(10, 5))
-rects1 = ax.bar(x - width/2, user_scores, width, label='User Score')
-rects2 = ax.bar(x + width/2, llm_scores, width, label='LLM Score')
-
-ax.set_ylabel('Score')
-ax.set_title('LLM vs User Scores by Movie')
-ax.set_xticks(x)
-ax.set_xticklabels(movie_names, rotation=45, ha='right')
-ax.legend()
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+    cache_stats = LLM_CACHE.stats()
+    print(f"LLM 缓存({cache_stats['mode']}): 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+          f"共 {cache_stats['entries']} 条")
+    for model, stat in stream_stats_summary().items():
+        print(f"{model}: 流式调用 {stat['calls']} 次，平均首字延迟 {stat['ttft']:.2f}s，"
+              f"平均生成速度 {stat['tokens_per_sec']:.1f} tokens/s")
+    routes = route_summary()
+    if routes["calls"]:
+        print(f"路由调用 {routes['calls']} 次，其中对冲 {routes['hedged']} 次，故障转移 {routes['failed_over']} 次")
+        for (stage, model), count in sorted(routes["served"].items()):
+            print(f"  {stage}: {model} 返回 {count} 次")
+    METRICS.print_summary()  # 逐次调用的明细在 CALL_METRICS_PATH 中
+    METRICS.close()
+
+    # 奖励记录已在每个画像完成时写入结果库（见 run），从结果库逐条导出
+    results_db.export_rewards(REWARD_PATH)
+    print("✅ 已生成 rewards.json")
+
+    # 步骤 4: 打印对比
+    print("\n开始对比LLM推荐分数与用户真实评分...")
+    for uid, movie_id, rating, reward in results_db.comparisons():
+        print(f"用户 {uid}，电影ID {movie_id}：用户评分 {rating}，LLM推荐分数 {reward:.2f}")
+
+    # 步骤 5: 汇总在线指标（MAE / RMSE / STD / 相关系数，按画像字段和服务商分组），写入最终快照；
+    # 指定 --plot 且有图形界面时可视化对比
+    online_metrics.snapshot()
+    online_metrics.print_summary()
+
+    if args.plot:
+        from plotting import is_headless, plot_scores
+        if is_headless():
+            print("没有图形界面，跳过绘图")
+        else:
+            plot_scores(list(results_db.iter_rewards()))
+    results_db.close()
+
+
+if __name__ == "__main__":
+    main()
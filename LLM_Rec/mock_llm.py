@@ -0,0 +1,166 @@
+# mock_llm.py
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from config import MOCK_ERROR_RATE, MOCK_LATENCY_MS, MOCK_LATENCY_SIGMA, MOCK_MALFORMED_RATE, MOCK_SEED
+from rate_limiter import estimate_tokens
+
+TITLE_RE = re.compile(r"\*\*(.+?\(\d{4}\))\s*\*\*")  # 推荐内容中带年份的 **标题**
+CANDIDATE_RE = re.compile(r"^\s*- (?!\*\*)(.+?)\s*$", re.M)  # 生成提示词里的候选电影行
+ITEM_RE = re.compile(r"\[id=([^\]]+)\]")  # 批量评估提示词中的条目
+PREFIX_BLOCK_CHARS = 256  # 模拟服务端按固定长度的块缓存提示词前缀
+
+
+class MockAPIError(Exception):
+    """模拟服务端返回的可重试错误，带 status_code 以便 rate_limiter 按 HTTP 错误处理"""
+
+    def __init__(self, status_code):
+        super().__init__(f"mock provider returned {status_code}")
+        self.status_code = status_code
+
+
+class MockLLM:
+    """
+    本地模拟的 LLM 服务，不需要任何 API 密钥和网络
+
+    根据提示词识别生成/主观/逻辑/幻觉阶段（包括批量评估），返回格式正确、内容由提示词决定的结果；
+    耗时服从对数正态分布（中位数 latency_ms，形状参数 sigma），并按 error_rate 抛出 429/503 错误、
+    按 malformed_rate 返回被截断的 JSON；同一模型此前见过的提示词前缀按块计为前缀缓存命中（cached_tokens）。
+
+    参数:
+    latency_ms (float): 耗时中位数(毫秒)
+    sigma (float): 对数正态分布的形状参数，越大长尾越明显
+    error_rate (float): 返回错误的概率
+    malformed_rate (float): 评估结果 JSON 被截断的概率
+    seed (int): 随机种子
+    """
+
+    def __init__(self, latency_ms=MOCK_LATENCY_MS, sigma=MOCK_LATENCY_SIGMA, error_rate=MOCK_ERROR_RATE,
+                 malformed_rate=MOCK_MALFORMED_RATE, seed=MOCK_SEED):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes = set()
+
+    def _draw(self):
+        """抽取本次调用的耗时(秒)、是否出错、是否返回截断的 JSON"""
+        with self._lock:
+            latency = self.latency_ms / 1000.0 * self._random.lognormvariate(0.0, self.sigma)
+            error = self._random.random() < self.error_rate
+            malformed = self._random.random() < self.malformed_rate
+            status = self._random.choice((429, 503))
+        return latency, (status if error else None), malformed
+
+    def _cached_tokens(self, model, prompt):
+        """返回提示词开头连续命中前缀缓存的 token 数，并记住本次提示词的各个前缀块"""
+        digest = hashlib.sha256(model.encode("utf-8"))
+        keys = []
+        for end in range(PREFIX_BLOCK_CHARS, len(prompt) + 1, PREFIX_BLOCK_CHARS):
+            digest.update(prompt[end - PREFIX_BLOCK_CHARS:end].encode("utf-8"))
+            keys.append(digest.digest())
+        with self._lock:
+            hits = next((i for i, key in enumerate(keys) if key not in self._prefixes), len(keys))
+            self._prefixes.update(keys)
+        return estimate_tokens(prompt[:hits * PREFIX_BLOCK_CHARS]) - 1 if hits else 0
+
+    def _rng(self, *parts):
+        """同样的提示词得到同样的内容"""
+        digest = hashlib.sha256("\x1f".join(map(str, (self.seed,) + parts)).encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    # ===== 各阶段的回复 =====
+    def _generation(self, model, prompt):
+        candidates = CANDIDATE_RE.findall(prompt) or ["Toy Story (1995)"]
+        rng = self._rng(model, prompt)
+        picks = rng.sample(candidates, min(3, len(candidates)))
+        return "\n\n".join(f"{i}. **{title}**  \n   - **Why?** It matches the genres this user rates highly."
+                           for i, title in enumerate(picks, 1))
+
+    def _scores(self, stage, model, item_id, title):
+        rng = self._rng(stage, model, item_id, title)
+        entry = {"Movie": title, "Explanation": "Mock evaluation."}
+        if stage == "subjective":
+            entry.update({k: rng.randint(1, 5) for k in ("Relevance", "Clarity", "Persuasiveness")})
+        elif stage == "logic":
+            entry.update({k: rng.randint(1, 5) for k in ("Content-Matching", "Logic-Clarity")})
+        else:
+            entry.update({"Hallucination-Risk": rng.randint(0, 5), "Explanatory Validity": rng.randint(0, 5)})
+        return entry
+
+    def _evaluation(self, stage, model, prompt):
+        parts = ITEM_RE.split(prompt)
+        if len(parts) == 1:
+            titles = list(dict.fromkeys(TITLE_RE.findall(prompt)))
+            return json.dumps([self._scores(stage, model, None, t) for t in titles], ensure_ascii=False, indent=2)
+        entries = []
+        for item_id, text in zip(parts[1::2], parts[2::2]):
+            for title in dict.fromkeys(TITLE_RE.findall(text)):
+                entries.append({"id": item_id, **self._scores(stage, model, item_id, title)})
+        return json.dumps(entries, ensure_ascii=False, indent=2)
+
+    def respond(self, model, prompt):
+        """按提示词生成回复内容（不含耗时与错误）"""
+        if "You are checking for hallucinations" in prompt:
+            return self._evaluation("hallucination", model, prompt)
+        if "You are evaluating the logical consistency" in prompt:
+            return self._evaluation("logic", model, prompt)
+        if "You are simulating" in prompt:
+            return self._evaluation("subjective", model, prompt)
+        return self._generation(model, prompt)
+
+    # ===== 与 llm_router 对接 =====
+    def complete(self, model, prompt, meta):
+        latency, status, malformed = self._draw()
+        time.sleep(latency)
+        if status is not None:
+            raise MockAPIError(status)
+        content = self.respond(model, prompt)
+        meta["finish_reason"] = "stop"
+        if malformed and content.lstrip().startswith("["):
+            # 模拟达到 max_tokens 被截断
+            content = content[:len(content) // 2]
+            meta["finish_reason"] = "length"
+        meta["prompt_tokens"] = estimate_tokens(prompt)
+        meta["cached_tokens"] = self._cached_tokens(model, prompt)
+        meta["completion_tokens"] = estimate_tokens(content)
+        return content
+
+    def stream(self, model, prompt, meta, chunk_chars=16):
+        """按 chunk_chars 个字符一段流式返回，首段在总耗时的 1/4 时到达"""
+        latency, status, malformed = self._draw()
+        time.sleep(latency / 4)
+        if status is not None:
+            raise MockAPIError(status)
+        content = self.respond(model, prompt)
+        meta["finish_reason"] = "stop"
+        if malformed and content.lstrip().startswith("["):
+            # 模拟达到 max_tokens 被截断
+            content = content[:len(content) // 2]
+            meta["finish_reason"] = "length"
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+        for piece in pieces:
+            yield piece
+            time.sleep(latency * 3 / 4 / max(1, len(pieces)))
+        meta["prompt_tokens"] = estimate_tokens(prompt)
+        meta["cached_tokens"] = self._cached_tokens(model, prompt)
+        meta["completion_tokens"] = estimate_tokens(content)
+
+
+_MOCK = None
+_MOCK_LOCK = threading.Lock()
+
+
+def get_mock_llm():
+    global _MOCK
+    with _MOCK_LOCK:
+        if _MOCK is None:
+            _MOCK = MockLLM()
+        return _MOCK
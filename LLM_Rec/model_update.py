@@ -1,18 +1,20 @@
+import argparse
 import json
+import os
+
+import numpy as np
+
+from config import CALIBRATION_STATE_PATH, REWARD_WEIGHTS_PATH
+from reward_utils import STAGE_WEIGHT_KEYS, load_weights, save_weights
+
+STAGES = ("subjective", "logic", "hallucination")
+IRLS_EPSILON = 1e-3  # 残差绝对值的下限，避免 IRLS 权重发散
+
 
 # 简单示例：更新评估权重
 def update_model(user_description, recommendation, manual_score, reasons):
     # 读取当前权重
-    try:
-        with open('weights.json', 'r', encoding='utf-8') as f:
-            weights = json.load(f)
-    except FileNotFoundError:
-        # 如果文件不存在，初始化权重
-        weights = {
-            "alpha": 0.4,  # 主观满意度权重
-            "beta": 0.3,   # 逻辑一致性权重
-            "gamma": 0.3   # 幻觉风险反向权重
-        }
+    weights = load_weights()
 
     # 根据用户反馈简单调整权重
     if "类别错误" in reasons:
@@ -29,14 +31,196 @@ def update_model(user_description, recommendation, manual_score, reasons):
         weights["beta"] -= 0.05
 
     # 确保权重在合理范围内
-    for key in weights:
+    for key in STAGE_WEIGHT_KEYS:
         if weights[key] < 0:
             weights[key] = 0
         elif weights[key] > 1:
             weights[key] = 1
 
     # 保存更新后的权重
-    with open('weights.json', 'w', encoding='utf-8') as f:
-        json.dump(weights, f, ensure_ascii=False, indent=2)
+    save_weights(weights)
+
+    print("模型评估权重已更新:", weights)
+
+
+def load_rated_pairs(paths):
+    """
+    从一个或多个 rewards.json 读取带阶段得分的奖励记录
+
+    返回:
+    tuple: (阶段得分 (n, 3)，列顺序同 STAGES；真实评分 (n,))
+    """
+    stages, ratings = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for r in json.load(f):
+                if all(r.get(stage) is not None for stage in STAGES):
+                    stages.append([r[stage] for stage in STAGES])
+                    ratings.append(r["user_rating"])
+    return np.array(stages, dtype=float).reshape(-1, len(STAGES)), np.array(ratings, dtype=float)
+
+
+def _design(stages, affine):
+    stages = np.asarray(stages, dtype=float)
+    return np.hstack([stages, np.ones((len(stages), 1))]) if affine else stages
+
+
+def _solve_nonneg(xtx, xty):
+    """
+    求解正规方程，阶段权重约束为非负（截距不受约束）：出现负权重时把最负的一项固定为 0 后重新求解
+
+    返回:
+    np.ndarray: 与 xtx 列数相同的解
+    """
+    n = len(xty)
+    active = list(range(n))
+    while True:
+        sol = np.zeros(n)
+        sol[active] = np.linalg.lstsq(xtx[np.ix_(active, active)], xty[active], rcond=None)[0]
+        negative = [i for i in active if i < len(STAGES) and sol[i] < 0]
+        if not negative:
+            return sol
+        active.remove(min(negative, key=lambda i: sol[i]))
+
+
+def _to_weights(sol):
+    weights = dict(zip(STAGE_WEIGHT_KEYS, (float(v) for v in sol[:len(STAGES)])))
+    weights["bias"] = float(sol[len(STAGES)]) if len(sol) > len(STAGES) else 0.0
+    return weights
+
+
+def fit_weights(stages, ratings, affine=True, max_iter=50, tol=1e-6):
+    """
+    拟合阶段权重，使奖励与真实评分的平均绝对误差(MAE)最小
+
+    用迭代重加权最小二乘(IRLS)求解最小绝对偏差回归：每轮按 1/|残差| 加权解一次非负约束的最小二乘。
+
+    参数:
+    stages (np.ndarray): (n, 3) 主观/逻辑/幻觉阶段得分
+    ratings (np.ndarray): (n,) 真实评分
+    affine (bool): 是否同时拟合截距（仿射校准）
+    max_iter (int): 最大迭代次数
+    tol (float): 解的变化小于该值时停止
+
+    返回:
+    dict: {"alpha", "beta", "gamma", "bias"}
+    """
+    x = _design(stages, affine)
+    y = np.asarray(ratings, dtype=float)
+    w = np.ones(len(y))
+    sol = np.zeros(x.shape[1])
+    for _ in range(max_iter):
+        xw = x * w[:, None]
+        new_sol = _solve_nonneg(xw.T @ x, xw.T @ y)
+        converged = np.max(np.abs(new_sol - sol)) < tol
+        sol = new_sol
+        if converged:
+            break
+        w = 1.0 / np.maximum(np.abs(y - x @ sol), IRLS_EPSILON)
+    return _to_weights(sol)
+
+
+class WeightCalibrator:
+    """
+    增量校准：累积加权正规方程的统计量 X^T W X 与 X^T W y，新的评分对到来时只处理新数据
+
+    每条新数据按当前权重下的残差取 IRLS 权重 1/|残差|，相当于对全部历史数据做一轮近似的 IRLS，
+    数据量较大时与 fit_weights 的批量结果接近；需要精确结果时用批量模式重新拟合。
+    """
+
+    def __init__(self, affine=True):
+        self.affine = affine
+        size = len(STAGES) + (1 if affine else 0)
+        self.xtx = np.zeros((size, size))
+        self.xty = np.zeros(size)
+        self.count = 0
+
+    def update(self, stages, ratings, weights=None):
+        x = _design(stages, self.affine)
+        y = np.asarray(ratings, dtype=float)
+        if weights is None:
+            w = np.ones(len(y))
+        else:
+            sol = np.array([weights[k] for k in STAGE_WEIGHT_KEYS] + ([weights.get("bias", 0.0)] if self.affine else []))
+            w = 1.0 / np.maximum(np.abs(y - x @ sol), IRLS_EPSILON)
+        xw = x * w[:, None]
+        self.xtx += xw.T @ x
+        self.xty += xw.T @ y
+        self.count += len(y)
+
+    def solve(self):
+        return _to_weights(_solve_nonneg(self.xtx, self.xty))
+
+    def save(self, path=CALIBRATION_STATE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, xtx=self.xtx, xty=self.xty, count=self.count, affine=self.affine)
+
+    @classmethod
+    def load(cls, path=CALIBRATION_STATE_PATH, affine=None):
+        """读取保存的统计量；给定 affine 时要求与保存时的设置一致，否则抛出 ValueError"""
+        with np.load(path) as state:
+            saved_affine = bool(state["affine"])
+            if affine is not None and affine != saved_affine:
+                raise ValueError(f"{path} 中的统计量{'包含' if saved_affine else '不含'}截距，与本次设置 affine={affine} 不一致；"
+                                 f"请去掉 --incremental 按当前设置重新批量拟合，或换用其他状态文件")
+            calibrator = cls(affine=saved_affine)
+            calibrator.xtx = state["xtx"]
+            calibrator.xty = state["xty"]
+            calibrator.count = int(state["count"])
+        return calibrator
+
+
+def calibrate(paths, affine=True, incremental=False, state_path=CALIBRATION_STATE_PATH,
+              weights_path=REWARD_WEIGHTS_PATH):
+    """
+    用真实评分拟合阶段权重并写入 weights.json，compute_reward / compute_rewards 之后都使用新权重
+
+    参数:
+    paths (list): rewards.json 路径
+    affine (bool): 是否拟合截距
+    incremental (bool): 在已保存的统计量上累加这些新数据，而不是对它们重新批量拟合
+    state_path (str): 增量统计量的保存路径
+    weights_path (str): 权重文件
+
+    返回:
+    dict: 新权重
+    """
+    stages, ratings = load_rated_pairs(paths)
+    if len(ratings) == 0:
+        print("[!] 没有带阶段得分的评分记录，权重保持不变")
+        return load_weights(weights_path)
+
+    before = load_weights(weights_path)
+    if incremental:
+        if os.path.exists(state_path):
+            calibrator = WeightCalibrator.load(state_path, affine)
+            calibrator.update(stages, ratings, before)
+        else:
+            calibrator = WeightCalibrator(affine)
+            calibrator.update(stages, ratings)
+        weights = calibrator.solve()
+    else:
+        weights = fit_weights(stages, ratings, affine)
+        calibrator = WeightCalibrator(affine)
+        calibrator.update(stages, ratings, weights)
+    calibrator.save(state_path)
+    save_weights(weights, weights_path)
+
+    def mae(w):
+        reward = stages @ np.array([w[k] for k in STAGE_WEIGHT_KEYS]) + w.get("bias", 0.0)
+        return float(np.mean(np.abs(np.clip(reward, 1.0, 5.0) - ratings)))
+
+    print(f"用 {len(ratings)} 条评分校准权重（累计 {calibrator.count} 条）: {weights}")
+    print(f"MAE: {mae(before):.4f} -> {mae(weights):.4f}")
+    return weights
+
 
-    print("模型评估权重已更新:", weights)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用真实评分拟合奖励的阶段权重")
+    parser.add_argument("rewards", nargs="*", default=["data/rewards.json"], help="rewards.json 路径，可给多个")
+    parser.add_argument("--incremental", action="store_true", help="在已保存的统计量上增量更新")
+    parser.add_argument("--no-affine", action="store_true", help="不拟合截距")
+    args = parser.parse_args()
+    calibrate(args.rewards, affine=not args.no_affine, incremental=args.incremental)
@@ -0,0 +1,239 @@
+# online_metrics.py
+import csv
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from config import METRICS_HISTOGRAM_BINS, METRICS_SNAPSHOT_INTERVAL, ONLINE_METRICS_PATH
+
+STAGES = ("subjective", "logic", "hallucination")
+# 分组字段：画像字段、首个偏好题材、生成推荐的服务商
+SEGMENT_FIELDS = ("age_group", "gender", "occupation", "top_interest", "provider")
+SCORE_RANGE = (1.0, 5.0)
+RATING_LEVELS = 5  # 真实评分为 1-5 的整数，Spearman 的评分一侧按取值精确分组
+FIELDS = ["segment", "value", "count", "mae", "rmse", "error_mean", "error_std", "pearson", "spearman",
+          "reward_mean", "reward_std", "rating_mean", "rating_std",
+          *(f"{stage}_{stat}" for stage in STAGES for stat in ("mean", "std", "p10", "p50", "p90")),
+          "updated_at"]
+
+
+class RunningStats:
+    """Welford 算法的流式均值与方差（总体方差，与 np.std 一致）"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        """计入一个值，返回它与旧均值之差（用于增量更新协方差）"""
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        return delta
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n else 0.0
+
+
+def _bin(value, bins=METRICS_HISTOGRAM_BINS):
+    low, high = SCORE_RANGE
+    return min(bins - 1, max(0, int((value - low) / (high - low) * bins)))
+
+
+def _mid_ranks(counts):
+    """每个分箱的平均秩：同一分箱内的值视为并列"""
+    return np.cumsum(counts) - counts + (counts + 1) / 2.0
+
+
+def _quantile(counts, q):
+    """由直方图估计分位数，取所在分箱的下界（误差不超过一个分箱宽度）"""
+    total = counts.sum()
+    if not total:
+        return None
+    low, high = SCORE_RANGE
+    index = int(np.searchsorted(np.cumsum(counts), q * total))
+    return low + index * (high - low) / len(counts)
+
+
+class SegmentMetrics:
+    """
+    一个分组的流式误差指标：MAE、RMSE、误差均值与标准差、Pearson、Spearman、各阶段得分分布
+
+    Pearson 用 Welford 的协方差增量更新；Spearman 由 (奖励分箱, 真实评分) 的二维直方图按平均秩计算，
+    真实评分按整数取值精确分组，奖励落在同一分箱（默认宽 0.01 分）内视为并列，与精确值的差别可以忽略。
+    阶段得分分位数同样取自分箱直方图。所有状态大小只取决于分箱数。
+    """
+
+    def __init__(self, bins=METRICS_HISTOGRAM_BINS):
+        self.abs_error = 0.0
+        self.sq_error = 0.0
+        self.error = RunningStats()
+        self.reward = RunningStats()
+        self.rating = RunningStats()
+        self.co_moment = 0.0
+        self.joint = np.zeros((bins, RATING_LEVELS), dtype=np.int64)
+        self.stages = {stage: RunningStats() for stage in STAGES}
+        self.stage_hist = {stage: np.zeros(bins, dtype=np.int64) for stage in STAGES}
+
+    @property
+    def count(self):
+        return self.error.n
+
+    def add(self, reward, rating, stages):
+        error = rating - reward
+        self.abs_error += abs(error)
+        self.sq_error += error * error
+        self.error.add(error)
+        delta = self.reward.add(reward)
+        self.rating.add(rating)
+        self.co_moment += delta * (rating - self.rating.mean)
+        bins = len(self.joint)
+        self.joint[_bin(reward, bins), min(RATING_LEVELS, max(1, int(round(rating)))) - 1] += 1
+        for stage in STAGES:
+            if stages.get(stage) is not None:
+                self.stages[stage].add(stages[stage])
+                self.stage_hist[stage][_bin(stages[stage], bins)] += 1
+
+    def pearson(self):
+        denom = math.sqrt(self.reward.m2 * self.rating.m2)
+        return self.co_moment / denom if denom > 0 else None
+
+    def spearman(self):
+        total = self.joint.sum()
+        if total < 2:
+            return None
+        rows, cols = self.joint.sum(axis=1), self.joint.sum(axis=0)
+        rank_x = _mid_ranks(rows) - (total + 1) / 2.0
+        rank_y = _mid_ranks(cols) - (total + 1) / 2.0
+        denom = math.sqrt(float(rows @ rank_x ** 2) * float(cols @ rank_y ** 2))
+        return float(rank_x @ self.joint @ rank_y) / denom if denom > 0 else None
+
+    def row(self):
+        n = self.count
+        row = {
+            "count": n,
+            "mae": self.abs_error / n,
+            "rmse": math.sqrt(self.sq_error / n),
+            "error_mean": self.error.mean,
+            "error_std": self.error.std,
+            "pearson": self.pearson(),
+            "spearman": self.spearman(),
+            "reward_mean": self.reward.mean,
+            "reward_std": self.reward.std,
+            "rating_mean": self.rating.mean,
+            "rating_std": self.rating.std,
+        }
+        for stage in STAGES:
+            stats, hist = self.stages[stage], self.stage_hist[stage]
+            row[f"{stage}_mean"] = stats.mean if stats.n else None
+            row[f"{stage}_std"] = stats.std if stats.n else None
+            for q in (10, 50, 90):
+                row[f"{stage}_p{q}"] = _quantile(hist, q / 100)
+        return row
+
+
+def segment_values(profile, provider=None):
+    """一条奖励所属的分组 [(分组字段, 取值)]，取值为空的字段不分组"""
+    interests = profile.get("interests") or []
+    values = {
+        "age_group": profile.get("age_group"),
+        "gender": profile.get("gender"),
+        "occupation": profile.get("occupation"),
+        "top_interest": interests[0] if interests else None,
+        "provider": provider,
+    }
+    return [("all", "all")] + [(field, str(values[field])) for field in SEGMENT_FIELDS if values[field]]
+
+
+class OnlineMetrics:
+    """
+    每产生一条奖励就更新的在线评估指标，按画像字段和服务商分组
+
+    分组的取值是有限的类别（年龄段、性别、职业、题材、服务商），每组的状态大小固定，
+    所以内存占用与处理的画像数无关。距上次快照超过 interval 秒时把各组指标整体写入 path（CSV）。
+
+    参数:
+    path (str): 快照文件，为空则不写文件
+    interval (float): 快照间隔(秒)
+    """
+
+    def __init__(self, path=ONLINE_METRICS_PATH, interval=METRICS_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.segments = {}
+        self._last_snapshot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, reward, profile, provider=None):
+        """
+        计入一条奖励
+
+        参数:
+        reward (dict): score_rewards 输出的一条记录（reward、user_rating 与各阶段得分）
+        profile (dict): 该用户的画像
+        provider (str): 生成推荐的服务商
+        """
+        with self._lock:
+            for key in segment_values(profile, provider):
+                if key not in self.segments:
+                    self.segments[key] = SegmentMetrics()
+                self.segments[key].add(float(reward["reward"]), float(reward["user_rating"]), reward)
+            due = self.path and time.monotonic() - self._last_snapshot >= self.interval
+            if due:
+                # 先占住这次快照，其他线程不会同时写同一个文件
+                self._last_snapshot = time.monotonic()
+        if due:
+            self.snapshot()
+
+    def rows(self):
+        """各分组的指标，"all" 在前，其余按分组字段和样本数排列"""
+        order = {field: i for i, field in enumerate(("all",) + SEGMENT_FIELDS)}
+        with self._lock:
+            items = sorted(self.segments.items(), key=lambda kv: (order[kv[0][0]], -kv[1].count, kv[0][1]))
+            return [{"segment": field, "value": value, **seg.row()} for (field, value), seg in items]
+
+    def snapshot(self, path=None):
+        """把当前指标写入 CSV：先写临时文件再替换，读取方不会看到写了一半的快照"""
+        path = path or self.path
+        if not path:
+            return
+        rows = self.rows()
+        updated_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: round(v, 4) if isinstance(v, float) else v
+                                 for k, v in {**row, "updated_at": updated_at}.items()})
+        os.replace(tmp_path, path)
+        self._last_snapshot = time.monotonic()
+
+    def print_summary(self):
+        rows = self.rows()
+        if not rows:
+            print("没有可对比的评分")
+            return
+        overall = rows[0]
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"\n📈 MAE (平均绝对误差): {overall['mae']:.3f}，RMSE: {overall['rmse']:.3f}")
+        print(f"📊 STD (标准差): {overall['error_std']:.3f}，"
+              f"Pearson: {fmt(overall['pearson'])}，Spearman: {fmt(overall['spearman'])}（共 {overall['count']} 条）")
+        for stage in STAGES:
+            print(f"  {stage} 阶段得分: 均值 {fmt(overall[f'{stage}_mean'])}，标准差 {fmt(overall[f'{stage}_std'])}，"
+                  f"p10/p50/p90 {fmt(overall[f'{stage}_p10'])}/{fmt(overall[f'{stage}_p50'])}/"
+                  f"{fmt(overall[f'{stage}_p90'])}")
+        for row in rows[1:]:
+            print(f"  {row['segment']}={row['value']}: {row['count']} 条，MAE {row['mae']:.3f}，"
+                  f"RMSE {row['rmse']:.3f}，Pearson {fmt(row['pearson'])}，Spearman {fmt(row['spearman'])}")
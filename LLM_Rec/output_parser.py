@@ -0,0 +1,193 @@
+# output_parser.py
+import json
+import re
+
+# 规范化后的键（小写、去掉空格/下划线/连字符）-> 统一的字段名
+CANONICAL_KEYS = {
+    "movie": "Movie",
+    "movietitle": "Movie",
+    "title": "Movie",
+    "film": "Movie",
+    "id": "id",
+    "explanation": "Explanation",
+    "reason": "Explanation",
+    "relevance": "Relevance",
+    "clarity": "Clarity",
+    "persuasiveness": "Persuasiveness",
+    "contentmatching": "Content-Matching",
+    "logicclarity": "Logic-Clarity",
+    "hallucinationrisk": "Hallucination-Risk",
+    "explanatoryvalidity": "Explanatory Validity",
+    "explanationgroundedness": "Explanatory Validity",
+    "score": "score",
+}
+SCORE_KEYS = {"Relevance", "Clarity", "Persuasiveness", "Content-Matching", "Logic-Clarity",
+              "Hallucination-Risk", "Explanatory Validity", "score"}
+OPEN_BRACKET_RE = re.compile(r"[\[{]")
+NUMBER_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)")
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def canonical_key(key):
+    """把评分字段名统一为标准写法，例如 content_matching / Content Matching -> Content-Matching"""
+    normalized = re.sub(r"[\s_\-]+", "", str(key).lower())
+    return CANONICAL_KEYS.get(normalized, str(key).strip())
+
+
+def parse_score(value):
+    """把分数转为 float，支持 "4"、"4/5"、"4 (good)" 等写法，无法解析时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_RE.match(str(value))
+    return float(match.group(1)) if match else None
+
+
+def _scan(text, start):
+    """
+    从 text[start]（'[' 或 '{'）开始扫描到与之匹配的括号，同时把内容改写为合法 JSON：
+    单引号字符串改为双引号、去掉 ] 和 } 前多余的逗号、Python 的 True/False/None 改为 JSON 字面量
+
+    返回:
+    tuple: (改写后的 JSON 文本, 结束位置)；括号不完整时返回 (None, len(text))
+    """
+    out = []
+    depth = 0
+    quote = None
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                # 单引号字符串里的 \' 在 JSON 中写作 '
+                out.append(nxt if (quote == "'" and nxt == "'") else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "[{":
+            depth += 1
+            out.append(ch)
+        elif ch in "]}":
+            # 去掉结尾多余的逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            out.append(ch)
+            depth -= 1
+            if depth == 0:
+                return "".join(out), i + 1
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return None, n
+
+
+def extract_json(text):
+    """
+    一次扫描从模型输出中取出 JSON 数组或对象
+
+    容忍 ```json 代码块、前后的说明文字、多余的结尾逗号和单引号；输出中有多个并列的 JSON 值时
+    （例如每部电影一个代码块）合并为一个列表。
+
+    参数:
+    text (str): 模型的原始输出
+
+    返回:
+    list | dict: 解析结果
+
+    异常:
+    ValueError: 输出中没有可解析的 JSON
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"模型输出不是字符串: {type(text).__name__}")
+    values = []
+    pos = 0
+    while True:
+        match = OPEN_BRACKET_RE.search(text, pos)
+        if match is None:
+            break
+        candidate, end = _scan(text, match.start())
+        value = None
+        if candidate is not None:
+            try:
+                value = json.loads(candidate)
+            except json.JSONDecodeError:
+                value = None
+        if value is None:
+            # 不是 JSON（例如正文里的 [1-5]），跳过这个括号继续找
+            pos = match.start() + 1
+            continue
+        values.append(value)
+        pos = end
+
+    if not values:
+        raise ValueError("输出中没有找到 JSON")
+    if len(values) == 1:
+        return values[0]
+    merged = []
+    for value in values:
+        merged.extend(value if isinstance(value, list) else [value])
+    return merged
+
+
+def _normalize_record(item):
+    record = {}
+    for key, value in item.items():
+        if isinstance(value, dict):
+            # {"Movie": ..., "Scores": {"Logic-Clarity": 4, ...}} 这类嵌套写法展开到同一层
+            for sub_key, sub_value in _normalize_record(value).items():
+                record.setdefault(sub_key, sub_value)
+            continue
+        key = canonical_key(key)
+        if key in SCORE_KEYS:
+            value = parse_score(value)
+            if value is None:
+                continue
+        record.setdefault(key, value)
+    return record
+
+
+def parse_score_records(text):
+    """
+    把评估器的输出解析为逐电影的评分记录
+
+    支持 [{...}, ...]、单个 {...} 以及 {"电影名": {...}, ...} 三种结构；字段名统一为标准写法，
+    分数统一为 float，无法解析的分数被丢弃。
+
+    返回:
+    list: [{"Movie": str, "Relevance": float, ...}]
+
+    异常:
+    ValueError: 输出中没有可解析的 JSON
+    """
+    data = extract_json(text)
+    if isinstance(data, dict):
+        nested = [v for v in data.values() if isinstance(v, dict)]
+        if nested and len(nested) == len(data):
+            data = [{"Movie": title, **scores} for title, scores in data.items()]
+        else:
+            data = [data]
+    return [_normalize_record(item) for item in data if isinstance(item, dict)]
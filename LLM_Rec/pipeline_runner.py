@@ -0,0 +1,266 @@
+# pipeline_runner.py
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from call_metrics import log_response, metrics_context
+from candidate_retriever import retrieve_candidates
+from config import CANDIDATE_TOP_N, EVAL_BATCH_SIZE, LLM_STREAMING, PIPELINE_MAX_WORKERS
+from evaluator_hallucination import evaluate_hallucination, evaluate_hallucination_batch
+from evaluator_logic import evaluate_logic, evaluate_logic_batch
+from evaluator_subjective import evaluate_subjective, evaluate_subjective_batch
+from llm_generator import generate_recommendation, stream_recommendation
+from reward_utils import compute_rewards, hallucination_stage_scores, load_weights, print_reward_details
+from title_index import TitleStreamParser, get_title_index
+
+
+def generate_for_profile(profile, resolved_titles=None):
+    """
+    候选预排序后生成推荐
+
+    流式模式下边接收边解析 **标题**，每个标题一完整就解析为 MovieID 并写入 resolved_titles，
+    标题解析与模型生成重叠进行。
+    """
+    candidates = retrieve_candidates(profile) if CANDIDATE_TOP_N > 0 else None
+    if not LLM_STREAMING:
+        return generate_recommendation(profile, candidates)
+
+    title_index = get_title_index()
+    parser = TitleStreamParser()
+    for chunk in stream_recommendation(profile, candidates):
+        for title in parser.feed(chunk):
+            if resolved_titles is not None and title not in resolved_titles:
+                resolved_titles[title] = title_index.resolve(title)
+    log_response("evaluate_generator 返回结果:", parser.buffer)
+    return parser.buffer
+
+
+def make_result(profile, recommendation, subjective, logic, hallucination, resolved_titles=None):
+    return {
+        "user": profile,
+        "rec": recommendation,
+        "recommendations": re.findall(r"\*\*(.+?)\*\*", recommendation),
+        "subjective_result": subjective,
+        "logic_result": logic,
+        "hallucination_result": hallucination,
+        "resolved_titles": resolved_titles or {}
+    }
+
+
+def process_profile(profile, result_log=None):
+    """
+    处理单个用户画像：候选预排序 -> 生成推荐 -> 主观评估 -> 逻辑评估 -> 幻觉评估（各阶段严格串行）
+
+    传入 result_log 时每个阶段完成后立即写入日志，已记录的阶段直接复用日志中的结果。
+    """
+    uid = profile["uid"]
+
+    def stage(name, fn, *args):
+        with metrics_context(uid):
+            return result_log.run_stage(uid, name, fn, *args) if result_log else fn(*args)
+
+    resolved_titles = {}
+    recommendation = stage("generator", generate_for_profile, profile, resolved_titles)
+    # 画像以 dict 传给生成与主观评估，由 token_budget 决定写入提示词的形式
+    subjective = stage("subjective", evaluate_subjective, profile, recommendation)
+    logic = stage("logic", evaluate_logic, recommendation, "spark", subjective)
+    hallucination = stage("hallucination", evaluate_hallucination, recommendation, "deepseek-reasoner", logic,
+                          subjective)
+    return make_result(profile, recommendation, subjective, logic, hallucination, resolved_titles)
+
+
+def run_profiles(profiles, worker=process_profile, max_workers=PIPELINE_MAX_WORKERS, on_result=None):
+    """
+    并发处理多个用户画像
+
+    不同画像之间并行执行，每个服务商的在途请求数由 llm_router 的并发槽位限制，
+    因此总耗时随并发上限而不是画像数量增长。
+
+    参数:
+    profiles (list): 用户画像列表
+    worker (callable): 处理单个画像的函数
+    max_workers (int): 同时处理的画像数
+    on_result (callable): 每个画像完成时的回调 on_result(index, result)，在调用方线程中执行
+
+    返回:
+    list: 与输入顺序一致的结果列表，处理失败的画像被跳过
+    """
+    results = [None] * len(profiles)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(worker, profile): i for i, profile in enumerate(profiles)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print(f"[!] 用户 {profiles[i]['uid']} 处理失败: {e}")
+                continue
+            if on_result:
+                on_result(i, results[i])
+    return [res for res in results if res is not None]
+
+
+def run_profiles_batched(profiles, batch_size=EVAL_BATCH_SIZE, max_workers=PIPELINE_MAX_WORKERS, result_log=None,
+                         on_result=None):
+    """
+    按阶段批量处理多个用户画像
+
+    生成推荐仍逐个画像并发执行；三个评估阶段依次进行，每个阶段把 batch_size 个画像打包进一个请求，
+    各批之间并发执行。批量结果中缺失或格式错误的画像会自动改为逐条评估。
+
+    参数:
+    profiles (list): 用户画像列表
+    batch_size (int): 每个评估请求包含的画像数
+    max_workers (int): 同时进行的请求数
+    result_log (ResultLog): 结果日志，已记录的阶段直接复用
+    on_result (callable): 每个画像全部阶段完成时的回调 on_result(index, result)
+
+    返回:
+    list: 与输入顺序一致的结果列表，处理失败的画像被跳过
+    """
+    outputs = {}  # (uid, stage) -> 输出
+
+    def run_stage(name, jobs, run_job, size=batch_size):
+        """jobs: [(uid, ...)]；run_job(最多 size 个 job 的列表) -> {uid: 输出}"""
+        pending = []
+        for job in jobs:
+            cached = result_log.get(job[0], name) if result_log else None
+            if cached is None:
+                pending.append(job)
+            else:
+                outputs[(job[0], name)] = cached
+        groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+
+        def run_group(group):
+            with metrics_context(",".join(str(job[0]) for job in group)):
+                return run_job(group)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(run_group, group): group for group in groups}
+            for future in as_completed(futures):
+                try:
+                    finished = future.result()
+                except Exception as e:
+                    print(f"[!] 用户 {', '.join(job[0] for job in futures[future])} 的 {name} 阶段失败: {e}")
+                    continue
+                for uid, output in finished.items():
+                    outputs[(uid, name)] = output
+                    if result_log:
+                        result_log.append(uid, name, output)
+
+    def ready(name, uids):
+        return [uid for uid in uids if (uid, name) in outputs]
+
+    by_uid = {profile["uid"]: profile for profile in profiles}
+    resolved_titles = {uid: {} for uid in by_uid}
+    uids = list(by_uid)
+    run_stage("generator", [(uid,) for uid in uids],
+              lambda group: {uid: generate_for_profile(by_uid[uid], resolved_titles[uid]) for uid, in group},
+              size=1)
+
+    uids = ready("generator", uids)
+    run_stage("subjective", [(uid, by_uid[uid], outputs[(uid, "generator")]) for uid in uids],
+              evaluate_subjective_batch)
+
+    uids = ready("subjective", uids)
+    run_stage("logic", [(uid, outputs[(uid, "generator")], outputs[(uid, "subjective")]) for uid in uids],
+              lambda group: evaluate_logic_batch(group, "spark"))
+
+    uids = ready("logic", uids)
+    run_stage("hallucination", [(uid, outputs[(uid, "generator")], outputs[(uid, "subjective")],
+                                 outputs[(uid, "logic")]) for uid in uids],
+              lambda group: evaluate_hallucination_batch(group, "deepseek-reasoner"))
+
+    results = []
+    for i, profile in enumerate(profiles):
+        uid = profile["uid"]
+        if (uid, "hallucination") not in outputs:
+            continue
+        result = make_result(profile, *(outputs[(uid, name)] for name in
+                                        ("generator", "subjective", "logic", "hallucination")),
+                             resolved_titles=resolved_titles[uid])
+        results.append(result)
+        if on_result:
+            on_result(i, result)
+    return results
+
+
+def match_ratings(results, title_index, rating_index):
+    """
+    把推荐的标题解析为 MovieID 并查询用户的真实评分
+
+    流式生成时已解析的标题直接复用，其余标题经 title_index 解析；所有 (用户, 电影) 一次批量查询评分。
+    同一用户的多个标题解析到同一部电影时只保留匹配得分最高的一个，避免同一评分被计算两次奖励。
+
+    返回:
+    list: 用户评过分的推荐 {"user_id", "movie", "movie_id", "match_score", "rating"}
+    """
+    best = {}  # (uid, movie_id) -> (uid, 标题, movie_id, 匹配得分)
+    for result in results:
+        uid = result["user"]["uid"]
+        pre_resolved = result.get("resolved_titles", {})
+        for movie in result["recommendations"]:
+            resolved = pre_resolved[movie] if movie in pre_resolved else title_index.resolve(movie)
+            if resolved is None:
+                continue
+            key = (uid, resolved[0])
+            if key not in best or resolved[2] > best[key][3]:
+                best[key] = (uid, movie, resolved[0], resolved[2])
+    resolved_movies = list(best.values())
+
+    # 0 表示用户未评分
+    found_ratings = rating_index.batch_ratings([int(c[0]) for c in resolved_movies],
+                                               [c[2] for c in resolved_movies])
+    matched_ratings = []
+    for (uid, movie, movie_id, match_score), rating in zip(resolved_movies, found_ratings):
+        if rating:
+            matched_ratings.append({
+                "user_id": uid,
+                "movie": movie,
+                "movie_id": movie_id,
+                "match_score": match_score,
+                "rating": int(rating)
+            })
+    return matched_ratings
+
+
+def score_rewards(results_db, verbose=False, uids=None):
+    """对结果库中每条匹配到真实评分、且有主观与逻辑评估的推荐批量计算奖励分数，并写回结果库；给出 uids 时只计算这些用户"""
+    table = results_db.reward_table(uids)
+    weights = load_weights()
+    hallucination = hallucination_stage_scores(table["hallucination_user"], table["hallucination_risk"],
+                                               table["explanatory_validity"], len(table["uids"]))
+    final, reward, stages = compute_rewards(table["subjective"], table["logic"], hallucination[table["user"]],
+                                            weights)
+    if verbose:
+        for i in range(len(final)):
+            print_reward_details(stages["subjective"][i], stages["logic"][i], stages["hallucination"][i],
+                                 reward[i], final[i], weights)
+
+    rewards = [{
+        "user_id": uid,
+        "movie_id": movie_id,
+        "movie_name": movie_name,
+        "reward": float(r),
+        "user_rating": int(rating),
+        # 各阶段得分，供 model_update.calibrate 拟合阶段权重
+        "subjective": float(subj),
+        "logic": float(logic),
+        "hallucination": float(halluc)
+    } for uid, movie_id, movie_name, r, rating, subj, logic, halluc in zip(
+        table["uid"], table["movie_id"], table["movie"], final, table["rating"],
+        stages["subjective"], stages["logic"], stages["hallucination"])]
+    results_db.add_rewards(rewards)
+    return rewards
+
+
+def score_result(result, results_db, title_index, rating_index, verbose=False):
+    """
+    把一个已完成的画像写入结果库、匹配真实评分并计算奖励，画像一完成就能更新在线指标
+
+    返回:
+    list: 该画像的奖励记录，格式同 score_rewards
+    """
+    matched_ratings = match_ratings([result], title_index, rating_index)
+    results_db.add_results([result])
+    results_db.add_matched_ratings(matched_ratings)
+    return score_rewards(results_db, verbose, uids=[result["user"]["uid"]])
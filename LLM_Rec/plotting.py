@@ -0,0 +1,40 @@
+# plotting.py
+import os
+import sys
+
+import numpy as np
+
+
+def is_headless():
+    """没有图形界面时返回 True：设置了 HEADLESS=1，或 Linux 上没有 DISPLAY / WAYLAND_DISPLAY"""
+    if os.getenv("HEADLESS", "0") == "1":
+        return True
+    return sys.platform.startswith("linux") and not (os.getenv("DISPLAY") or os.getenv("WAYLAND_DISPLAY"))
+
+
+def plot_scores(rewards):
+    """
+    按电影画出用户真实评分与 LLM 奖励分数的柱状对比图（需要 matplotlib，仅在 main.py --plot 时导入）
+
+    参数:
+    rewards (list): score_rewards 的输出
+    """
+    import matplotlib.pyplot as plt
+
+    movie_names = [r["movie_id"] for r in rewards]
+    user_scores = [r["user_rating"] for r in rewards]
+    llm_scores = [r["reward"] for r in rewards]
+
+    x = np.arange(len(movie_names))
+    width = 0.35
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(x - width/2, user_scores, width, label='User Score')
+    ax.bar(x + width/2, llm_scores, width, label='LLM Score')
+
+    ax.set_ylabel('Score')
+    ax.set_title('LLM vs User Scores by Movie')
+    ax.set_xticks(x)
+    ax.set_xticklabels(movie_names, rotation=45, ha='right')
+    ax.legend()
+    plt.tight_layout()
+    plt.show()
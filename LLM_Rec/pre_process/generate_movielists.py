@@ -1,11 +1,13 @@
-import pandas as pd
 import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_loader import load_movies
 
 # 加载电影数据
 MOVIES_FILE = "D:/测试/pythonProject1/ml-1m/movies.dat"
-movies = pd.read_csv(MOVIES_FILE, sep="::", engine="python",
-                     names=["MovieID", "Title", "Genres"],
-                     encoding="latin-1")
+movies = load_movies(MOVIES_FILE)
 
 # 提取电影标题
 movie_titles = movies["Title"].tolist()
@@ -14,4 +16,4 @@ movie_titles = movies["Title"].tolist()
 with open('D:/测试/pythonProject1/data/movie_titles.json', 'w', encoding='utf-8') as f:
     json.dump(movie_titles, f, ensure_ascii=False, indent=2)
 
-print("✅ 成功保存电影标题到 data/movie_titles.json")
\ No newline at end of file
+print("✅ 成功保存电影标题到 data/movie_titles.json")
@@ -0,0 +1,237 @@
+# profile_state.py
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dataset_loader import load_movies, load_ratings, read_appended
+from generate_profiles_movielens import (HIGH_RATING_THRESHOLD, MIN_RATINGS, RATINGS_FILE, RECENT_MONTHS,
+                                         TOP_K_GENRES, explode_genres, make_profile, newest_rows)
+
+STATE_FILE = "data/profile_state.npz"
+RECENT_KEEP = 3  # 每个用户保留的最近观看电影数
+TAIL_CHECK_BYTES = 4096  # 用已处理部分末尾的摘要判断文件是否只是被追加
+
+NOT_SEEN = np.iinfo(np.int64).max
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+
+def _tail_digest(path, offset):
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - TAIL_CHECK_BYTES))
+        return hashlib.sha1(f.read(min(offset, TAIL_CHECK_BYTES))).hexdigest()
+
+
+class ProfileState:
+    """
+    增量生成用户画像所需的逐用户聚合状态
+
+    保存每个用户的类型得分累加值、类型首次出现的序号、评分数、评分总和、高分数量和最近观看的电影，
+    以及已处理到的时间戳水位线与固定的参考时间（计算“距今月数”用），保证同样的数据得到同样的画像。
+    新评分到来时只把新增评分累加到受影响的用户上。
+
+    最近观看与 build_profiles 一样按 quicksort 的并列顺序选取，而 quicksort 的并列顺序取决于用户的全部评分时间，
+    因此另按到达顺序保存每条评分的 (UserID, 时间戳, MovieID)（每条 16 字节），受影响的用户用全部历史重新选取。
+    """
+
+    def __init__(self, reference_time):
+        self.reference_time = reference_time
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.genre_names = np.zeros(0, dtype=str)
+        self.genre_sums = np.zeros((0, 0))
+        self.genre_first = np.zeros((0, 0), dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.rating_sums = np.zeros(0, dtype=np.int64)
+        self.high_counts = np.zeros(0, dtype=np.int64)
+        self.recent_movie = np.zeros((0, RECENT_KEEP), dtype=np.int64)
+        self.history_uid = np.zeros(0, dtype=np.int32)
+        self.history_ts = np.zeros(0, dtype=np.int64)
+        self.history_movie = np.zeros(0, dtype=np.int32)
+        self.watermark = NO_TIMESTAMP
+        self.rows_seen = 0
+        self.exploded_seen = 0
+        self.source_offset = 0
+        self.source_digest = ""
+
+    # ===== 持久化 =====
+    def save(self, path=STATE_FILE):
+        meta = {
+            "reference_time": self.reference_time.isoformat(),
+            "watermark": int(self.watermark),
+            "rows_seen": self.rows_seen,
+            "exploded_seen": self.exploded_seen,
+            "source_offset": self.source_offset,
+            "source_digest": self.source_digest,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, meta=np.array(json.dumps(meta)), user_ids=self.user_ids, genre_names=self.genre_names,
+                 genre_sums=self.genre_sums, genre_first=self.genre_first, counts=self.counts,
+                 rating_sums=self.rating_sums, high_counts=self.high_counts, recent_movie=self.recent_movie,
+                 history_uid=self.history_uid, history_ts=self.history_ts, history_movie=self.history_movie)
+
+    @classmethod
+    def load(cls, path=STATE_FILE):
+        with np.load(path) as saved:
+            if "history_ts" not in saved.files:
+                raise ValueError(f"{path} 是旧版本的画像状态，缺少逐条评分历史，请使用 --rebuild 重新构建")
+            meta = json.loads(str(saved["meta"]))
+            state = cls(datetime.fromisoformat(meta["reference_time"]))
+            for name in ("user_ids", "genre_names", "genre_sums", "genre_first", "counts", "rating_sums",
+                         "high_counts", "recent_movie", "history_uid", "history_ts", "history_movie"):
+                setattr(state, name, saved[name])
+        state.watermark = meta["watermark"]
+        state.rows_seen = meta["rows_seen"]
+        state.exploded_seen = meta["exploded_seen"]
+        state.source_offset = meta["source_offset"]
+        state.source_digest = meta["source_digest"]
+        return state
+
+    # ===== 状态更新 =====
+    def _ensure_users(self, user_ids):
+        all_ids = np.union1d(self.user_ids, user_ids)
+        if len(all_ids) == len(self.user_ids):
+            return
+        old_rows = np.searchsorted(all_ids, self.user_ids)
+        fill = {"genre_first": NOT_SEEN, "recent_movie": -1}
+        for name in ("genre_sums", "genre_first", "counts", "rating_sums", "high_counts", "recent_movie"):
+            old = getattr(self, name)
+            new = np.full((len(all_ids),) + old.shape[1:], fill.get(name, 0), dtype=old.dtype)
+            new[old_rows] = old
+            setattr(self, name, new)
+        self.user_ids = all_ids
+
+    def _ensure_genres(self, genre_names):
+        missing = np.setdiff1d(genre_names, self.genre_names)
+        if len(missing):
+            self.genre_names = np.concatenate([self.genre_names, missing])
+            self.genre_sums = np.pad(self.genre_sums, ((0, 0), (0, len(missing))))
+            self.genre_first = np.pad(self.genre_first, ((0, 0), (0, len(missing))), constant_values=NOT_SEEN)
+        genre_pos = {g: i for i, g in enumerate(self.genre_names.tolist())}
+        return np.array([genre_pos[g] for g in genre_names], dtype=np.int64)
+
+    def apply(self, ratings, movies):
+        """
+        把一批按文件顺序排列的新评分累加到状态中
+
+        参数:
+        ratings (pd.DataFrame): 含 UserID、MovieID、Rating、Timestamp 列
+        movies (pd.DataFrame): 电影表，不在其中的电影的评分被忽略（与合并后的全量计算一致）
+
+        返回:
+        np.ndarray: 受影响的 UserID
+        """
+        movie_ids = movies["MovieID"].to_numpy()
+        movie_order = np.argsort(movie_ids)
+        pos = np.searchsorted(movie_ids, ratings["MovieID"].to_numpy(), sorter=movie_order)
+        pos = np.minimum(pos, len(movie_ids) - 1)
+        known = movie_ids[movie_order[pos]] == ratings["MovieID"].to_numpy()
+        movie_rows = movie_order[pos[known]]
+
+        uids = ratings["UserID"].to_numpy(dtype=np.int64)[known]
+        mids = ratings["MovieID"].to_numpy(dtype=np.int64)[known]
+        rating = ratings["Rating"].to_numpy(dtype=np.int64)[known]
+        ts = ratings["Timestamp"].to_numpy(dtype=np.int64)[known]
+        self.rows_seen += len(uids)
+        if not len(uids):
+            return uids
+
+        self._ensure_users(uids)
+        user_rows = np.searchsorted(self.user_ids, uids)
+
+        # 类型得分：评分/5 × 时间因子，按行顺序累加
+        dates = pd.to_datetime(ts, unit="s")
+        months_ago = ((self.reference_time.year - dates.year) * 12 +
+                      (self.reference_time.month - dates.month)).to_numpy()
+        final_score = rating / 5.0 * np.where(months_ago <= RECENT_MONTHS, 2.0, 1.0)
+
+        exploded_rows, codes, names = explode_genres(movies["Genres"].to_numpy(dtype=object)[movie_rows])
+        columns = self._ensure_genres(names)[codes]
+        cells = user_rows[exploded_rows] * len(self.genre_names) + columns
+        np.add.at(self.genre_sums.reshape(-1), cells, final_score[exploded_rows])
+        np.minimum.at(self.genre_first.reshape(-1), cells, self.exploded_seen + np.arange(len(cells)))
+        self.exploded_seen += len(cells)
+
+        # 评分统计
+        self.counts += np.bincount(user_rows, minlength=len(self.user_ids))
+        self.rating_sums += np.bincount(user_rows, weights=rating, minlength=len(self.user_ids)).astype(np.int64)
+        self.high_counts += np.bincount(user_rows, weights=rating >= HIGH_RATING_THRESHOLD,
+                                        minlength=len(self.user_ids)).astype(np.int64)
+
+        # 最近观看：新评分追加到历史末尾，受影响的用户按到达顺序取出全部评分时间重新选取，
+        # 与 build_profiles 对同一段序列做同样的排序，并列项的先后与全量生成一致
+        self.history_uid = np.concatenate([self.history_uid, uids.astype(np.int32)])
+        self.history_ts = np.concatenate([self.history_ts, ts])
+        self.history_movie = np.concatenate([self.history_movie, mids.astype(np.int32)])
+        changed = np.unique(user_rows)
+        entries = np.flatnonzero(np.isin(self.history_uid, self.user_ids[changed]))
+        entries = entries[np.argsort(self.history_uid[entries], kind="stable")]
+        bounds = np.searchsorted(self.history_uid[entries], self.user_ids[changed], side="right")
+        dates = pd.to_datetime(self.history_ts[entries], unit="s").to_numpy()
+        self.recent_movie[changed] = -1
+        for row, lo, hi in zip(changed, np.concatenate(([0], bounds[:-1])), bounds):
+            newest = entries[lo:hi][newest_rows(dates[lo:hi], RECENT_KEEP)]
+            self.recent_movie[row, :len(newest)] = self.history_movie[newest]
+
+        self.watermark = max(self.watermark, int(ts.max()))
+        return self.user_ids[changed]
+
+    # ===== 生成画像 =====
+    def profiles(self, users, movies, max_users=None):
+        """按 UserID 升序输出评分数达到 MIN_RATINGS 的用户画像"""
+        user_info = users.set_index("UserID")[["Gender", "Age", "Occupation"]]
+        eligible = np.flatnonzero((self.counts >= MIN_RATINGS) & np.isin(self.user_ids, user_info.index))
+        eligible = eligible[:max_users]
+        if not len(eligible):
+            return []
+
+        sums = self.genre_sums[eligible]
+        first = self.genre_first[eligible]
+        genre_order = np.lexsort((first, -sums), axis=1)[:, :TOP_K_GENRES]
+        genre_present = np.take_along_axis(first, genre_order, axis=1) != NOT_SEEN
+        titles = dict(zip(movies["MovieID"].tolist(), movies["Title"].tolist()))
+        infos = user_info.loc[self.user_ids[eligible]].to_numpy().tolist()
+
+        profiles = []
+        for i, row in enumerate(eligible):
+            top_genres = self.genre_names[genre_order[i][genre_present[i]]].tolist()
+            total = int(self.counts[row])
+            avg_rating = np.float64(self.rating_sums[row]) / total
+            recent_movies = [titles[m] for m in self.recent_movie[row].tolist() if m >= 0]
+            profiles.append(make_profile(self.user_ids[row], infos[i], top_genres, total, avg_rating,
+                                         int(self.high_counts[row]) / total, recent_movies))
+        return profiles
+
+
+def build_state(reference_time, ratings_file=RATINGS_FILE):
+    """从全部评分构建状态"""
+    state = ProfileState(reference_time)
+    state.apply(load_ratings(ratings_file), load_movies())
+    state.source_offset = os.path.getsize(ratings_file)
+    state.source_digest = _tail_digest(ratings_file, state.source_offset)
+    return state
+
+
+def refresh_state(state, ratings_file=RATINGS_FILE):
+    """
+    用新评分更新状态
+
+    ratings.dat 只是在末尾追加时，只解析追加的部分；文件被改写时重新读取全部评分，
+    并取时间戳大于水位线的评分作为新评分。
+
+    返回:
+    np.ndarray: 受影响的 UserID
+    """
+    movies = load_movies()
+    size = os.path.getsize(ratings_file)
+    if size >= state.source_offset and _tail_digest(ratings_file, state.source_offset) == state.source_digest:
+        new_ratings, state.source_offset = read_appended("ratings", ratings_file, state.source_offset)
+    else:
+        print("ratings.dat 已被改写，按时间戳水位线筛选新评分；如有评分被删除或修改，请使用 --rebuild 重新构建")
+        ratings = load_ratings(ratings_file)
+        new_ratings = ratings[ratings["Timestamp"].to_numpy() > state.watermark]
+        state.source_offset = size
+    state.source_digest = _tail_digest(ratings_file, state.source_offset)
+    return state.apply(new_ratings, movies)
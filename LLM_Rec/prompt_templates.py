@@ -0,0 +1,64 @@
+# prompt_templates.py
+import os
+import string
+from functools import lru_cache
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+# 模板文件中分隔静态前缀与每次请求变化部分的行
+VARIABLE_MARKER = "<<< variable >>>"
+
+
+def _fields(template):
+    return {name for _, name, _, _ in string.Formatter().parse(template) if name}
+
+
+class PromptTemplate:
+    """
+    提示词模板：静态前缀（评分规则、输出格式）在前，每次请求变化的部分（候选电影、用户画像、推荐内容）在后
+
+    服务商的上下文缓存按请求开头的 token 命中，前缀逐字节相同才能命中，所以变化的内容一律放在前缀之后。
+    前缀和变化部分都按 str.format 语法书写，花括号写作 {{ }}；前缀中的字段用 bind 在加载时一次填好。
+
+    参数:
+    name (str): 模板名
+    prefix (str): 静态前缀
+    body (str): 每次请求变化的部分
+    """
+
+    def __init__(self, name, prefix, body):
+        self.name = name
+        self.prefix_fields = _fields(prefix)
+        self.body_fields = _fields(body)
+        # 前缀没有字段时预先转义好，渲染时直接拼接
+        self.prefix = prefix if self.prefix_fields else prefix.format()
+        self.body = body
+
+    def bind(self, **fields):
+        """填好前缀中的字段，返回前缀完全静态的新模板"""
+        return PromptTemplate(self.name, self.prefix.format(**fields).replace("{", "{{").replace("}", "}}"),
+                              self.body)
+
+    def render(self, **fields):
+        """
+        生成完整提示词
+
+        返回:
+        str: 静态前缀 + 变化部分
+        """
+        missing = (self.prefix_fields | self.body_fields) - fields.keys()
+        if missing:
+            raise KeyError(f"提示词模板 {self.name} 缺少字段: {', '.join(sorted(missing))}")
+        prefix = self.prefix.format(**fields) if self.prefix_fields else self.prefix
+        return prefix + self.body.format(**fields)
+
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    """加载 prompts/<name>.txt，每个模板只读取和解析一次"""
+    path = os.path.join(PROMPT_DIR, f"{name}.txt")
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    prefix, marker, body = text.partition(f"\n{VARIABLE_MARKER}\n")
+    if not marker:
+        raise ValueError(f"提示词模板 {path} 缺少分隔行 {VARIABLE_MARKER}")
+    return PromptTemplate(name, prefix + "\n", body)
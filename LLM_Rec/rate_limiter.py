@@ -0,0 +1,187 @@
+# rate_limiter.py
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# 视为可重试的 HTTP 状态码；429 与超时同时触发并发上限的乘性减小
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+OVERLOAD_STATUS = {429}
+# openai / httpx 的超时与连接错误按类名识别，避免在此处依赖这两个库
+TIMEOUT_ERROR_NAMES = {"APITimeoutError", "TimeoutException", "ConnectTimeout", "ReadTimeout"}
+CONNECTION_ERROR_NAMES = {"APIConnectionError", "ConnectError", "RemoteProtocolError"}
+
+
+def estimate_tokens(text):
+    """粗略估计 token 数：ASCII 字符约 4 个一个 token，其余（中文等）每个字符一个 token"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 rate_per_min 个令牌，桶容量为一分钟的额度
+
+    rate_per_min <= 0 表示不限速。
+    """
+
+    def __init__(self, rate_per_min):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        if self.rate <= 0:
+            return
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """
+    自适应并发上限：成功时加性增加（每完成约 limit 个请求加 1），过载（429/超时）时减半
+
+    参数:
+    initial (int): 初始并发上限
+    maximum (int): 并发上限的最大值
+    minimum (int): 并发上限的最小值
+    """
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self):
+        with self._cond:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class ProviderLimiter:
+    """单个服务商的限流器：请求数/分钟、token 数/分钟两个令牌桶加 AIMD 并发上限"""
+
+    def __init__(self, name, rpm=0, tpm=0, max_concurrency=8):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AIMDLimiter(max(1, max_concurrency // 2), max_concurrency)
+
+    @contextmanager
+    def slot(self, tokens=1):
+        """占用一个请求名额，tokens 为本次请求预计消耗的 token 数"""
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+        self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    def on_success(self):
+        self.concurrency.on_success()
+
+    def on_overload(self):
+        self.concurrency.on_overload()
+
+
+def _status_and_retry_after(error):
+    """从异常中取出 HTTP 状态码和 Retry-After（秒），没有时返回 None"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = None
+    header = response.headers.get("Retry-After") if response is not None else None
+    if header:
+        try:
+            retry_after = float(header)
+        except ValueError:
+            try:
+                retry_after = parsedate_to_datetime(header).timestamp() - time.time()
+            except (TypeError, ValueError):
+                retry_after = None
+    return status, retry_after
+
+
+def retry_delay(limiter, error, attempt, max_retries, base_delay, max_delay):
+    """
+    判断一次失败的请求是否重试
+
+    可重试的错误：超时、连接错误、429 和 5xx。429 与超时会让限流器减小并发上限。
+
+    参数:
+    limiter (ProviderLimiter): 请求所属服务商的限流器
+    error (Exception): 捕获到的异常
+    attempt (int): 已重试次数
+    max_retries (int): 最大重试次数
+    base_delay (float): 指数退避的初始等待(秒)
+    max_delay (float): 单次等待的上限(秒)
+
+    返回:
+    float: 重试前应等待的秒数；不可重试或已达到重试上限时重新抛出 error
+    """
+    status, retry_after = _status_and_retry_after(error)
+    name = type(error).__name__
+    timeout = isinstance(error, (requests.Timeout, TimeoutError)) or name in TIMEOUT_ERROR_NAMES
+    transient = timeout or isinstance(error, (requests.ConnectionError, ConnectionError)) \
+        or name in CONNECTION_ERROR_NAMES
+    if status not in RETRYABLE_STATUS and not transient:
+        raise error
+    if status in OVERLOAD_STATUS or timeout:
+        limiter.on_overload()
+    if attempt >= max_retries:
+        raise error
+
+    # 带完全抖动的指数退避；服务端给出 Retry-After 时至少等待这么久
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(max_delay, retry_after))
+    print(f"[!] {limiter.name} 请求失败({status or name})，{delay:.1f}s 后第 {attempt + 1} 次重试")
+    return delay
+
+
+def call_with_retry(limiter, fn, tokens, max_retries, base_delay, max_delay, stats=None):
+    """在限流器的名额内执行 fn()，失败时按 retry_delay 的规则重试；传入 stats 时把重试次数写入 stats["retries"]"""
+    attempt = 0
+    while True:
+        if stats is not None:
+            stats["retries"] = attempt
+        try:
+            with limiter.slot(tokens):
+                result = fn()
+        except Exception as e:
+            time.sleep(retry_delay(limiter, e, attempt, max_retries, base_delay, max_delay))
+            attempt += 1
+            continue
+        limiter.on_success()
+        return result
@@ -0,0 +1,147 @@
+# rating_store.py
+import json
+import os
+import threading
+
+import numpy as np
+
+from dataset_loader import load_ratings, replace_file
+
+RATINGS_FILE = "ml-1m/ratings.dat"
+STORE_DIR = "data/rating_store"
+
+
+def _source_signature():
+    stat = os.stat(RATINGS_FILE)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_store(directory=STORE_DIR):
+    """
+    把 ratings.dat 转换为按用户分段的 CSR 结构并保存为 .npy
+
+    user_ptr[u]:user_ptr[u + 1] 是用户 u 的评分区间，区间内 movie_ids 升序排列，
+    ratings 用 int8 存储。每条评分只占 5 字节，可被多个进程以内存映射方式共享。
+
+    先删除 meta.json，各数组写入临时文件后原子替换，最后写 meta.json：构建中断时没有 meta.json，
+    下次运行会重新构建，不会以内存映射方式加载写了一半的数组。
+    """
+    ratings = load_ratings(RATINGS_FILE)
+    users = ratings["UserID"].to_numpy(dtype=np.int64)
+    movies = ratings["MovieID"].to_numpy(dtype=np.int32)
+    scores = ratings["Rating"].to_numpy(dtype=np.int8)
+
+    order = np.lexsort((movies, users))
+    users, movies, scores = users[order], movies[order], scores[order]
+    # 同一 (用户, 电影) 重复评分时保留最后一条
+    keep = np.ones(len(users), dtype=bool)
+    keep[:-1] = (users[1:] != users[:-1]) | (movies[1:] != movies[:-1])
+    users, movies, scores = users[keep], movies[keep], scores[keep]
+
+    user_ptr = np.zeros(users.max() + 2, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=len(user_ptr) - 1), out=user_ptr[1:])
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for name, array in (("user_ptr", user_ptr), ("movie_ids", movies), ("ratings", scores)):
+        replace_file(os.path.join(directory, f"{name}.npy"), lambda f: np.save(f, array))
+    meta = {"source": _source_signature(), "count": int(len(movies))}
+    replace_file(meta_path, lambda f: json.dump(meta, f), "w", encoding="utf-8")
+
+
+class RatingStore:
+    """(用户, 电影) -> 评分 的只读存储，不存在的评分返回 None（批量查询时为 0）"""
+
+    def __init__(self, directory=STORE_DIR, mmap=True):
+        mode = "r" if mmap else None
+        self.user_ptr = np.load(os.path.join(directory, "user_ptr.npy"), mmap_mode=mode)
+        self.movie_ids = np.load(os.path.join(directory, "movie_ids.npy"), mmap_mode=mode)
+        self.ratings = np.load(os.path.join(directory, "ratings.npy"), mmap_mode=mode)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def _span(self, user_id):
+        user_id = int(user_id)
+        if user_id < 0 or user_id + 1 >= len(self.user_ptr):
+            return 0, 0
+        return int(self.user_ptr[user_id]), int(self.user_ptr[user_id + 1])
+
+    def rating(self, user_id, movie_id):
+        start, stop = self._span(user_id)
+        pos = start + int(np.searchsorted(self.movie_ids[start:stop], movie_id))
+        if pos < stop and self.movie_ids[pos] == movie_id:
+            return int(self.ratings[pos])
+        return None
+
+    def ratings_for_user(self, user_id):
+        """返回该用户评过分的 (movie_ids, ratings) 两个数组"""
+        start, stop = self._span(user_id)
+        return np.asarray(self.movie_ids[start:stop]), np.asarray(self.ratings[start:stop])
+
+    def batch_ratings(self, user_ids, movie_ids):
+        """
+        批量查询评分
+
+        参数:
+        user_ids (array-like): 用户 ID
+        movie_ids (array-like): 与 user_ids 一一对应的电影 ID
+
+        返回:
+        np.ndarray: int8 评分数组，不存在的评分为 0
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        movie_ids = np.asarray(movie_ids, dtype=np.int32)
+        valid = (user_ids >= 0) & (user_ids + 1 < len(self.user_ptr))
+        safe_users = np.where(valid, user_ids, 0)
+        lo = np.where(valid, self.user_ptr[safe_users], 0)
+        hi = np.where(valid, self.user_ptr[safe_users + 1], 0)
+        stop = hi.copy()
+
+        # 在每个用户的区间内同时做二分查找
+        while True:
+            active = lo < hi
+            if not active.any():
+                break
+            mid = (lo + hi) // 2
+            go_right = active & (self.movie_ids[np.minimum(mid, len(self.movie_ids) - 1)] < movie_ids)
+            lo = np.where(go_right, mid + 1, lo)
+            hi = np.where(active & ~go_right, mid, hi)
+
+        found = lo < stop
+        found[found] = self.movie_ids[lo[found]] == movie_ids[found]
+        result = np.zeros(len(user_ids), dtype=np.int8)
+        result[found] = self.ratings[lo[found]]
+        return result
+
+
+def load_store(directory=STORE_DIR):
+    """加载评分存储，ratings.dat 变化或尚未构建时先重新构建"""
+    meta_path = os.path.join(directory, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            stale = json.load(f)["source"] != _source_signature()
+    if stale:
+        build_store(directory)
+    return RatingStore(directory)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_rating_store():
+    """进程内只加载一次评分存储"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = load_store()
+        return _STORE
+
+
+if __name__ == "__main__":
+    build_store()
+    print(f"✅ 评分存储已保存至 {STORE_DIR}")
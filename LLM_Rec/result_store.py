@@ -0,0 +1,95 @@
+# result_store.py
+import json
+import os
+import threading
+import time
+
+from config import RESULT_LOG_FSYNC_EVERY, RESULT_LOG_FSYNC_INTERVAL, RESULT_LOG_PATH
+
+STAGES = ("generator", "subjective", "logic", "hallucination")
+
+
+class ResultLog:
+    """
+    只追加的 JSONL 结果日志，每完成一个画像的一个阶段写入一行 {"uid", "stage", "output", "ts"}
+
+    每行写入后立即 flush，fsync 按条数/时间间隔批量执行。续跑时读取已有日志，
+    已完成的 (uid, stage) 直接复用，不再调用 LLM。
+    """
+
+    def __init__(self, path=RESULT_LOG_PATH, resume=True, fsync_every=RESULT_LOG_FSYNC_EVERY,
+                 fsync_interval=RESULT_LOG_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.completed = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    record = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    # 中断时可能留下不完整的最后一行，截掉后再继续追加
+                    break
+                self.completed[(record["uid"], record["stage"])] = record["output"]
+                valid_end = f.tell()
+        if valid_end < os.path.getsize(self.path):
+            os.truncate(self.path, valid_end)
+
+    def get(self, uid, stage):
+        """返回已完成阶段的输出，未完成时返回 None"""
+        return self.completed.get((str(uid), stage))
+
+    def append(self, uid, stage, output):
+        record = {"uid": str(uid), "stage": stage, "output": output, "ts": time.time()}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.completed[(record["uid"], stage)] = output
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def run_stage(self, uid, stage, fn, *args, **kwargs):
+        """已完成则直接返回日志中的结果，否则执行 fn 并记录结果"""
+        output = self.get(uid, stage)
+        if output is None:
+            output = fn(*args, **kwargs)
+            self.append(uid, stage, output)
+        return output
+
+    def is_complete(self, uid):
+        return all((str(uid), stage) in self.completed for stage in STAGES)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,246 @@
+# results_db.py
+import json
+import os
+import sqlite3
+import textwrap
+
+import numpy as np
+
+from config import RESULTS_DB_PATH
+from output_parser import parse_score_records
+from title_index import normalize_title
+
+# 评分字段 -> 表中的列名，顺序与 reward_utils 中 compute_rewards 的输入列一致
+SUBJECTIVE_COLUMNS = {"Relevance": "relevance", "Clarity": "clarity", "Persuasiveness": "persuasiveness",
+                      "score": "score"}
+LOGIC_COLUMNS = {"Content-Matching": "content_matching", "Logic-Clarity": "logic_clarity", "score": "score"}
+HALLUCINATION_COLUMNS = {"Hallucination-Risk": "hallucination_risk", "Explanatory Validity": "explanatory_validity"}
+# rewards 表各列对应的奖励记录字段，与 pipeline_runner.score_rewards 的输出一致
+REWARD_FIELDS = ("user_id", "movie_id", "movie_name", "reward", "user_rating", "subjective", "logic", "hallucination")
+
+SCHEMA = """
+CREATE TABLE results (
+    uid TEXT PRIMARY KEY
+);
+CREATE TABLE subjective_scores (
+    uid TEXT NOT NULL,
+    norm_title TEXT NOT NULL,
+    relevance REAL,
+    clarity REAL,
+    persuasiveness REAL,
+    score REAL,
+    PRIMARY KEY (uid, norm_title)
+);
+CREATE TABLE logic_scores (
+    uid TEXT NOT NULL,
+    norm_title TEXT NOT NULL,
+    content_matching REAL,
+    logic_clarity REAL,
+    score REAL,
+    PRIMARY KEY (uid, norm_title)
+);
+CREATE TABLE hallucination_scores (
+    uid TEXT NOT NULL,
+    movie TEXT,
+    hallucination_risk REAL,
+    explanatory_validity REAL
+);
+CREATE INDEX idx_hallucination_scores_uid ON hallucination_scores (uid);
+CREATE TABLE matched_ratings (
+    uid TEXT NOT NULL,
+    movie TEXT NOT NULL,
+    norm_title TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    match_score REAL NOT NULL,
+    rating INTEGER NOT NULL
+);
+CREATE INDEX idx_matched_ratings_title ON matched_ratings (uid, norm_title);
+CREATE UNIQUE INDEX idx_matched_ratings_movie ON matched_ratings (uid, movie_id);
+CREATE TABLE rewards (
+    uid TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    movie_name TEXT NOT NULL,
+    reward REAL NOT NULL,
+    user_rating INTEGER NOT NULL,
+    subjective REAL,
+    logic REAL,
+    hallucination REAL
+);
+CREATE INDEX idx_rewards_movie ON rewards (uid, movie_id);
+"""
+TABLES = ("results", "subjective_scores", "logic_scores", "hallucination_scores", "matched_ratings", "rewards")
+
+
+def _uid_filter(uids, alias=None):
+    """
+    生成只取指定用户的 WHERE 子句
+
+    参数:
+    uids (list): 用户 ID，为 None 时不过滤
+    alias (str): uid 列所属的表别名
+
+    返回:
+    tuple: (WHERE 子句或空字符串, 参数列表)
+    """
+    if uids is None:
+        return "", []
+    params = [str(u) for u in uids]
+    column = f"{alias}.uid" if alias else "uid"
+    return f"WHERE {column} IN ({', '.join('?' * len(params))})", params
+
+
+class ResultsDB:
+    """
+    一次运行的结果库：评估结果各解析一次，按 (uid, 标题) 拆成逐电影的评分行（每项分数一列），与匹配到的真实评分、
+    奖励分数一起建索引，
+    奖励计算和对比都通过连接查询完成，不再对结果列表做线性查找。每次运行开始时清空重建。
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for table in TABLES:
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.executescript(SCHEMA)
+
+    def add_results(self, results):
+        """
+        写入步骤 1 的结果，三个评估结果各解析一次
+
+        参数:
+        results (list): process_profile 的输出列表
+
+        返回:
+        int: 写入的用户数（主观或逻辑评估无法解析的用户被跳过；幻觉评估无法解析时按没有幻觉评分处理）
+        """
+        results_rows, subj_rows, logic_rows, halluc_rows = [], [], [], []
+        for result in results:
+            uid = str(result["user"]["uid"])
+            try:
+                subj = parse_score_records(result["subjective_result"])
+                logic = parse_score_records(result["logic_result"])
+            except ValueError as e:
+                print(f"[!] 用户 {uid} 解析JSON失败: {e}")
+                continue
+            try:
+                hallucination = parse_score_records(result["hallucination_result"])
+            except ValueError as e:
+                print(f"[!] 用户 {uid} 幻觉评估解析失败，按默认分处理: {e}")
+                hallucination = []
+
+            results_rows.append((uid,))
+            # 同一标题出现多次时保留第一条（INSERT OR IGNORE），与逐条查找第一个匹配项的结果一致
+            for rows, records, columns in ((subj_rows, subj, SUBJECTIVE_COLUMNS), (logic_rows, logic, LOGIC_COLUMNS)):
+                rows.extend((uid, normalize_title(str(r.get("Movie", ""))), *(r.get(k) for k in columns))
+                            for r in records)
+            halluc_rows.extend((uid, r.get("Movie"), *(r.get(k) for k in HALLUCINATION_COLUMNS))
+                               for r in hallucination)
+
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO results VALUES (?)", results_rows)
+            self.conn.executemany("INSERT OR IGNORE INTO subjective_scores VALUES (?, ?, ?, ?, ?, ?)", subj_rows)
+            self.conn.executemany("INSERT OR IGNORE INTO logic_scores VALUES (?, ?, ?, ?, ?)", logic_rows)
+            self.conn.executemany("INSERT INTO hallucination_scores VALUES (?, ?, ?, ?)", halluc_rows)
+        return len(results_rows)
+
+    def add_matched_ratings(self, matched_ratings):
+        """写入匹配到的真实评分，每个 (用户, 电影) 只保留一条，重复写入时以后写入的为准"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO matched_ratings VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(r["user_id"]), r["movie"], normalize_title(r["movie"]), int(r["movie_id"]),
+                  float(r["match_score"]), int(r["rating"])) for r in matched_ratings])
+
+    def reward_table(self, uids=None):
+        """
+        按匹配顺序取出同时有主观和逻辑评估的推荐及其评分，供 reward_utils.compute_rewards 批量计算
+
+        参数:
+        uids (list): 只取这些用户，默认全部
+
+        返回:
+        dict: uid / movie_id / movie 为列表；rating、user（uids 中的下标）为 (n,) 数组；
+              subjective、logic 为按 SUBJECTIVE_COLUMNS / LOGIC_COLUMNS 排列的评分矩阵，缺失为 NaN；
+              hallucination_user / hallucination_risk / explanatory_validity 为这些用户的逐条幻觉评分
+        """
+        where, params = _uid_filter(uids, alias="m")
+        rows = self.conn.execute(f"""
+            SELECT m.uid, m.movie_id, m.movie, m.rating,
+                   {", ".join("s." + c for c in SUBJECTIVE_COLUMNS.values())},
+                   {", ".join("l." + c for c in LOGIC_COLUMNS.values())}
+            FROM matched_ratings m
+            JOIN subjective_scores s ON s.uid = m.uid AND s.norm_title = m.norm_title
+            JOIN logic_scores l ON l.uid = m.uid AND l.norm_title = m.norm_title
+            {where}
+            ORDER BY m.rowid
+        """, params).fetchall()
+        n_subj, n_logic = len(SUBJECTIVE_COLUMNS), len(LOGIC_COLUMNS)
+        uid, movie_id, movie, rating, *scores = list(zip(*rows)) or [()] * (4 + n_subj + n_logic)
+        users = {u: i for i, u in enumerate(dict.fromkeys(uid))}
+
+        where, params = _uid_filter(uids)
+        halluc = [(users[u], risk, validity) for u, risk, validity in self.conn.execute(
+            f"SELECT uid, hallucination_risk, explanatory_validity FROM hallucination_scores {where} ORDER BY rowid",
+            params) if u in users]
+        h_user, h_risk, h_validity = list(zip(*halluc)) or [(), (), ()]
+
+        # None 转为 float 数组时变成 NaN
+        return {
+            "uid": list(uid),
+            "movie_id": list(movie_id),
+            "movie": list(movie),
+            "rating": np.array(rating, dtype=float),
+            "uids": list(users),
+            "user": np.fromiter((users[u] for u in uid), dtype=np.int64, count=len(uid)),
+            "subjective": np.array(scores[:n_subj], dtype=float).reshape(n_subj, -1).T,
+            "logic": np.array(scores[n_subj:], dtype=float).reshape(n_logic, -1).T,
+            "hallucination_user": np.array(h_user, dtype=np.int64),
+            "hallucination_risk": np.array(h_risk, dtype=float),
+            "explanatory_validity": np.array(h_validity, dtype=float),
+        }
+
+    def add_rewards(self, rewards):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO rewards VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(r["user_id"]), int(r["movie_id"]), r["movie_name"], float(r["reward"]), int(r["user_rating"]),
+                  r.get("subjective"), r.get("logic"), r.get("hallucination")) for r in rewards])
+
+    def iter_rewards(self):
+        """按写入顺序逐条返回奖励记录"""
+        for row in self.conn.execute("SELECT * FROM rewards ORDER BY rowid"):
+            yield dict(zip(REWARD_FIELDS, row))
+
+    def export_rewards(self, path):
+        """
+        把奖励记录逐条写入 JSON 数组（格式同 json.dump(..., indent=2)），不在内存中保留完整列表
+
+        返回:
+        int: 写入的记录数
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for reward in self.iter_rewards():
+                text = textwrap.indent(json.dumps(reward, indent=2, ensure_ascii=False), "  ")
+                f.write(("," if count else "") + "\n" + text)
+                count += 1
+            f.write("\n]" if count else "]")
+        return count
+
+    def comparisons(self):
+        """返回 (uid, 电影ID, 真实评分, 奖励分数)，按匹配顺序"""
+        return self.conn.execute("""
+            SELECT m.uid, m.movie_id, m.rating, w.reward
+            FROM matched_ratings m
+            JOIN rewards w ON w.uid = m.uid AND w.movie_id = m.movie_id
+            ORDER BY m.rowid, w.rowid
+        """)
+
+    def close(self):
+        self.conn.close()
@@ -1,5 +1,50 @@
 import json
+import os
 import re
+import threading
+
+import numpy as np
+
+from config import REWARD_WEIGHTS_PATH
+
+DEFAULT_WEIGHTS = {
+    "alpha": 0.4,  # 主观满意度权重
+    "beta": 0.3,   # 逻辑一致性权重
+    "gamma": 0.3,  # 幻觉风险反向权重
+    "bias": 0.0    # 仿射校准的截距，由 model_update.calibrate 拟合
+}
+STAGE_WEIGHT_KEYS = ("alpha", "beta", "gamma")
+# compute_rewards 输入矩阵的列顺序
+SUBJECTIVE_FIELDS = ("Relevance", "Clarity", "Persuasiveness", "score")
+LOGIC_FIELDS = ("Content-Matching", "Logic-Clarity", "score")
+
+_WEIGHTS_CACHE = {}
+_WEIGHTS_LOCK = threading.Lock()
+
+
+def load_weights(path=REWARD_WEIGHTS_PATH):
+    """
+    读取 model_update 维护的阶段权重，文件修改后自动重新读取，不存在时使用默认权重
+
+    返回:
+    dict: {"alpha": 主观, "beta": 逻辑, "gamma": 幻觉}
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return dict(DEFAULT_WEIGHTS)
+    with _WEIGHTS_LOCK:
+        cached = _WEIGHTS_CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = (mtime, {**DEFAULT_WEIGHTS, **json.load(f)})
+            _WEIGHTS_CACHE[path] = cached
+        return dict(cached[1])
+
+
+def save_weights(weights, path=REWARD_WEIGHTS_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(weights, f, ensure_ascii=False, indent=2)
 
 
 def calculate_stage_score(scores, weights=None, default_score=3.0):
@@ -44,9 +89,11 @@ def calculate_stage_score(scores, weights=None, default_score=3.0):
 
 
 # reward_utils.py
-def compute_reward(subjective_scores, logic_result, hallucination_result, verbose=False):
-    """计算综合奖励分数，增强数据类型验证和字段过滤"""
+def compute_reward(subjective_scores, logic_result, hallucination_result, verbose=False, weights=None):
+    """计算综合奖励分数，增强数据类型验证和字段过滤；weights 为空时使用 weights.json 中的权重"""
     stages = {}
+    if weights is None:
+        weights = load_weights()
 
     # 定义评估指标的有效键
     VALID_SUBJECTIVE_KEYS = {"Relevance", "Clarity", "Persuasiveness",
@@ -170,19 +217,91 @@ def compute_reward(subjective_scores, logic_result, hallucination_result, verbos
 
     # 计算综合奖励
     reward = (
-            stages["subjective"] * 0.4 +
-            stages["logic"] * 0.3 +
-            stages["hallucination"] * 0.3
+            stages["subjective"] * weights["alpha"] +
+            stages["logic"] * weights["beta"] +
+            stages["hallucination"] * weights["gamma"] +
+            weights.get("bias", 0.0)
     )
 
     final_reward = max(1.0, min(5.0, reward))
 
     if verbose:
-        print(f"\n=== 奖励计算详情 ===")
-        print(f"主观评估: {stages['subjective']:.2f} (权重: 40%)")
-        print(f"逻辑评估: {stages['logic']:.2f} (权重: 30%)")
-        print(f"幻觉评估: {stages['hallucination']:.2f} (权重: 30%)")
-        print(f"加权综合分数: {reward:.2f}")
-        print(f"最终奖励分数: {final_reward:.2f}\n")
-
-    return final_reward
\ No newline at end of file
+        print_reward_details(stages["subjective"], stages["logic"], stages["hallucination"], reward, final_reward,
+                             weights)
+
+    return final_reward
+
+
+def print_reward_details(subjective, logic, hallucination, reward, final_reward, weights):
+    print(f"\n=== 奖励计算详情 ===")
+    print(f"主观评估: {subjective:.2f} (权重: {weights['alpha']:.0%})")
+    print(f"逻辑评估: {logic:.2f} (权重: {weights['beta']:.0%})")
+    print(f"幻觉评估: {hallucination:.2f} (权重: {weights['gamma']:.0%})")
+    if weights.get("bias", 0.0):
+        print(f"校准偏置: {weights['bias']:+.2f}")
+    print(f"加权综合分数: {reward:.2f}")
+    print(f"最终奖励分数: {final_reward:.2f}\n")
+
+
+def _mean_stage(scores):
+    """按行对非 NaN 的分数取平均，整行缺失时为 3.0，结果限制在 1-5"""
+    scores = np.asarray(scores, dtype=float)
+    valid = ~np.isnan(scores)
+    count = valid.sum(axis=1)
+    total = np.where(valid, scores, 0.0).sum(axis=1)
+    return np.clip(np.where(count > 0, total / np.maximum(count, 1), 3.0), 1.0, 5.0)
+
+
+def hallucination_stage_scores(group, risk, validity, n_groups):
+    """
+    按用户汇总幻觉评估，与 compute_reward 对幻觉评分列表的处理一致
+
+    参数:
+    group (np.ndarray): 每条幻觉评分所属用户的下标
+    risk (np.ndarray): Hallucination-Risk，缺失为 NaN
+    validity (np.ndarray): Explanatory Validity，缺失为 NaN
+    n_groups (int): 用户数
+
+    返回:
+    np.ndarray: 每个用户的幻觉阶段得分(1-5)，没有有效评分的用户为 3.0
+    """
+    group = np.asarray(group, dtype=np.int64)
+    risk = np.asarray(risk, dtype=float)
+    validity = np.asarray(validity, dtype=float)
+    # 风险越小越好 → 越大越好；有效性越大越好
+    risk_scores = 1.0 - np.clip(risk, 0.0, 5.0) / 5.0
+    validity_scores = np.clip(validity, 0.0, 5.0) / 5.0
+    total = np.zeros(n_groups)
+    count = np.zeros(n_groups)
+    for values in (risk_scores, validity_scores):
+        valid = ~np.isnan(values)
+        total += np.bincount(group[valid], weights=values[valid], minlength=n_groups)
+        count += np.bincount(group[valid], minlength=n_groups)
+    return np.clip(np.where(count > 0, total / np.maximum(count, 1) * 5.0, 3.0), 1.0, 5.0)
+
+
+def compute_rewards(subjective, logic, hallucination, weights=None):
+    """
+    批量计算奖励分数，结果与逐条调用 compute_reward 相同
+
+    参数:
+    subjective (np.ndarray): (n, len(SUBJECTIVE_FIELDS)) 的主观评分，缺失为 NaN
+    logic (np.ndarray): (n, len(LOGIC_FIELDS)) 的逻辑评分，缺失为 NaN
+    hallucination (np.ndarray): (n,) 每行所属用户的幻觉阶段得分，见 hallucination_stage_scores
+    weights (dict): 阶段权重，为空时使用 weights.json 中的权重
+
+    返回:
+    tuple: (最终奖励, 加权综合分数, {"subjective": ..., "logic": ..., "hallucination": ...})，均为 (n,) 数组
+    """
+    if weights is None:
+        weights = load_weights()
+    stages = {
+        "subjective": _mean_stage(subjective),
+        "logic": _mean_stage(logic),
+        "hallucination": np.clip(np.asarray(hallucination, dtype=float), 1.0, 5.0),
+    }
+    reward = (stages["subjective"] * weights["alpha"] +
+              stages["logic"] * weights["beta"] +
+              stages["hallucination"] * weights["gamma"] +
+              weights.get("bias", 0.0))
+    return np.clip(reward, 1.0, 5.0), reward, stages
\ No newline at end of file
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# 各模块按扁平方式互相导入（from config import ...），测试从 LLM_Rec 目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+# test_llm_router.py
+import time
+
+import pytest
+
+import llm_router
+from llm_hedging import LatencyTracker
+
+
+@pytest.fixture
+def fake_streams(monkeypatch):
+    """用 {模型: 生成函数} 代替真实的流式请求，记录被请求的模型"""
+    calls = []
+    streams = {}
+
+    def stream_llm(model_name, prompt, stage=None, tokens_saved=0, items=1):
+        calls.append(model_name)
+        yield from streams[model_name]()
+
+    monkeypatch.setattr(llm_router, "stream_llm", stream_llm)
+    monkeypatch.setattr(llm_router, "LLM_HEDGING", True)
+    monkeypatch.setattr(llm_router, "TTFT", LatencyTracker(min_samples=5))
+    return streams, calls
+
+
+def _pieces(*pieces, delay=0.0):
+    def stream():
+        time.sleep(delay)
+        yield from pieces
+    return stream
+
+
+def _failing():
+    raise RuntimeError("模拟失败")
+    yield
+
+
+def test_stream_routed_fails_over_before_first_piece(fake_streams):
+    streams, calls = fake_streams
+    streams.update({"deepseek-chat": _failing, "qwen-plus": _pieces("a", "b")})
+    assert "".join(llm_router.stream_routed("deepseek-chat", "prompt", "generator")) == "ab"
+    assert calls == ["deepseek-chat", "qwen-plus"]
+
+
+def test_stream_routed_does_not_switch_after_output(fake_streams):
+    streams, calls = fake_streams
+
+    def broken():
+        yield "a"
+        raise RuntimeError("模拟中断")
+
+    streams.update({"deepseek-chat": broken, "qwen-plus": _pieces("b")})
+    with pytest.raises(RuntimeError):
+        list(llm_router.stream_routed("deepseek-chat", "prompt", "generator"))
+    assert calls == ["deepseek-chat"]
+
+
+def test_stream_routed_hedges_slow_first_piece(fake_streams):
+    streams, calls = fake_streams
+    for _ in range(5):
+        llm_router.TTFT.record("deepseek-chat", 0.01)
+    streams.update({"deepseek-chat": _pieces("slow", delay=1.0), "qwen-plus": _pieces("fa", "st")})
+    start = time.perf_counter()
+    assert "".join(llm_router.stream_routed("deepseek-chat", "prompt", "generator")) == "fast"
+    assert time.perf_counter() - start < 0.5
+    assert calls == ["deepseek-chat", "qwen-plus"]
+
+
+def test_stream_routed_without_hedging_uses_only_primary(fake_streams, monkeypatch):
+    streams, calls = fake_streams
+    monkeypatch.setattr(llm_router, "LLM_HEDGING", False)
+    streams.update({"deepseek-chat": _failing, "qwen-plus": _pieces("b")})
+    with pytest.raises(RuntimeError):
+        list(llm_router.stream_routed("deepseek-chat", "prompt", "generator"))
+    assert calls == ["deepseek-chat"]
@@ -0,0 +1,53 @@
+# test_output_parser.py
+import pytest
+
+from output_parser import extract_json
+
+
+def test_extract_json_plain_array():
+    assert extract_json('[{"Movie": "Heat (1995)", "Relevance": 4}]') == [{"Movie": "Heat (1995)", "Relevance": 4}]
+
+
+def test_extract_json_code_block_with_surrounding_text():
+    text = '以下是评估结果：\n```json\n{"Movie": "Heat (1995)", "Clarity": 5}\n```\n希望对你有帮助。'
+    assert extract_json(text) == {"Movie": "Heat (1995)", "Clarity": 5}
+
+
+def test_extract_json_trailing_commas_and_single_quotes():
+    text = "[{'Movie': 'Heat (1995)', 'Explanation': 'It\\'s tense', 'Clarity': 4,},]"
+    assert extract_json(text) == [{"Movie": "Heat (1995)", "Explanation": "It's tense", "Clarity": 4}]
+
+
+def test_extract_json_python_literals():
+    assert extract_json("{'ok': True, 'missing': None, 'bad': False}") == {"ok": True, "missing": None, "bad": False}
+
+
+def test_extract_json_keeps_brackets_and_quotes_inside_strings():
+    text = '{"Explanation": "Scores in [1-5], he said \\"great\\"", "Relevance": 3}'
+    assert extract_json(text) == {"Explanation": 'Scores in [1-5], he said "great"', "Relevance": 3}
+
+
+def test_extract_json_skips_non_json_brackets():
+    text = "Rate each aspect [1-5] as follows: [{\"Movie\": \"Heat (1995)\", \"Relevance\": 2}]"
+    assert extract_json(text) == [{"Movie": "Heat (1995)", "Relevance": 2}]
+
+
+def test_extract_json_merges_multiple_values():
+    text = ('```json\n{"Movie": "Heat (1995)", "Relevance": 4}\n```\n'
+            '```json\n[{"Movie": "Fargo (1996)", "Relevance": 5}]\n```')
+    assert extract_json(text) == [{"Movie": "Heat (1995)", "Relevance": 4}, {"Movie": "Fargo (1996)", "Relevance": 5}]
+
+
+def test_extract_json_newline_inside_string():
+    assert extract_json('{"Explanation": "line one\nline two"}') == {"Explanation": "line one\nline two"}
+
+
+@pytest.mark.parametrize("text", ["没有任何 JSON", '[{"Movie": "Heat (1995)", "Relevance": 4', ""])
+def test_extract_json_without_json_raises(text):
+    with pytest.raises(ValueError):
+        extract_json(text)
+
+
+def test_extract_json_rejects_non_string():
+    with pytest.raises(ValueError):
+        extract_json(None)
@@ -0,0 +1,57 @@
+# test_pipeline_runner.py
+import threading
+import time
+
+from pipeline_runner import run_profiles
+
+
+def _profiles(n):
+    return [{"uid": uid} for uid in range(1, n + 1)]
+
+
+def test_run_profiles_keeps_input_order():
+    # 越靠前的画像完成得越晚，结果仍按输入顺序排列
+    profiles = _profiles(5)
+
+    def worker(profile):
+        time.sleep(0.01 * (len(profiles) - profile["uid"]))
+        return {"user": profile}
+
+    results = run_profiles(profiles, worker=worker, max_workers=5)
+    assert [r["user"]["uid"] for r in results] == [1, 2, 3, 4, 5]
+
+
+def test_run_profiles_reports_each_result_with_its_index():
+    profiles = _profiles(4)
+    seen = {}
+    callback_threads = set()
+
+    def on_result(i, result):
+        seen[i] = result["user"]["uid"]
+        callback_threads.add(threading.get_ident())
+
+    run_profiles(profiles, worker=lambda p: {"user": p}, max_workers=4, on_result=on_result)
+    assert seen == {0: 1, 1: 2, 2: 3, 3: 4}
+    assert callback_threads == {threading.get_ident()}  # 回调在调用方线程中执行
+
+
+def test_run_profiles_skips_failed_profiles():
+    profiles = _profiles(5)
+    reported = []
+
+    def worker(profile):
+        if profile["uid"] in (2, 4):
+            raise RuntimeError("模拟失败")
+        return {"user": profile}
+
+    results = run_profiles(profiles, worker=worker, max_workers=2,
+                           on_result=lambda i, result: reported.append(i))
+    assert [r["user"]["uid"] for r in results] == [1, 3, 5]
+    assert sorted(reported) == [0, 2, 4]
+
+
+def test_run_profiles_all_failed_returns_empty_list():
+    def worker(profile):
+        raise ValueError("模拟失败")
+
+    assert run_profiles(_profiles(3), worker=worker, max_workers=3) == []
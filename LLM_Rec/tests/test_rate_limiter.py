@@ -0,0 +1,117 @@
+# test_rate_limiter.py
+import threading
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AIMDLimiter, TokenBucket
+
+
+class FakeClock:
+    """代替 time 模块：sleep 只推进时钟，令牌桶的等待时间可以精确断言"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+def test_token_bucket_unlimited(clock):
+    bucket = TokenBucket(0)
+    for _ in range(1000):
+        bucket.acquire(100)
+    assert clock.slept == 0
+
+
+def test_token_bucket_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(60)  # 每秒补充 1 个，容量 60
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.slept == 0
+    bucket.acquire(3)
+    assert clock.slept == pytest.approx(3.0)
+
+
+def test_token_bucket_refills_with_elapsed_time(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(60)
+    clock.now += 10
+    bucket.acquire(10)
+    assert clock.slept == 0
+    clock.now += 1000  # 补充不超过容量
+    bucket.acquire(60)
+    assert clock.slept == 0
+    bucket.acquire(1)
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_token_bucket_clamps_amount_to_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(600)  # 超过容量的请求按一整桶计算，不会永远等待
+    assert clock.slept == 0
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_aimd_initial_limit_is_clamped():
+    assert AIMDLimiter(10, 4).limit == 4
+    assert AIMDLimiter(0, 4, minimum=2).limit == 2
+
+
+def test_aimd_additive_increase_and_multiplicative_decrease():
+    limiter = AIMDLimiter(2, 4)
+    limiter.on_success()
+    assert limiter.limit == pytest.approx(2.5)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 4
+    limiter.on_overload()
+    assert limiter.limit == 2
+    for _ in range(5):
+        limiter.on_overload()
+    assert limiter.limit == 1
+
+
+def test_aimd_blocks_when_limit_reached():
+    limiter = AIMDLimiter(2, 4)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def third():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=third)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1.0)
+    thread.join()
+    assert limiter.in_flight == 2
+
+
+def test_aimd_overload_lowers_admitted_concurrency():
+    limiter = AIMDLimiter(4, 4)
+    limiter.on_overload()
+    for _ in range(2):
+        limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1.0)
+    thread.join()
@@ -0,0 +1,94 @@
+# test_rating_store.py
+import numpy as np
+import pytest
+
+import rating_store
+from rating_store import load_store
+
+# UserID::MovieID::Rating::Timestamp；用户 2 对电影 10 重复评分，保留后一条
+RATINGS = """1::30::4::978300760
+1::10::5::978300761
+1::20::3::978300762
+2::10::2::978300763
+3::5::1::978300764
+2::10::4::978300765
+"""
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    ratings_file = tmp_path / "ratings.dat"
+    ratings_file.write_text(RATINGS, encoding="latin-1")
+    monkeypatch.setattr(rating_store, "RATINGS_FILE", str(ratings_file))
+    return load_store(str(tmp_path / "store"))
+
+
+def test_rating_lookup(store):
+    assert store.rating(1, 10) == 5
+    assert store.rating(1, 30) == 4
+    assert store.rating(3, 5) == 1
+
+
+def test_duplicate_rating_keeps_last(store):
+    assert store.rating(2, 10) == 4
+    assert len(store) == 5
+
+
+def test_missing_ratings_return_none(store):
+    assert store.rating(1, 15) is None  # 用户存在、电影未评分
+    assert store.rating(1, 99) is None  # 超出该用户的区间
+    assert store.rating(4, 10) is None  # 超出 user_ptr 范围的用户
+    assert store.rating(-1, 10) is None
+
+
+def test_ratings_for_user_sorted_by_movie(store):
+    movie_ids, ratings = store.ratings_for_user(1)
+    assert movie_ids.tolist() == [10, 20, 30]
+    assert ratings.tolist() == [5, 3, 4]
+    assert store.ratings_for_user(42)[0].size == 0
+
+
+def test_batch_ratings_matches_single_lookups(store):
+    users = [1, 1, 1, 2, 3, 3, 4, -1, 1]
+    movies = [10, 20, 30, 10, 5, 10, 10, 10, 25]
+    expected = [store.rating(u, m) or 0 for u, m in zip(users, movies)]
+    result = store.batch_ratings(users, movies)
+    assert result.dtype == np.int8
+    assert result.tolist() == expected == [5, 3, 4, 4, 1, 0, 0, 0, 0]
+
+
+def test_store_rebuilt_when_source_changes(tmp_path, store):
+    with open(rating_store.RATINGS_FILE, "a", encoding="latin-1") as f:
+        f.write("4::7::3::978300766\n")
+    updated = load_store(str(tmp_path / "store"))
+    assert updated.rating(4, 7) == 3
+    assert len(updated) == 6
+
+
+def test_interrupted_build_is_rebuilt(tmp_path, store, monkeypatch):
+    directory = tmp_path / "store"
+    with open(rating_store.RATINGS_FILE, "a", encoding="latin-1") as f:
+        f.write("4::7::3::978300766\n")
+    real_replace_file = rating_store.replace_file
+    writes = []
+
+    def failing_replace_file(path, write, *args, **kwargs):
+        writes.append(path)
+
+        def interrupted(f):
+            write(f)
+            raise OSError("模拟写入中断")
+
+        # 第二个数组写完临时文件、替换之前中断
+        real_replace_file(path, interrupted if len(writes) == 2 else write, *args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(rating_store, "replace_file", failing_replace_file)
+        with pytest.raises(OSError):
+            rating_store.build_store(str(directory))
+    # 中断后没有 meta.json，也没有残留的临时文件；下次加载时重新构建
+    assert not (directory / "meta.json").exists()
+    assert not list(directory.glob("*.tmp"))
+    rebuilt = load_store(str(directory))
+    assert rebuilt.rating(4, 7) == 3
+    assert len(rebuilt) == 6
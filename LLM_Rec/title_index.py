@@ -0,0 +1,217 @@
+# title_index.py
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+from config import TITLE_MATCH_THRESHOLD
+from dataset_loader import load_movies
+
+MOVIES_FILE = "ml-1m/movies.dat"
+INDEX_FILE = "data/title_index.pkl"
+
+# MovieLens 把冠词后置，如 "Lost World: Jurassic Park, The (1997)"
+ARTICLES = {"the", "a", "an", "la", "le", "les", "el", "il", "der", "die", "das", "l'"}
+YEAR_RE = re.compile(r"\((\d{4})\)\s*$")
+AKA_RE = re.compile(r"\(([^()]*)\)")
+
+
+# 标准化电影标题
+def normalize_title(title):
+    return re.sub(r"[^\w\s]", "", title.lower().strip()) if isinstance(title, str) else ""
+
+
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _move_article(part):
+    """把后置冠词移回开头：'Lost World: Jurassic Park, The' -> 'The Lost World: Jurassic Park'"""
+    head, sep, tail = part.rpartition(",")
+    if sep and tail.strip().lower() in ARTICLES:
+        article = tail.strip()
+        return f"{article}{'' if article.endswith(chr(39)) else ' '}{head.strip()}"
+    return part
+
+
+def _match_key(text):
+    text = _strip_accents(text.lower()).replace("&", " and ")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def split_title(title):
+    """
+    拆分标题
+
+    返回:
+    tuple: (各写法的匹配键列表, 年份或 None)，第一个匹配键为主标题
+    """
+    title = title.strip().strip("*\"'《》 ")
+    year = None
+    match = YEAR_RE.search(title)
+    if match:
+        year = int(match.group(1))
+        title = title[:match.start()]
+    # 括号中的别名（外文原名等）也作为可匹配的写法
+    akas = AKA_RE.findall(title)
+    main = AKA_RE.sub(" ", title)
+    keys = []
+    for part in [main] + akas:
+        key = _match_key(_move_article(part.strip()))
+        if key and key not in keys:
+            keys.append(key)
+    return keys, year
+
+
+def _drop_article(key):
+    """去掉开头的冠词，便于匹配 'Godfather' 与 'The Godfather'"""
+    head, _, rest = key.partition(" ")
+    return rest if rest and head in ARTICLES else key
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    电影标题 -> MovieID 索引
+
+    先按 (标题, 年份) 精确匹配，再按不含年份的标题匹配，最后用三元组倒排索引做模糊匹配，
+    模糊匹配得分为 Dice 系数并按年份差异打折，低于阈值视为未匹配。
+    """
+
+    def __init__(self, movies):
+        self.movie_ids = []
+        self.titles = []
+        self.exact = {}
+        self.by_key = defaultdict(list)
+        entry_keys = []  # 每个写法对应的电影行号
+        postings = defaultdict(list)
+
+        for movie_id, title in movies:
+            row = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+            self.titles.append(title)
+            keys, year = split_title(title)
+            for key in keys:
+                self.exact.setdefault((key, year), row)
+                self.by_key[key].append(row)
+                if _drop_article(key) != key:
+                    self.by_key[_drop_article(key)].append(row)
+                entry = len(entry_keys)
+                entry_keys.append(row)
+                for gram in _trigrams(key):
+                    postings[gram].append(entry)
+
+        self.years = [split_title(t)[1] for t in self.titles]
+        self.by_key = dict(self.by_key)
+        self.entry_rows = np.array(entry_keys, dtype=np.int32)
+        self.entry_sizes = np.zeros(len(entry_keys), dtype=np.int32)
+        for entry_list in postings.values():
+            self.entry_sizes[entry_list] += 1
+        self.postings = {gram: np.array(entries, dtype=np.int32) for gram, entries in postings.items()}
+
+    def _year_factor(self, row, year):
+        if year is None or self.years[row] is None or self.years[row] == year:
+            return 1.0
+        return 0.9 if abs(self.years[row] - year) == 1 else 0.75
+
+    def resolve(self, title, threshold=TITLE_MATCH_THRESHOLD):
+        """
+        把 LLM 输出的标题解析为 MovieID
+
+        返回:
+        tuple: (MovieID, 数据集中的标题, 置信度 0~1)，未匹配时返回 None
+        """
+        keys, year = split_title(title) if isinstance(title, str) else ([], None)
+        if not keys:
+            return None
+        key = keys[0]
+
+        row = self.exact.get((key, year))
+        if row is not None:
+            return self.movie_ids[row], self.titles[row], 1.0
+
+        rows = self.by_key.get(key) or self.by_key.get(_drop_article(key))
+        if rows:
+            # 同名电影取年份最接近的一部
+            row = min(rows, key=lambda r: abs((self.years[r] or 0) - (year or self.years[r] or 0)))
+            return self.movie_ids[row], self.titles[row], 0.95 * self._year_factor(row, year)
+
+        grams = [self.postings[g] for g in _trigrams(key) if g in self.postings]
+        if not grams:
+            return None
+        shared = np.bincount(np.concatenate(grams), minlength=len(self.entry_rows))
+        dice = 2.0 * shared / (self.entry_sizes + len(_trigrams(key)))
+        entry = int(np.argmax(dice))
+        row = int(self.entry_rows[entry])
+        score = float(dice[entry]) * self._year_factor(row, year)
+        if score < threshold:
+            return None
+        return self.movie_ids[row], self.titles[row], round(score, 4)
+
+
+class TitleStreamParser:
+    """从流式输出中提取 **标题**，每个标题的结束标记一到达就返回，不必等待完整回答"""
+
+    PATTERN = re.compile(r"\*\*(.+?)\*\*")
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+
+    def feed(self, chunk):
+        """追加一段输出，返回这段输出中新完成的标题"""
+        self.buffer += chunk
+        titles = []
+        match = self.PATTERN.search(self.buffer, self.pos)
+        while match:
+            titles.append(match.group(1))
+            self.pos = match.end()
+            match = self.PATTERN.search(self.buffer, self.pos)
+        return titles
+
+
+def _source_signature():
+    stat = os.stat(MOVIES_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_index(path=INDEX_FILE):
+    """从 movies.dat 构建标题索引并序列化到磁盘"""
+    movies = load_movies(MOVIES_FILE)
+    index = TitleIndex(zip(movies["MovieID"].tolist(), movies["Title"].tolist()))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump({"source": _source_signature(), "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return index
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_title_index():
+    """加载已序列化的标题索引，movies.dat 变化后自动重建"""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            if os.path.exists(INDEX_FILE):
+                with open(INDEX_FILE, "rb") as f:
+                    saved = pickle.load(f)
+                if saved["source"] == _source_signature():
+                    _INDEX = saved["index"]
+            if _INDEX is None:
+                _INDEX = build_index()
+        return _INDEX
+
+
+if __name__ == "__main__":
+    build_index()
+    print(f"✅ 标题索引已保存至 {INDEX_FILE}")
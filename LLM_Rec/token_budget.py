@@ -0,0 +1,115 @@
+# token_budget.py
+import json
+
+from config import PROMPT_COMPACTION, STAGE_INPUT_BUDGETS
+from output_parser import SCORE_KEYS, parse_score_records
+from rate_limiter import estimate_tokens
+
+# 超出预算时也不截断的字段：推荐内容被截断会丢掉整条 **标题**，评估器看不到而 match_ratings 仍会为其计算奖励
+UNTRUNCATED_FIELDS = {"recommendation_text"}
+
+
+def _raw_text(value):
+    """未压缩时写入提示词的文本：画像为 description，其余原样"""
+    if isinstance(value, dict):
+        return value.get("description", "")
+    return "" if value is None else str(value)
+
+
+def compact_profile(profile):
+    """
+    把用户画像缩写为结构化字段（性别年龄职业、评分习惯、偏好题材、最近观看），代替自然语言的 description
+
+    参数:
+    profile (dict | str): 用户画像；传入字符串时原样返回
+
+    返回:
+    str: 写入提示词的画像文本
+    """
+    if not isinstance(profile, dict):
+        return _raw_text(profile)
+    stats = profile.get("stats") or {}
+    if not PROMPT_COMPACTION or not profile.get("interests") or "avg_rating" not in stats:
+        return _raw_text(profile)
+    who = ", ".join(str(profile[k]) for k in ("gender", "age_group", "occupation") if profile.get(k))
+    parts = [
+        who,
+        f"平均评分 {stats['avg_rating']}" + (f", 4星及以上 {stats['high_rating_ratio']}"
+                                         if stats.get("high_rating_ratio") else ""),
+        "偏好: " + "/".join(profile["interests"]),
+    ]
+    if profile.get("recent_movies"):
+        parts.append("最近观看: " + "; ".join(profile["recent_movies"]))
+    return "; ".join(p for p in parts if p)
+
+
+def compact_scores(text):
+    """
+    把上游评估器的输出缩写为逐电影的评分字段（去掉 Explanation 等说明文字）
+
+    返回:
+    str: 紧凑的 JSON 数组；无法解析时原样返回
+    """
+    if not PROMPT_COMPACTION:
+        return _raw_text(text)
+    try:
+        records = parse_score_records(text)
+    except ValueError:
+        return _raw_text(text)
+    records = [{k: v for k, v in r.items() if k == "Movie" or k in SCORE_KEYS} for r in records]
+    if not records:
+        return _raw_text(text)
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":"))
+
+
+def truncate_tokens(text, max_tokens):
+    """把文本截断到大约 max_tokens 个 token，尽量在换行处截断"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 估计值对中文按 1 字 1 token、对 ASCII 按 4 字符 1 token，按比例截取后再退到上一个换行
+    cut = text[:max(0, int(len(text) * max_tokens / estimate_tokens(text)))]
+    newline = cut.rfind("\n")
+    return cut[:newline] if newline > len(cut) // 2 else cut
+
+
+def prepare_fields(stage, fields, compactors):
+    """
+    压缩一个画像写入提示词的字段，压缩后仍超出该阶段预算时从最长的字段开始截断，UNTRUNCATED_FIELDS 中的字段保持完整
+
+    参数:
+    stage (str): 阶段名称，对应 STAGE_INPUT_BUDGETS
+    fields (dict): 字段名 -> 原始值（画像可以是 dict）
+    compactors (dict): 字段名 -> 压缩函数，未列出的字段原样写入
+
+    返回:
+    tuple: (字段名 -> 写入提示词的文本, 节省的 token 数)
+    """
+    original = sum(estimate_tokens(_raw_text(v)) for v in fields.values())
+    prepared = {name: compactors.get(name, _raw_text)(value) for name, value in fields.items()}
+    budget = STAGE_INPUT_BUDGETS.get(stage, 0)
+    used = sum(estimate_tokens(v) for v in prepared.values())
+    if budget and used > budget:
+        truncatable = sorted((name for name in prepared if name not in UNTRUNCATED_FIELDS),
+                             key=lambda name: estimate_tokens(prepared[name]), reverse=True)
+        for name in truncatable:
+            over = used - budget
+            if over <= 0:
+                break
+            prepared[name] = truncate_tokens(prepared[name], max(0, estimate_tokens(prepared[name]) - over))
+            used = sum(estimate_tokens(v) for v in prepared.values())
+    return prepared, original - used
+
+
+def prepare_items(stage, items, names, compactors):
+    """
+    批量评估时逐条压缩 [(uid, 值1, 值2, ...)]
+
+    返回:
+    tuple: (压缩后的条目列表, 节省的 token 数)
+    """
+    prepared, saved = [], 0
+    for uid, *values in items:
+        fields, item_saved = prepare_fields(stage, dict(zip(names, values)), compactors)
+        prepared.append((uid, *(fields[name] for name in names)))
+        saved += item_saved
+    return prepared, saved